@@ -1,64 +1,421 @@
-from typing import Iterable, List
+from typing import Callable, Dict, Iterable, List
 
-from .manifest import ALL_DATASETS, ALL_STORES, get_store, get_dataset
-from .parameters import parse_parameters
-from .registry import Registry
+from .manifest import (
+    all_datasets,
+    dataset_names,
+    default_stores,
+    get_dataset,
+    get_store,
+    store_names,
+)
+from .parameters import (
+    parse_agg_parameters,
+    parse_backfill_parameters,
+    parse_convert_parameters,
+    parse_journal_parameters,
+    parse_parameters,
+    parse_query_parameters,
+    parse_retry_spool_parameters,
+    parse_serve_parameters,
+    parse_standin_parameters,
+    parse_stats_parameters,
+)
+
+# Time spent waiting for other processes to finish writing is only
+# reported when it's at least this many seconds.
+LOCK_WAIT_REPORTED = 0.1
 
 
 def _choices_warning(kind: str, value: str, choices: Iterable[str]) -> None:
     print(f'invalid {kind} ({value}) - valid values: {", ".join(choices)}')
 
 
+def _query(args: List[str]) -> None:
+    """
+    Run the ``query`` command with the given command line.
+    """
+    import sys
+
+    from .query import query, write_rows
+    from .registry import store_options
+
+    params = parse_query_parameters(args)
+
+    store_class = get_store(params.store)
+    if store_class is None:
+        _choices_warning("store", params.store, store_names())
+        return
+
+    dataset_class = get_dataset(params.dataset)
+    if dataset_class is None:
+        _choices_warning("dataset", params.dataset, dataset_names())
+        return
+
+    dataset = dataset_class()
+    options = store_options(dataset, spatial_index=True)
+    if params.near is not None and options.spatial_fields is None:
+        print(f"dataset {params.dataset} has no coordinates")
+        return
+
+    rows = query(
+        store_class(namespace=params.namespace, options=options),
+        dataset,
+        where=params.where,
+        fields=params.fields,
+        since=params.since,
+        until=params.until,
+        limit=params.limit,
+        near=params.near,
+    )
+    write_rows(rows, sys.stdout, params.format, params.fields)
+
+
+def _agg(args: List[str]) -> None:
+    """
+    Run the ``agg`` command with the given command line.
+    """
+    import sys
+
+    from .aggregate import Aggregation, aggregate
+    from .query import write_rows
+    from .registry import store_options
+
+    params = parse_agg_parameters(args)
+
+    store_class = get_store(params.store)
+    if store_class is None:
+        _choices_warning("store", params.store, store_names())
+        return
+
+    dataset_class = get_dataset(params.dataset)
+    if dataset_class is None:
+        _choices_warning("dataset", params.dataset, dataset_names())
+        return
+
+    dataset = dataset_class()
+    rows = aggregate(
+        store_class(namespace=params.namespace, options=store_options(dataset)),
+        dataset,
+        by=params.by,
+        aggregations=[Aggregation(*a) for a in params.aggregations],
+        cache=params.cache,
+    )
+    write_rows(rows, sys.stdout, params.format)
+
+
+def _convert(args: List[str]) -> None:
+    """
+    Run the ``convert`` command with the given command line.
+    """
+    import os
+
+    from .convert import convert
+    from .registry import store_options
+    from .storage import StoreOptions
+
+    params = parse_convert_parameters(args)
+
+    source_class = get_store(params.from_store)
+    if source_class is None:
+        _choices_warning("store", params.from_store, store_names())
+        return
+
+    target_class = get_store(params.to_store)
+    if target_class is None:
+        _choices_warning("store", params.to_store, store_names())
+        return
+
+    options = StoreOptions()
+    dataset_class = get_dataset(params.dataset)
+    if dataset_class is not None:
+        options = store_options(dataset_class())
+
+    os.makedirs(params.to_namespace, exist_ok=True)
+    result = convert(
+        params.dataset,
+        source_class(namespace=params.namespace),
+        target_class(namespace=params.to_namespace, options=options),
+    )
+    status = "ok" if result.success else "fail"
+    print(f"{params.dataset} - {status}: {result.message}")
+
+
+def _journal(args: List[str]) -> None:
+    """
+    Run the ``journal`` command with the given command line.
+    """
+    import json
+    from itertools import islice
+
+    from .journal import Cursor, Journal
+
+    params = parse_journal_parameters(args)
+
+    journal = Journal(params.namespace)
+    cursor = None
+    if params.consumer is not None:
+        cursor = Cursor(journal, params.consumer)
+        entries = cursor.read()
+    else:
+        entries = journal.read(params.after or 0)
+
+    last = None
+    for entry in islice(entries, params.limit):
+        print(json.dumps(entry._asdict(), sort_keys=True))
+        last = entry.sequence
+
+    if cursor is not None and last is not None:
+        cursor.commit(last)
+
+
+def _backfill(args: List[str]) -> None:
+    """
+    Run the ``backfill`` command with the given command line.
+    """
+    from .backfill import backfill
+
+    params = parse_backfill_parameters(args)
+
+    dataset_class = get_dataset(params.dataset)
+    if dataset_class is None:
+        _choices_warning("dataset", params.dataset, dataset_names())
+        return
+    if dataset_class().fetch_window is None:
+        print(f"dataset {params.dataset} can't fetch a range of dates")
+        return
+
+    stores = []
+    for store_name in params.stores:
+        next_store = get_store(store_name)
+        if next_store is None:
+            _choices_warning("store", store_name, store_names())
+        else:
+            stores.append(next_store)
+    if not params.stores:
+        stores = default_stores()
+
+    result = backfill(
+        dataset_class,
+        stores,
+        params.namespace,
+        params.start.date(),
+        params.end.date(),
+        workers=params.workers,
+        spatial_index=params.spatial_index,
+    )
+    status = "ok" if result.success else f"fail ({result.message})"
+    print(
+        f"{result.name} - {status}, {result.rows} rows stored, "
+        f"{result.skipped} of {result.windows} windows already done"
+    )
+
+
+def _retry_spool(args: List[str]) -> None:
+    """
+    Run the ``retry-spool`` command with the given command line.
+    """
+    import time
+
+    from .registry import Registry
+    from .spool import Spool
+
+    params = parse_retry_spool_parameters(args)
+
+    stores = []
+    for store_name in params.stores:
+        next_store = get_store(store_name)
+        if next_store is None:
+            _choices_warning("store", store_name, store_names())
+        else:
+            stores.append(next_store)
+    if not params.stores:
+        stores = default_stores()
+
+    spool = Spool(params.namespace)
+    for attempt in range(params.attempts):
+        configs = []
+        for dataset_name in params.datasets or spool.datasets():
+            dataset_class = get_dataset(dataset_name)
+            if dataset_class is None:
+                _choices_warning("dataset", dataset_name, dataset_names())
+            elif spool.batches(dataset_name):
+                configs.append((dataset_class, stores))
+        if not configs:
+            break
+        if attempt:
+            time.sleep(params.interval)
+
+        registry = Registry(
+            configs, spatial_index=params.spatial_index, journal=params.journal
+        )
+        for update_result in registry.retry_spool(params.namespace):
+            status = "ok" if update_result.success else "fail"
+            print(f"{update_result.name} - {status}")
+
+
+def _serve_data(args: List[str]) -> None:
+    """
+    Run the ``serve-data`` command with the given command line.
+    """
+    from .server import make_server
+
+    params = parse_serve_parameters(args)
+
+    store_class = get_store(params.store)
+    if store_class is None:
+        _choices_warning("store", params.store, store_names())
+        return
+
+    server = make_server(
+        store_class(namespace=params.namespace), params.host, params.port
+    )
+    url = f"http://{params.host}:{server.server_port}/datasets/"
+    print(f"serving {params.namespace} on {url}")
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.server_close()
+
+
+def _stand_in(args: List[str]) -> None:
+    """
+    Run the ``stand-in`` command with the given command line.
+    """
+    from .standin import StandInOptions, make_standin_server
+
+    params = parse_standin_parameters(args)
+
+    options = StandInOptions(
+        scale=params.scale,
+        latency=params.latency,
+        failure_rate=params.failure_rate,
+        seed=params.seed,
+    )
+    server = make_standin_server(params.recordings, params.host, params.port, options)
+    url = f"http://{params.host}:{server.server_port}"
+    print(f"serving {params.recordings} on {url}, fetch with --replay {url}")
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.server_close()
+
+
+def _stats(args: List[str]) -> None:
+    """
+    Run the ``stats`` command with the given command line.
+    """
+    import json
+
+    from .catalog import all_entries
+
+    params = parse_stats_parameters(args)
+
+    for entry in all_entries(params.namespace):
+        if params.datasets and entry.dataset not in params.datasets:
+            continue
+        if params.stores and entry.store not in params.stores:
+            continue
+        print(json.dumps(entry._asdict(), sort_keys=True))
+
+
+_COMMANDS: Dict[str, Callable[[List[str]], None]] = {
+    "agg": _agg,
+    "backfill": _backfill,
+    "convert": _convert,
+    "journal": _journal,
+    "query": _query,
+    "retry-spool": _retry_spool,
+    "serve-data": _serve_data,
+    "stand-in": _stand_in,
+    "stats": _stats,
+}
+
+
 def _main(args: List[str]) -> None:
     """
     Run the application with the given command line.
     """
+    if args and args[0] in _COMMANDS:
+        _COMMANDS[args[0]](args[1:])
+        return
+
     params = parse_parameters(args)
 
     if params.list_datasets:
         print("DATASETS")
-        for dataset in ALL_DATASETS:
-            print(dataset.name())
+        for dataset_name in dataset_names():
+            print(dataset_name)
 
     if params.list_stores:
         print("STORES")
-        for store in ALL_STORES:
-            print(store.name())
+        for store_name in store_names():
+            print(store_name)
 
     if params.list_datasets or params.list_stores:
         return
 
+    import os
+
+    from .registry import Registry
+    from .source import RECORD_ENV, REPLAY_ENV
+
+    # Read by every dataset's fetch, see mtdata.source.http_get
+    if params.record is not None:
+        os.environ[RECORD_ENV] = params.record
+    if params.replay is not None:
+        os.environ[REPLAY_ENV] = params.replay
+
     stores = []
     if params.stores:
         for store_name in params.stores:
             next_store = get_store(store_name)
             if next_store is None:
-                _choices_warning("store", store_name, [s.name() for s in ALL_STORES])
+                _choices_warning("store", store_name, store_names())
             else:
                 stores.append(next_store)
     else:
-        stores = list(ALL_STORES)
+        stores = default_stores()
 
     configs = []
     if params.datasets:
         for dataset_name in params.datasets:
             next_dataset = get_dataset(dataset_name)
             if next_dataset is None:
-                _choices_warning(
-                    "dataset", dataset_name, [d.name() for d in ALL_DATASETS]
-                )
+                _choices_warning("dataset", dataset_name, dataset_names())
             else:
                 configs.append((next_dataset, stores))
     else:
-        for dataset in ALL_DATASETS:
+        for dataset in all_datasets():
             configs.append((dataset, stores))
 
-    registry = Registry(configs)
-    results = registry.update(params.namespace)
+    registry = Registry(
+        configs,
+        skip_unchanged=not params.force,
+        workers=params.workers,
+        spatial_index=params.spatial_index,
+        journal=params.journal,
+        batch_rows=params.batch_rows,
+    )
+    results = registry.update(params.namespaces)
 
     for update_result in results:
-        status = "ok" if update_result.success else "fail"
-        print(f"{update_result.name} - {status}")
+        if update_result.unchanged:
+            status = "unchanged"
+        else:
+            status = "ok" if update_result.success else "fail"
+        lock_wait = sum(r.lock_wait for r in update_result.store_results)
+        if update_result.spooled:
+            status = f"{status} (retried from spool)"
+        if lock_wait >= LOCK_WAIT_REPORTED:
+            status = f"{status} (waited {lock_wait:.1f}s for locks)"
+        if len(params.namespaces) > 1:
+            print(f"{update_result.namespace}/{update_result.name} - {status}")
+        else:
+            print(f"{update_result.name} - {status}")
 
 
 def main():
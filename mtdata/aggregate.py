@@ -0,0 +1,305 @@
+from typing import Any, Dict, Iterable, Iterator, List, NamedTuple, Optional, Sequence
+
+from .dataset import Dataset
+from .row import Row
+from .storage import Storage
+
+AGGREGATE_FUNCTIONS = ("count", "sum", "mean", "min", "max")
+
+# Group-by keys that are derived from the dataset's time field rather
+# than read from a field, mapped to the NumPy unit they truncate to.
+TIME_KEYS = {
+    "hour": "datetime64[h]",
+    "day": "datetime64[D]",
+    "month": "datetime64[M]",
+    "year": "datetime64[Y]",
+}
+
+CHUNK_SIZE = 100_000
+
+
+class Aggregation(NamedTuple):
+    """
+    A single aggregate to compute, such as the mean of the ``aqi`` field.
+    """
+
+    function: str
+    field: str
+
+    @property
+    def column(self) -> str:
+        """
+        The name of the output column for this aggregate.
+
+        >>> Aggregation('mean', 'aqi').column
+        'mean_aqi'
+        """
+        return f"{self.function}_{self.field}"
+
+
+def aggregate(
+    store: Storage,
+    dataset: Dataset,
+    by: Sequence[str],
+    aggregations: Sequence[Aggregation],
+    chunk_size: int = CHUNK_SIZE,
+    cache: bool = True,
+) -> List[Row]:
+    """
+    Compute grouped aggregates over a stored dataset. Rows are grouped by
+    the fields in ``by``, which may also include the special keys in
+    ``TIME_KEYS`` (such as ``day``), derived from the dataset's time
+    field. Each group produces a row with its key fields, a ``count`` of
+    rows, and a column for each aggregation.
+
+    Only the fields that are needed are loaded, ``chunk_size`` rows at a
+    time, and each chunk is aggregated with vectorized NumPy operations.
+    Values that are missing or not numeric are ignored.
+
+    If ``cache`` is ``True`` and the store can report a version for the
+    dataset, the result is saved to a ``.npz`` file in the namespace and
+    reused until the stored data change.
+    """
+    for aggregation in aggregations:
+        if aggregation.function not in AGGREGATE_FUNCTIONS:
+            raise ValueError(f"unsupported aggregate: {aggregation.function}")
+
+    name = dataset.name()
+    time_field = dataset.time_field
+    if any(key in TIME_KEYS and key != time_field for key in by):
+        if time_field is None:
+            raise ValueError(f"dataset {name} has no time field")
+
+    cache_path = None
+    version = store.version(name) if cache else None
+    if version is not None:
+        cache_path = _cache_path(store, name, by, aggregations)
+        cached = _load_cache(cache_path, version)
+        if cached is not None:
+            return cached
+
+    value_fields = sorted({aggregation.field for aggregation in aggregations})
+    columns = [key for key in by if key not in TIME_KEYS] + value_fields
+    if time_field is not None and any(key in TIME_KEYS for key in by):
+        columns.append(time_field)
+
+    groups: Dict[tuple, Dict[str, List[float]]] = {}
+    rows = store.load(name, fields=sorted(set(columns)))
+    for chunk in _chunks(rows, chunk_size):
+        _aggregate_chunk(chunk, by, value_fields, dataset, groups)
+
+    names, arrays = _finish(groups, by, aggregations)
+    if cache_path is not None and version is not None:
+        _save_cache(cache_path, version, names, arrays)
+
+    return _to_rows(names, arrays)
+
+
+def _chunks(rows: Iterable[Row], size: int) -> Iterator[List[Row]]:
+    chunk: List[Row] = []
+    for row in rows:
+        chunk.append(row)
+        if len(chunk) >= size:
+            yield chunk
+            chunk = []
+    if chunk:
+        yield chunk
+
+
+def _key_column(chunk: List[Row], key: str, dataset: Dataset) -> Any:
+    import numpy as np
+
+    if key not in TIME_KEYS or key == dataset.time_field:
+        column = np.array([row.get(key) for row in chunk])
+        if column.dtype == object:
+            column = column.astype(str)
+        return column
+
+    values = [row.get(dataset.time_field or "") for row in chunk]
+    try:
+        times = np.array(values, dtype="datetime64[s]")
+    except (TypeError, ValueError):
+        times = np.array(
+            [np.datetime64(dataset.parse_time(value), "s") for value in values]
+        )
+    return times.astype(TIME_KEYS[key]).astype(str)
+
+
+def _number(value: Any) -> float:
+    if value is None:
+        return float("nan")
+    try:
+        return float(value)
+    except (TypeError, ValueError):
+        return float("nan")
+
+
+def _aggregate_chunk(
+    chunk: List[Row],
+    by: Sequence[str],
+    value_fields: Sequence[str],
+    dataset: Dataset,
+    groups: Dict[tuple, Dict[str, List[float]]],
+) -> None:
+    """
+    Aggregate one chunk of rows and merge the partial results (count,
+    sum, min and max for each field, plus a row count) into ``groups``.
+    """
+    import numpy as np
+
+    size = len(chunk)
+
+    # Combine the codes of each key column into a single code per row,
+    # then number the distinct combinations.
+    codes = np.zeros(size, dtype=np.int64)
+    uniques = []
+    for key in by:
+        unique, inverse = np.unique(
+            _key_column(chunk, key, dataset), return_inverse=True
+        )
+        codes = codes * len(unique) + inverse.reshape(-1)
+        uniques.append(unique)
+    group_codes, group_ids = np.unique(codes, return_inverse=True)
+    group_ids = group_ids.reshape(-1)
+    count = len(group_codes)
+
+    keys: List[tuple] = []
+    for code in group_codes.tolist():
+        parts = []
+        for unique in reversed(uniques):
+            code, index = divmod(code, len(unique))
+            parts.append(unique[index].item())
+        keys.append(tuple(reversed(parts)))
+
+    rows = np.bincount(group_ids, minlength=count)
+    partials: Dict[str, Any] = {}
+    for field in value_fields:
+        values = np.fromiter((_number(row.get(field)) for row in chunk), float, size)
+        valid = ~np.isnan(values)
+        ids = group_ids[valid]
+        values = values[valid]
+
+        lows = np.full(count, np.inf)
+        np.minimum.at(lows, ids, values)
+        highs = np.full(count, -np.inf)
+        np.maximum.at(highs, ids, values)
+        partials[field] = (
+            np.bincount(ids, minlength=count),
+            np.bincount(ids, weights=values, minlength=count),
+            lows,
+            highs,
+        )
+
+    for index, group_key in enumerate(keys):
+        group = groups.setdefault(group_key, {"": [0.0]})
+        group[""][0] += rows[index]
+        for field, (counts, sums, lows, highs) in partials.items():
+            if field not in group:
+                group[field] = [0.0, 0.0, float("inf"), float("-inf")]
+            stats = group[field]
+            stats[0] += counts[index]
+            stats[1] += sums[index]
+            stats[2] = min(stats[2], lows[index])
+            stats[3] = max(stats[3], highs[index])
+
+
+def _finish(
+    groups: Dict[tuple, Dict[str, List[float]]],
+    by: Sequence[str],
+    aggregations: Sequence[Aggregation],
+) -> tuple:
+    """
+    Turn the accumulated partial results into one array per output
+    column, with groups sorted by key.
+    """
+    import numpy as np
+
+    keys = sorted(groups, key=lambda k: tuple(str(part) for part in k))
+    names = list(by) + ["count"] + [a.column for a in aggregations]
+    arrays = []
+
+    for index in range(len(by)):
+        column = np.array([key[index] for key in keys])
+        if column.dtype == object:
+            column = column.astype(str)
+        arrays.append(column)
+
+    arrays.append(np.array([groups[key][""][0] for key in keys], dtype=np.int64))
+
+    nan = float("nan")
+    for aggregation in aggregations:
+        values = []
+        for key in keys:
+            count, total, low, high = groups[key].get(
+                aggregation.field, [0.0, 0.0, nan, nan]
+            )
+            if aggregation.function == "count":
+                values.append(count)
+            elif aggregation.function == "sum":
+                values.append(total)
+            elif not count:
+                values.append(nan)
+            elif aggregation.function == "mean":
+                values.append(total / count)
+            elif aggregation.function == "min":
+                values.append(low)
+            else:
+                values.append(high)
+        arrays.append(np.array(values, dtype=float))
+
+    return names, arrays
+
+
+def _to_rows(names: Sequence[str], arrays: Sequence[Any]) -> List[Row]:
+    from math import isnan
+
+    columns = [array.tolist() for array in arrays]
+    rows = []
+    for values in zip(*columns):
+        rows.append(
+            {
+                name: None if isinstance(value, float) and isnan(value) else value
+                for name, value in zip(names, values)
+            }
+        )
+    return rows
+
+
+def _cache_path(
+    store: Storage, name: str, by: Sequence[str], aggregations: Sequence[Aggregation]
+) -> str:
+    import json
+    from hashlib import sha1
+    from os import path
+
+    spec = json.dumps([list(by), [list(a) for a in aggregations]])
+    digest = sha1(spec.encode()).hexdigest()[:16]
+    return path.join(store.namespace, ".cache", f"{name}.{store.name()}.{digest}.npz")
+
+
+def _load_cache(cache_path: str, version: str) -> Optional[List[Row]]:
+    import numpy as np
+
+    try:
+        with np.load(cache_path) as cached:
+            if str(cached["version"]) != version:
+                return None
+            names = cached["names"].tolist()
+            return _to_rows(names, [cached[f"column_{i}"] for i in range(len(names))])
+    except (FileNotFoundError, KeyError, ValueError):
+        return None
+
+
+def _save_cache(
+    cache_path: str, version: str, names: Sequence[str], arrays: Sequence[Any]
+) -> None:
+    import os
+
+    import numpy as np
+
+    os.makedirs(os.path.dirname(cache_path), exist_ok=True)
+    columns = {f"column_{i}": array for i, array in enumerate(arrays)}
+    # Write somewhere else first so readers never see a partial file
+    temporary = f"{cache_path}.tmp.npz"
+    np.savez(temporary, version=np.array(version), names=np.array(names), **columns)
+    os.replace(temporary, cache_path)
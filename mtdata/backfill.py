@@ -0,0 +1,265 @@
+import json
+import os
+from datetime import date, timedelta
+from typing import Iterable, List, NamedTuple, Optional, Sequence, Set, Tuple, Type
+
+from .dataset import Dataset
+from .row import Row
+from .storage import Storage, StoreResult
+
+# Fetched rows are appended to the stores once at least this many have
+# been fetched, so each store is written a few large batches rather than
+# one small batch per window.
+BACKFILL_BATCH = 50_000
+
+# Windows fetched at the same time, unless told otherwise.
+BACKFILL_WORKERS = 4
+
+Window = Tuple[date, date]
+
+
+class BackfillResult(NamedTuple):
+    """
+    The result of backfilling a dataset over a range of dates.
+
+    ``windows`` is the number of windows the range was split into, and
+    ``skipped`` the number of them that an earlier backfill had already
+    stored. ``rows`` is the number of rows given to the stores, before
+    they were de-duplicated. If a fetch or a store failed, ``success`` is
+    ``False`` and ``message`` says why. The windows stored before the
+    failure are checkpointed, so running the backfill again resumes
+    after them.
+    """
+
+    success: bool
+    message: str
+    name: str
+    windows: int
+    skipped: int
+    rows: int
+    store_results: List[StoreResult]
+
+
+def split_windows(start: date, end: date, window: timedelta) -> List[Window]:
+    """
+    Split the dates from ``start`` through ``end`` into consecutive windows,
+    each covering at most ``window`` (rounded down to whole days, but at
+    least one day), first and last date included.
+
+    >>> windows = split_windows(date(2021, 1, 1), date(2021, 1, 17), timedelta(7))
+    >>> [f'{s.day}-{e.day}' for s, e in windows]
+    ['1-7', '8-14', '15-17']
+    """
+    days = max(1, window.days)
+    windows = []
+    while start <= end:
+        last = min(start + timedelta(days=days - 1), end)
+        windows.append((start, last))
+        start = last + timedelta(days=1)
+    return windows
+
+
+class BackfillCheckpoint:
+    """
+    The windows of a dataset that have been backfilled into a namespace,
+    kept in ``<namespace>/backfill/<dataset>.json`` so that a backfill
+    that was interrupted, or failed, can be resumed without fetching
+    them again. Windows are only skipped if they match exactly, so a
+    resumed backfill should start from the same date.
+    """
+
+    _path: str
+
+    def __init__(self, namespace: str, name: str):
+        self._path = os.path.join(namespace, "backfill", f"{name}.json")
+
+    @property
+    def path(self) -> str:
+        return self._path
+
+    def completed(self) -> Set[Window]:
+        """
+        The windows that have been stored.
+        """
+        try:
+            with open(self._path, "r") as file:
+                windows = json.load(file)["windows"]
+        except (FileNotFoundError, KeyError, ValueError):
+            return set()
+        return {(date.fromisoformat(s), date.fromisoformat(e)) for s, e in windows}
+
+    def add(self, windows: Iterable[Window]) -> None:
+        """
+        Record that the given windows have been stored.
+        """
+        from .locking import temporary_path
+
+        completed = self.completed()
+        completed.update(windows)
+        os.makedirs(os.path.dirname(self._path), exist_ok=True)
+        temporary = temporary_path(self._path)
+        with open(temporary, "w") as file:
+            json.dump(
+                {
+                    "windows": [
+                        [s.isoformat(), e.isoformat()] for s, e in sorted(completed)
+                    ]
+                },
+                file,
+            )
+            file.write("\n")
+        os.replace(temporary, self._path)
+
+
+def _store_batch(
+    dataset: Dataset,
+    stores: Sequence[Storage],
+    rows: List[Row],
+    store_results: List[StoreResult],
+) -> Optional[str]:
+    """
+    Transform a batch of fetched rows, put them in chronological order,
+    and append them to each store. The results are added to
+    ``store_results``, and the reasons for any failures are returned.
+
+    Windows can overlap at their edges, so rows that repeat the facets
+    and fields of an earlier row in the batch are dropped first. The
+    stores only compare new rows to the ones they already hold.
+    """
+    from .schema import time_key
+
+    transformer = dataset.transformer
+    transformed = Storage.drop_repeats(
+        (transformer(row) for row in rows),
+        dataset.dedup_facets,
+        dataset.dedup_fields,
+    )
+
+    time_field = dataset.time_field
+    if time_field is not None:
+        sort_key = time_key(dataset.parse_time)
+        transformed.sort(key=lambda row: sort_key(row[time_field]))
+
+    failures = []
+    for store in stores:
+        store_result = store.append(
+            name=dataset.name(),
+            data=transformed,
+            dedup_facets=dataset.dedup_facets,
+            dedup_fields=dataset.dedup_fields,
+        )
+        store_results.append(store_result)
+        if not store_result.success:
+            failures.append(f"{store.name()}: {store_result.message}")
+    return "; ".join(failures) or None
+
+
+def backfill(
+    dataset_class: Type[Dataset],
+    store_classes: Iterable[Type[Storage]],
+    namespace: str,
+    start: date,
+    end: date,
+    workers: int = BACKFILL_WORKERS,
+    spatial_index: bool = False,
+    batch_size: int = BACKFILL_BATCH,
+) -> BackfillResult:
+    """
+    Fetch the history of a dataset from ``start`` through ``end`` and
+    append it to the given stores, for datasets that have a
+    ``fetch_window``.
+
+    The range is split into windows no longer than the dataset's
+    ``fetch_window``, and up to ``workers`` of them are fetched at once.
+    Windows are stored in chronological order regardless of the order
+    they arrive in, and no more than twice ``workers`` are fetched ahead
+    of the oldest one that hasn't arrived yet, so memory use doesn't
+    grow with the length of the range. Each batch is de-duplicated
+    against the stores as usual, so a range that overlaps data that is
+    already stored only adds the missing rows.
+    """
+    from collections import deque
+    from concurrent.futures import Future, ThreadPoolExecutor
+    from functools import partial
+
+    from .dataset import FetchResult
+    from .registry import store_options
+    from .retry import retry
+
+    dataset = dataset_class()
+    name = dataset.name()
+    window = dataset.fetch_window
+    if window is None:
+        raise ValueError(f"dataset {name} can't fetch a range of dates")
+
+    windows = split_windows(start, end, window)
+    checkpoint = BackfillCheckpoint(namespace, name)
+    completed = checkpoint.completed()
+    remaining = [w for w in windows if w not in completed]
+    pending = iter(remaining)
+
+    options = store_options(dataset, spatial_index)
+    stores = [
+        store_class(namespace=namespace, options=options)
+        for store_class in store_classes
+    ]
+
+    store_results: List[StoreResult] = []
+    stored = 0
+    batch: List[Row] = []
+    batch_windows: List[Window] = []
+    message = ""
+
+    with ThreadPoolExecutor(max_workers=workers) as executor:
+        in_flight: "deque[Tuple[Window, Future[FetchResult]]]" = deque()
+
+        def submit() -> None:
+            # Keep a bounded number of windows fetching ahead of the
+            # oldest one, which is the next to be stored
+            for next_window in pending:
+                fetch = partial(dataset.fetch_range, *next_window)
+                in_flight.append((next_window, executor.submit(retry, fetch)))
+                if len(in_flight) >= 2 * workers:
+                    break
+
+        submit()
+        while in_flight:
+            current, future = in_flight.popleft()
+            fetch_result = future.result()
+            if fetch_result.success:
+                batch.extend(fetch_result.data)
+                batch_windows.append(current)
+                submit()
+            else:
+                message = (
+                    f"fetching {current[0]} to {current[1]} failed: "
+                    f"{fetch_result.message}"
+                )
+                for _, waiting in in_flight:
+                    waiting.cancel()
+                # The windows before this one are still stored below
+                in_flight.clear()
+
+            if batch_windows and (len(batch) >= batch_size or not in_flight):
+                if batch:
+                    failure = _store_batch(dataset, stores, batch, store_results)
+                    if failure is not None:
+                        message = f"storing failed: {failure}"
+                        break
+                stored += len(batch)
+                checkpoint.add(batch_windows)
+                batch = []
+                batch_windows = []
+
+        for _, waiting in in_flight:
+            waiting.cancel()
+
+    return BackfillResult(
+        success=not message,
+        message=message,
+        name=name,
+        windows=len(windows),
+        skipped=len(windows) - len(remaining),
+        rows=stored,
+        store_results=store_results,
+    )
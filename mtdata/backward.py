@@ -35,3 +35,55 @@ def read_backward(file: BinaryIO) -> Iterable[str]:
         if offset == 0:
             file.seek(offset)
             yield file.readline().decode()
+
+
+def read_records_backward(file: BinaryIO, block_size: int = 1 << 16) -> Iterable[str]:
+    """
+    Read the records of a CSV file (opened in binary mode) backward, from
+    the last record to the first. Unlike ``read_backward``, a newline
+    inside a double-quoted field doesn't end a record, and the file is
+    read in blocks rather than a byte at a time.
+
+    This works because the end of the file is never inside a quoted
+    field, so a newline ends a record exactly when it is followed by an
+    even number of double quotes.
+
+    >>> from io import BytesIO
+    >>> list(read_records_backward(BytesIO(b'a,b\\n"x\\ny",1\\n"z",2\\n'), 4))
+    ['"z",2\\n', '"x\\ny",1\\n', 'a,b\\n']
+    >>> list(read_records_backward(BytesIO(b'a\\n"b""\\n"')))
+    ['"b""\\n"', 'a\\n']
+    >>> list(read_records_backward(BytesIO(b'')))
+    []
+    """
+    file.seek(0, os.SEEK_END)
+    position = file.tell()
+
+    # The start of the record currently being assembled, which may
+    # continue into the blocks we haven't read yet
+    pending = b""
+
+    while position > 0:
+        size = min(block_size, position)
+        position -= size
+        file.seek(position)
+        data = file.read(size) + pending
+
+        record_end = len(data)
+        search_end = len(data) - len(pending) if pending else len(data)
+        # A newline at the very end of the data ends the record before it
+        search_end = min(search_end, len(data) - 1)
+        while True:
+            newline = data.rfind(b"\n", 0, search_end)
+            if newline == -1:
+                break
+            if data.count(b'"', newline + 1, record_end) % 2 == 0:
+                if newline + 1 < record_end:
+                    yield data[newline + 1 : record_end].decode()
+                record_end = newline + 1
+            search_end = newline
+
+        pending = data[:record_end]
+
+    if pending:
+        yield pending.decode()
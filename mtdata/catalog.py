@@ -0,0 +1,147 @@
+import json
+import os
+from datetime import datetime
+from typing import Any, Callable, Dict, Iterable, List, NamedTuple, Optional
+
+from .row import Row
+
+FacetCounts = Dict[str, Dict[str, int]]
+
+
+class CatalogEntry(NamedTuple):
+    """
+    Statistics about the data a store holds for one dataset, kept up to
+    date as rows are written so that they never need to be computed by
+    reading the data.
+
+    ``time_min`` and ``time_max`` are the earliest and latest values of
+    the dataset's time field, as stored. ``facets`` maps each facet to
+    the number of rows with each of its values (as strings).
+    ``last_append`` is when rows were last written (ISO 8601), and
+    ``bytes`` is ``None`` if the store can't report its size.
+    """
+
+    dataset: str
+    store: str
+    rows: int = 0
+    bytes: Optional[int] = None
+    time_min: Any = None
+    time_max: Any = None
+    facets: FacetCounts = {}
+    last_append: Optional[str] = None
+
+    def add(
+        self,
+        rows: Iterable[Row],
+        time_field: Optional[str] = None,
+        parse_time: Optional[Callable[[Any], datetime]] = None,
+        facets: Iterable[str] = (),
+    ) -> "CatalogEntry":
+        """
+        Return a copy of the entry that also accounts for the given rows.
+
+        >>> entry = CatalogEntry('d', 's').add(
+        ...     [{'t': '2021-01-02', 'f': 'a'}, {'t': '2021-01-01', 'f': 'a'}],
+        ...     't', datetime.fromisoformat, ['f'])
+        >>> entry.rows, entry.time_min, entry.time_max, entry.facets
+        (2, '2021-01-01', '2021-01-02', {'f': {'a': 2}})
+        """
+        facet_list = list(facets)
+        counts = {facet: dict(values) for facet, values in self.facets.items()}
+        for facet in facet_list:
+            counts.setdefault(facet, {})
+
+        time_min, time_max = self.time_min, self.time_max
+        low = high = None
+        if time_field is not None and parse_time is not None:
+            low = None if time_min is None else parse_time(time_min)
+            high = None if time_max is None else parse_time(time_max)
+
+        # A single pass, so that the rows can be streamed
+        count = 0
+        for row in rows:
+            count += 1
+            for facet in facet_list:
+                values = counts[facet]
+                value = str(row.get(facet))
+                values[value] = values.get(value, 0) + 1
+
+            if time_field is None or parse_time is None:
+                continue
+            stamp = row.get(time_field)
+            if stamp is None:
+                continue
+            time = parse_time(stamp)
+            if low is None or time < low:
+                low, time_min = time, stamp
+            if high is None or time > high:
+                high, time_max = time, stamp
+
+        return self._replace(
+            rows=self.rows + count,
+            time_min=time_min,
+            time_max=time_max,
+            facets=counts,
+            last_append=datetime.now().isoformat(timespec="seconds"),
+        )
+
+
+def catalog_directory(namespace: str) -> str:
+    """
+    The directory that holds the catalog entries for a namespace.
+    """
+    return os.path.join(namespace, "catalog")
+
+
+def catalog_path(namespace: str, name: str, store: str) -> str:
+    """
+    The path of the catalog entry for the given dataset and store.
+    """
+    return os.path.join(catalog_directory(namespace), f"{name}.{store}.json")
+
+
+def load_entry(namespace: str, name: str, store: str) -> Optional[CatalogEntry]:
+    """
+    Load the catalog entry for the given dataset and store, or ``None``
+    if there isn't one.
+    """
+    try:
+        with open(catalog_path(namespace, name, store), "r") as file:
+            return CatalogEntry(**json.load(file))
+    except (FileNotFoundError, TypeError, ValueError):
+        return None
+
+
+def save_entry(namespace: str, entry: CatalogEntry) -> None:
+    """
+    Persist a catalog entry, replacing the previous one.
+    """
+    path = catalog_path(namespace, entry.dataset, entry.store)
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    # Write somewhere else first so readers never see a partial file
+    temporary = f"{path}.tmp"
+    with open(temporary, "w") as file:
+        json.dump(entry._asdict(), file, sort_keys=True)
+        file.write("\n")
+    os.replace(temporary, path)
+
+
+def all_entries(namespace: str) -> List[CatalogEntry]:
+    """
+    Load every catalog entry in the namespace, sorted by dataset and
+    store.
+    """
+    try:
+        names = sorted(os.listdir(catalog_directory(namespace)))
+    except FileNotFoundError:
+        return []
+
+    entries = []
+    for file_name in names:
+        parts = file_name.split(".")
+        if len(parts) != 3 or parts[2] != "json":
+            continue
+        entry = load_entry(namespace, parts[0], parts[1])
+        if entry is not None:
+            entries.append(entry)
+    return entries
@@ -0,0 +1,247 @@
+import os
+from typing import Any, BinaryIO, Callable, Iterator, List, Optional, Sequence, Tuple
+
+from .projection import Fields, decode_json_line, record_builder
+from .row import Row
+from .schema import FieldTypes
+
+ByteRange = Tuple[int, int]
+
+# Each worker gets several ranges so that one slow range doesn't hold up
+# the whole load.
+RANGES_PER_WORKER = 4
+
+_BLOCK_SIZE = 1 << 20
+
+
+def split_ranges(
+    path: str, count: int, start: int = 0, quoted: bool = False
+) -> List[ByteRange]:
+    """
+    Split the file at the given path into at most ``count`` byte ranges
+    of roughly equal size, beginning at offset ``start``. Each range ends
+    just after a newline (or at the end of the file), so every range
+    holds whole lines.
+
+    If ``quoted`` is ``True``, newlines that fall inside a double-quoted
+    (CSV) field are not used as split points. This requires reading the
+    whole file, but only to count quotes.
+
+    >>> import tempfile
+    >>> with tempfile.NamedTemporaryFile() as file:
+    ...     _ = file.write(b'aa\\nbb\\ncc\\ndd\\n')
+    ...     file.flush()
+    ...     split_ranges(file.name, 2)
+    [(0, 6), (6, 12)]
+    >>> with tempfile.NamedTemporaryFile() as file:
+    ...     _ = file.write(b'aa\\n"b\\nb"\\ncc\\n')
+    ...     file.flush()
+    ...     split_ranges(file.name, 4, quoted=True)
+    [(0, 3), (3, 9), (9, 12)]
+    """
+    size = os.path.getsize(path)
+    if size <= start:
+        return []
+
+    targets = [start + (size - start) * i // count for i in range(1, count)]
+    bounds = [start]
+
+    with open(path, "rb") as file:
+        if quoted:
+            bounds.extend(_quoted_split_points(file, start, targets))
+        else:
+            for target in targets:
+                if target <= bounds[-1]:
+                    continue
+                # Back up one byte so that a newline right before the
+                # target makes the target itself a split point.
+                file.seek(target - 1)
+                file.readline()
+                point = file.tell()
+                if point >= size:
+                    break
+                if point > bounds[-1]:
+                    bounds.append(point)
+
+    bounds = [b for b in bounds if b < size]
+    bounds.append(size)
+    return list(zip(bounds, bounds[1:]))
+
+
+def _quoted_split_points(file, start: int, targets: Sequence[int]) -> List[int]:
+    """
+    Find the first record boundary at or after each target, treating
+    newlines inside double-quoted fields as part of the field.
+    """
+    points: List[int] = []
+    remaining = list(targets)
+
+    file.seek(start)
+    offset = start
+    inside = False
+    while remaining:
+        block = file.read(_BLOCK_SIZE)
+        if not block:
+            break
+
+        search = 0
+        while remaining:
+            target = max(remaining[0], offset + 1)
+            if target - offset > len(block):
+                break
+            newline = block.find(b"\n", max(target - offset - 1, search))
+            if newline == -1:
+                break
+            quotes = block.count(b'"', 0, newline)
+            search = newline + 1
+            if (quotes % 2 == 1) != inside:
+                continue
+            point = offset + newline + 1
+            if not points or point > points[-1]:
+                points.append(point)
+            while remaining and remaining[0] < point:
+                remaining.pop(0)
+
+        inside = inside != (block.count(b'"') % 2 == 1)
+        offset += len(block)
+
+    return points
+
+
+def bisect_lines(file: BinaryIO, key: Callable[[bytes], Any], target: Any) -> int:
+    """
+    Find the offset of the first line in a file (opened in binary mode)
+    for which ``key(line) >= target``, assuming the lines are sorted by
+    ``key``. Returns the length of the file if there is no such line.
+    Only a logarithmic number of lines are read.
+
+    >>> from io import BytesIO
+    >>> data = BytesIO(b'1\\n3\\n3\\n5\\n')
+    >>> [bisect_lines(data, int, t) for t in [0, 2, 3, 4, 6]]
+    [0, 2, 2, 6, 8]
+    """
+    file.seek(0, os.SEEK_END)
+    low, high = 0, file.tell()
+
+    # Every line that begins before `low` is less than the target, and
+    # every line that begins at or after `high` is not. `low` is always
+    # the beginning of a line.
+    while low < high:
+        middle = (low + high) // 2
+        if middle == 0:
+            start = 0
+        else:
+            file.seek(middle - 1)
+            file.readline()
+            start = file.tell()
+
+        if start >= high:
+            high = middle
+            continue
+
+        file.seek(start)
+        line = file.readline()
+        if key(line) < target:
+            low = start + len(line)
+        else:
+            high = start
+
+    return low
+
+
+def read_records(file: BinaryIO, start: int = 0) -> Iterator[Tuple[int, bytes]]:
+    """
+    Read the CSV records of a file (opened in binary mode) beginning at
+    the given offset, which must be the start of a record, and yield each
+    along with its offset. Quoted fields may span lines.
+
+    >>> from io import BytesIO
+    >>> list(read_records(BytesIO(b'a\\n"b\\nc"\\nd\\n'), 2))
+    [(2, b'"b\\nc"\\n'), (8, b'd\\n')]
+    """
+    file.seek(start)
+    offset = start
+    parts: List[bytes] = []
+    quotes = 0
+    for line in iter(file.readline, b""):
+        parts.append(line)
+        quotes += line.count(b'"')
+        if quotes % 2 == 0:
+            record = b"".join(parts)
+            yield offset, record
+            offset += len(record)
+            parts = []
+            quotes = 0
+
+    if parts:
+        yield offset, b"".join(parts)
+
+
+def parse_json_range(
+    path: str, start: int, end: int, fields: Fields = None
+) -> List[Row]:
+    """
+    Parse the JSON-lines in the given byte range of a file, decoding only
+    the given fields if ``fields`` isn't ``None``.
+    """
+    with open(path, "rb") as file:
+        file.seek(start)
+        chunk = file.read(end - start).decode()
+
+    return [
+        decode_json_line(line, fields) for line in chunk.splitlines() if line.strip()
+    ]
+
+
+def parse_csv_range(
+    path: str,
+    start: int,
+    end: int,
+    fieldnames: List[str],
+    fields: Fields = None,
+    types: Optional[FieldTypes] = None,
+) -> List[Row]:
+    """
+    Parse the CSV records in the given byte range of a file using the
+    given field names (the range must not include the header), keeping
+    only the given fields if ``fields`` isn't ``None`` and converting the
+    ones that have ``types``, see :func:`mtdata.projection.record_builder`.
+    """
+    from csv import reader, QUOTE_NONNUMERIC
+    from io import StringIO
+
+    with open(path, "rb") as file:
+        file.seek(start)
+        chunk = file.read(end - start).decode()
+
+    build = record_builder(fieldnames, fields, types)
+    records = reader(StringIO(chunk, newline=""), quoting=QUOTE_NONNUMERIC)
+    return [build(record) for record in records if record]
+
+
+def load_ranges(
+    parse: Callable[..., List[Row]],
+    path: str,
+    ranges: Sequence[ByteRange],
+    workers: int,
+    ordered: bool = True,
+    args: Tuple = (),
+) -> Iterator[Row]:
+    """
+    Parse the given byte ranges of a file using a pool of worker
+    processes and yield the resulting rows. If ``ordered`` is ``True``
+    the rows come back in file order, otherwise each range is yielded
+    as soon as it has been parsed.
+
+    The ``args`` are passed to ``parse`` after the path and the
+    beginning and end of the range.
+    """
+    from concurrent.futures import ProcessPoolExecutor, as_completed
+
+    with ProcessPoolExecutor(max_workers=workers) as executor:
+        futures = [
+            executor.submit(parse, path, start, end, *args) for start, end in ranges
+        ]
+        completed = futures if ordered else as_completed(futures)
+        for future in completed:
+            yield from future.result()
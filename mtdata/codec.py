@@ -0,0 +1,120 @@
+import json
+from csv import QUOTE_NONNUMERIC, writer
+from functools import lru_cache
+from io import StringIO
+from operator import itemgetter
+from types import ModuleType
+from typing import Any, Iterable, Iterator, Optional, Sequence
+
+from .row import Row
+
+# Configured once and reused, ``json.dump`` would build a new encoder (and
+# use the slow, pure-Python encoding path) for every row.
+_json_encoder = json.JSONEncoder(sort_keys=True)
+
+
+@lru_cache(maxsize=None)
+def _orjson() -> Optional[ModuleType]:
+    """
+    The ``orjson`` module, if it is installed. It is a good deal faster
+    than the standard library encoder, but it isn't required.
+    """
+    try:
+        import orjson  # type: ignore
+    except ImportError:
+        return None
+    return orjson
+
+
+def encode_json_rows(rows: Sequence[Row]) -> bytes:
+    """
+    Serialize a block of rows as JSON-lines (UTF-8), with the keys of
+    each row sorted, so that the block can be written all at once.
+
+    If ``orjson`` is installed it is used, unless the block holds
+    something it can't encode (such as an integer that doesn't fit in 64
+    bits). Note that ``orjson`` writes ``NaN`` as ``null`` and leaves out
+    the spaces after separators, neither of which matters to readers.
+
+    >>> encode_json_rows([{'b': 1, 'a': None}]).replace(b' ', b'')
+    b'{"a":null,"b":1}\\n'
+    >>> encode_json_rows([])
+    b''
+    """
+    if not rows:
+        return b""
+
+    orjson = _orjson()
+    if orjson is not None:
+        options = orjson.OPT_SORT_KEYS | orjson.OPT_APPEND_NEWLINE
+        try:
+            return b"".join([orjson.dumps(row, option=options) for row in rows])
+        except TypeError:
+            # orjson.JSONEncodeError is a TypeError
+            pass
+
+    lines = map(_json_encoder.encode, rows)
+    return ("\n".join(lines) + "\n").encode()
+
+
+def _header_records(
+    rows: Iterable[Row], header: Sequence[str]
+) -> Iterator[Sequence[Any]]:
+    """
+    Turn rows into CSV records with values in header order. Rows that
+    have exactly the header's fields are converted with a single cached
+    ``itemgetter``, others have missing values filled in with empty
+    strings. A row with a field that isn't in the header is an error.
+
+    >>> list(_header_records([{'b': 2, 'a': 1}, {'a': 3}], ['a', 'b']))
+    [(1, 2), [3, '']]
+    """
+    columns = list(header)
+    width = len(columns)
+    getter = itemgetter(*columns)
+    known = set(columns)
+
+    for row in rows:
+        if len(row) == width:
+            try:
+                values = getter(row)
+            except KeyError:
+                pass
+            else:
+                yield values if width > 1 else (values,)
+                continue
+
+        extra = row.keys() - known
+        if extra:
+            raise ValueError(
+                "dict contains fields not in fieldnames: "
+                + ", ".join(repr(field) for field in sorted(extra))
+            )
+        yield [row.get(column, "") for column in columns]
+
+
+def encode_csv_rows(rows: Iterable[Row], header: Sequence[str]) -> str:
+    """
+    Serialize a block of rows as CSV records in header order, quoting
+    every non-numeric value, so that the block can be written all at
+    once.
+
+    >>> encode_csv_rows([{'b': 'x', 'a': 1}], ['a', 'b'])
+    '1,"x"\\r\\n'
+    """
+    buffer = StringIO()
+    writer(buffer, quoting=QUOTE_NONNUMERIC).writerows(_header_records(rows, header))
+    return buffer.getvalue()
+
+
+def encode_csv_header(header: Sequence[str]) -> str:
+    """
+    Serialize a CSV header the same way ``encode_csv_rows`` serializes
+    records.
+
+    >>> encode_csv_header(['a', 'b'])
+    '"a","b"\\r\\n'
+    """
+    buffer = StringIO()
+    writer(buffer, quoting=QUOTE_NONNUMERIC).writerow(header)
+    return buffer.getvalue()
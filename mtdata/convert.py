@@ -0,0 +1,59 @@
+from itertools import chain, islice
+from typing import Iterable, Iterator
+
+from .row import Row
+from .storage import Storage, StoreResult
+
+
+def convert(name: str, source: Storage, target: Storage) -> StoreResult:
+    """
+    Replace the data the target store holds for the dataset with the
+    given name with the data the source store holds for it.
+
+    When both stores are of the same kind and keep their data in a
+    single file, the file is copied without decoding anything (see
+    ``Storage.copy_from``). Otherwise rows are streamed from the source's
+    ``load`` into the target's ``replace``, which writes them in batches,
+    so the dataset never has to fit in memory.
+
+    The message of the result describes what was done.
+    """
+    try:
+        result = target.copy_from(name, source)
+    except ValueError:
+        pass
+    else:
+        if result.success:
+            size = target.data_length(name)
+            result = result._replace(message=f"copied {size} bytes")
+        return result
+
+    rows = iter(source.load(name))
+    first = list(islice(rows, 1))
+    if not first:
+        # Don't wipe out the target because of a typo
+        return StoreResult(success=False, message=f"no data for {name}")
+
+    counter = _Counter(chain(first, rows))
+    result = target.replace(name, counter)
+    if result.success:
+        result = result._replace(message=f"converted {counter.count} rows")
+    return result
+
+
+class _Counter:
+    """
+    Pass rows through, counting them along the way.
+    """
+
+    count: int
+    _rows: Iterable[Row]
+
+    def __init__(self, rows: Iterable[Row]):
+        self.count = 0
+        self._rows = rows
+
+    def __iter__(self) -> Iterator[Row]:
+        for row in self._rows:
+            self.count += 1
+            yield row
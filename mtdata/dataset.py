@@ -1,9 +1,13 @@
 from abc import ABC, abstractmethod
-from typing import NamedTuple, Iterable
+from datetime import date, datetime, timedelta
+from typing import Any, NamedTuple, Iterable, Optional, Tuple
 
 from .row import Row
+from .schema import EpochTime
 from .transformer import Transformer
 
+_ISO_TIME = EpochTime()
+
 
 class FetchResult(NamedTuple):
     """
@@ -20,11 +24,17 @@ class FetchResult(NamedTuple):
     that were acquired from the data source. It may be empty if there
     were no rows available (this will depend on the source). It should
     also be empty on failure.
+
+    The ``raw`` field may contain the payload exactly as it was received
+    from the source. When it is non-empty it is used to detect fetches
+    that returned nothing new so that the rest of the update can be
+    skipped.
     """
 
     success: bool
     message: str
     data: Iterable[Row]
+    raw: bytes = b""
 
 
 class Dataset(ABC):
@@ -79,6 +89,56 @@ class Dataset(ABC):
         the data source before it is stored.
         """
 
+    @property
+    def time_field(self) -> Optional[str]:
+        """
+        The (transformed) field that records when the event described by
+        each row happened, or ``None`` if the rows aren't timestamped. It
+        is used to answer time range queries.
+        """
+        return None
+
+    def parse_time(self, value: Any) -> datetime:
+        """
+        Convert a value of the ``time_field`` into a ``datetime``. The
+        default implementation expects the epoch seconds that an
+        :class:`mtdata.schema.EpochTime` field holds, or an ISO 8601
+        string (as rows stored before the field was typed hold).
+
+        >>> Dataset.parse_time(None, 1631498400)
+        datetime.datetime(2021, 9, 13, 2, 0)
+        >>> Dataset.parse_time(None, '2021-09-13T02:00')
+        datetime.datetime(2021, 9, 13, 2, 0)
+        """
+        return _ISO_TIME.parse(value)
+
+    @property
+    def spatial_fields(self) -> Optional[Tuple[str, str]]:
+        """
+        The (transformed) fields that hold the latitude and longitude, in
+        that order, of the place each row describes, or ``None`` if the
+        rows aren't located. They are used to answer spatial queries.
+        """
+        return None
+
+    @property
+    def fetch_window(self) -> Optional[timedelta]:
+        """
+        The longest span of time that ``fetch_range`` can fetch at once, or
+        ``None`` if the source can only be asked for its latest data. It
+        is used to backfill the history of a dataset, see
+        :func:`mtdata.backfill.backfill`.
+        """
+        return None
+
+    def fetch_range(self, start: date, end: date) -> FetchResult:
+        """
+        Fetch the data from the ``start`` date through the ``end`` date,
+        inclusive, which will be no more than ``fetch_window`` apart.
+        Datasets that have a ``fetch_window`` must implement this.
+        """
+        raise NotImplementedError(f"{self.name()} can't fetch a range of dates")
+
     @abstractmethod
     def fetch(self) -> FetchResult:
         """
@@ -1,6 +1,7 @@
-from typing import List, Iterable
+from typing import List, Iterable, Optional, Tuple
 
 from ..dataset import Dataset, FetchResult, Row
+from ..schema import EpochTime, Float, Integer
 from ..transformer import Transformer
 
 _URL = "https://www.airnowapi.org/aq/data/"
@@ -34,31 +35,41 @@ class AirQuality(Dataset):
     def dedup_fields(self) -> Iterable[str]:
         return ["utc_timestamp"]
 
+    @property
+    def time_field(self) -> Optional[str]:
+        return "utc_timestamp"
+
+    @property
+    def spatial_fields(self) -> Optional[Tuple[str, str]]:
+        return ("latitude", "longitude")
+
     @property
     def transformer(self) -> Transformer:
         return Transformer(
             [
-                ("aqi", "AQI"),
+                ("aqi", "AQI", Integer()),
                 ("agency_name", "AgencyName"),
                 ("category", "Category"),
                 ("full_aqs_code", "FullAQSCode"),
                 ("intl_aqs_code", "IntlAQSCode"),
-                ("latitude", "Latitude"),
-                ("longitude", "Longitude"),
+                ("latitude", "Latitude", Float()),
+                ("longitude", "Longitude", Float()),
                 ("parameter", "Parameter"),
                 ("site_name", "SiteName"),
-                ("utc_timestamp", "UTC"),
+                ("utc_timestamp", "UTC", EpochTime()),
                 ("unit", "Unit"),
             ]
         )
 
     def fetch(self) -> FetchResult:
-        import requests
+        from ..source import http_get
 
         # It seems as though AirNow let their cert expire,
         # so we can just ignore it for now since we aren't
         # doing anything terribly important.
-        resp = requests.get(_URL, _PARAMS, verify=False)
+        resp = http_get(self.name(), _URL, _PARAMS, verify=False)
+        if resp.status_code != 200:
+            return FetchResult(False, resp.text, [])
         data: List[Row] = resp.json()
 
-        return FetchResult(resp.status_code == 200, resp.text, data)
+        return FetchResult(resp.status_code == 200, resp.text, data, resp.content)
@@ -1,10 +1,14 @@
-from typing import List, Iterable
+from datetime import date, datetime, timedelta
+from typing import Any, List, Iterable, Optional, Tuple
 
 from ..dataset import Dataset, FetchResult, Row
+from ..schema import EpochTime, Float
 from ..transformer import Transformer
 
 _URL = "https://apps.missoulacounty.us/dailypublicreport/pinpoints.ashx"
 
+_TIMESTAMP = EpochTime("%m/%d/%Y %I:%M:%S %p")
+
 _transformer = Transformer()
 
 
@@ -21,15 +25,31 @@ class Missoula911(Dataset):
     def dedup_fields(self) -> Iterable[str]:
         return ["cfs_number"]
 
+    @property
+    def time_field(self) -> Optional[str]:
+        return "timestamp"
+
+    def parse_time(self, value: Any) -> datetime:
+        return _TIMESTAMP.parse(value)
+
+    @property
+    def spatial_fields(self) -> Optional[Tuple[str, str]]:
+        return ("latitude", "longitude")
+
     @property
     def transformer(self) -> Transformer:
         return Transformer(
             [
                 ("agency", "Agency"),
                 ("cfs_number", "CFSNumber"),
-                ("latitude", "Latitude"),
-                ("longitude", "Longitude"),
-                ("timestamp", "Description", lambda x: x.split(" / ")[0].strip()),
+                ("latitude", "Latitude", Float()),
+                ("longitude", "Longitude", Float()),
+                (
+                    "timestamp",
+                    "Description",
+                    lambda x: x.split(" / ")[0].strip(),
+                    _TIMESTAMP,
+                ),
                 ("title", "Title"),
             ]
         )
@@ -38,18 +58,25 @@ class Missoula911(Dataset):
     def name() -> str:
         return "missoula_911"
 
-    def fetch(self) -> FetchResult:
-        from datetime import datetime, timedelta
-        import requests
+    @property
+    def fetch_window(self) -> Optional[timedelta]:
+        return timedelta(days=7)
+
+    def fetch_range(self, start: date, end: date) -> FetchResult:
+        from ..source import http_get
 
-        start = datetime.today() - timedelta(days=7)
-        end = datetime.today()
         params = {
             "startdate": f"{start.month}/{start.day}/{start.year}",
             "enddate": f"{end.month}/{end.day}/{end.year}",
         }
 
-        resp = requests.get(_URL, params)
+        resp = http_get(self.name(), _URL, params)
+        if resp.status_code != 200:
+            return FetchResult(False, resp.text, [])
         data: List[Row] = resp.json()
 
-        return FetchResult(resp.status_code == 200, resp.text, data)
+        return FetchResult(resp.status_code == 200, resp.text, data, resp.content)
+
+    def fetch(self) -> FetchResult:
+        today = date.today()
+        return self.fetch_range(today - timedelta(days=7), today)
@@ -1,6 +1,7 @@
-from typing import List, Iterable
+from typing import List, Iterable, Optional
 
 from ..dataset import Dataset, FetchResult, Row
+from ..schema import EpochTime, Integer
 from ..transformer import Transformer
 
 _URL = "https://services.arcgis.com/qnjIrwR8z5Izc0ij/ArcGIS/rest/services/COVID_Cases_Production_View/FeatureServer/0/query"
@@ -45,26 +46,33 @@ class CovidCounts(Dataset):
             "recovered_cases",
         ]
 
+    @property
+    def time_field(self) -> Optional[str]:
+        return "fetch_date"
+
     @property
     def transformer(self) -> Transformer:
         return Transformer(
             [
                 ("county", "NAMELABEL"),
                 ("county_fips", "ALLFIPS"),
-                ("fetch_date", "fetch_date"),
-                ("cumulative_cases", "Total"),
-                ("new_cases", "NewCases"),
-                ("cumulative_deaths", "TotalDeaths"),
-                ("active_cases", "TotalActive"),
-                ("recovered_cases", "TotalRecovered"),
+                ("fetch_date", "fetch_date", EpochTime("%Y-%m-%d")),
+                ("cumulative_cases", "Total", Integer()),
+                ("new_cases", "NewCases", Integer()),
+                ("cumulative_deaths", "TotalDeaths", Integer()),
+                ("active_cases", "TotalActive", Integer()),
+                ("recovered_cases", "TotalRecovered", Integer()),
             ]
         )
 
     def fetch(self) -> FetchResult:
-        import requests
         from datetime import date
 
-        resp = requests.get(_URL, _PARAMS)
+        from ..source import http_get
+
+        resp = http_get(self.name(), _URL, _PARAMS)
+        if resp.status_code != 200:
+            return FetchResult(False, resp.text, [])
         raw = resp.json()
 
         data: List[Row] = [item["attributes"] for item in raw["features"]]
@@ -72,4 +80,4 @@ class CovidCounts(Dataset):
         for row in data:
             row["fetch_date"] = date.today().strftime("%Y-%m-%d")
 
-        return FetchResult(resp.status_code == 200, resp.text, data)
+        return FetchResult(resp.status_code == 200, resp.text, data, resp.content)
@@ -0,0 +1,50 @@
+from os import path
+from typing import Optional
+
+
+def payload_fingerprint(raw: bytes) -> str:
+    """
+    Compute a stable fingerprint for a raw fetch payload. Two payloads
+    with the same fingerprint can be assumed to be byte-identical.
+
+    >>> payload_fingerprint(b'abc')[:16]
+    'ba7816bf8f01cfea'
+    """
+    from hashlib import sha256
+
+    return sha256(raw).hexdigest()
+
+
+def fingerprint_path(namespace: str, name: str, store: str) -> str:
+    """
+    The path of the file used to persist the fingerprint for the dataset
+    with the given name, as stored by the store with the given name,
+    within the given namespace. Each store keeps its own, so a payload
+    one store already has is still given to the others.
+
+    >>> fingerprint_path('data', 'air_quality', 'csv')
+    'data/air_quality.csv.fingerprint'
+    """
+    return path.join(namespace, f"{name}.{store}.fingerprint")
+
+
+def load_fingerprint(namespace: str, name: str, store: str) -> Optional[str]:
+    """
+    Load the most recently saved fingerprint for the given dataset and
+    store, or ``None`` if no fingerprint has been saved yet.
+    """
+    try:
+        with open(fingerprint_path(namespace, name, store), "r") as file:
+            return file.read().strip() or None
+    except FileNotFoundError:
+        return None
+
+
+def save_fingerprint(namespace: str, name: str, store: str, fingerprint: str) -> None:
+    """
+    Persist the fingerprint for the given dataset and store, replacing
+    any fingerprint saved previously.
+    """
+    with open(fingerprint_path(namespace, name, store), "w") as file:
+        file.write(fingerprint)
+        file.write("\n")
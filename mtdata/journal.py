@@ -0,0 +1,217 @@
+import json
+import os
+from typing import Any, Dict, Iterator, List, NamedTuple, Optional, Sequence
+
+from .row import Row
+
+# A new journal segment is started once the current one reaches this size.
+SEGMENT_BYTES = 16 << 20
+
+# Older segments are deleted once there are more than this many.
+SEGMENT_COUNT = 8
+
+
+class JournalEntry(NamedTuple):
+    """
+    A row that was written to a store, along with the dataset and store
+    it was written to and its position (``sequence``) in the journal.
+    """
+
+    sequence: int
+    dataset: str
+    store: str
+    row: Row
+
+
+class Journal:
+    """
+    A change-data-capture feed of the rows appended to the stores in a
+    namespace. Subscribe a journal to a store (see ``Storage.subscribe``)
+    and every row the store appends, after de-duplication, is recorded
+    with a sequence number that increases by one for each row.
+
+    The journal is a directory of JSON-lines segments named after the
+    sequence number of their first entry. Segments are rotated once they
+    reach ``segment_bytes`` and only the newest ``segment_count`` are
+    kept, so consumers that fall too far behind will miss entries.
+    """
+
+    _directory: str
+    _segment_bytes: int
+    _segment_count: int
+
+    def __init__(
+        self,
+        namespace: str,
+        segment_bytes: int = SEGMENT_BYTES,
+        segment_count: int = SEGMENT_COUNT,
+    ):
+        self._directory = os.path.join(namespace, "journal")
+        self._segment_bytes = segment_bytes
+        self._segment_count = segment_count
+
+    @property
+    def directory(self) -> str:
+        return self._directory
+
+    def __call__(self, store: str, name: str, rows: Sequence[Row]) -> None:
+        self.record(store, name, rows)
+
+    def record(self, store: str, name: str, rows: Sequence[Row]) -> int:
+        """
+        Add rows appended to the given store for the dataset with the
+        given name to the journal. Returns the sequence number of the last
+        entry in the journal.
+
+        The journal is locked while it's written, since every store in
+        the namespace (in every process) writes to it.
+        """
+        from .locking import file_lock
+
+        os.makedirs(self._directory, exist_ok=True)
+        with file_lock(os.path.join(self._directory, "journal")):
+            return self._record(store, name, rows)
+
+    def _record(self, store: str, name: str, rows: Sequence[Row]) -> int:
+        segments = self.segments()
+        sequence = self.last_sequence(segments)
+        if not rows:
+            return sequence
+
+        path = segments[-1] if segments else self._segment_path(sequence + 1)
+        if segments and os.path.getsize(path) >= self._segment_bytes:
+            path = self._segment_path(sequence + 1)
+            segments.append(path)
+
+        lines: List[str] = []
+        for row in rows:
+            sequence += 1
+            entry = {"dataset": name, "row": row, "seq": sequence, "store": store}
+            lines.append(json.dumps(entry, sort_keys=True))
+            lines.append("\n")
+
+        with open(path, "a") as file:
+            file.write("".join(lines))
+
+        for old in segments[: -self._segment_count]:
+            os.remove(old)
+
+        return sequence
+
+    def read(self, after: int = 0) -> Iterator[JournalEntry]:
+        """
+        Read the entries with a sequence number greater than ``after``, in
+        order. Segments that only hold older entries are skipped without
+        being opened.
+        """
+        segments = self.segments()
+        starts = [self._first_sequence(path) for path in segments]
+        for index, path in enumerate(segments):
+            if index + 1 < len(starts) and starts[index + 1] <= after + 1:
+                continue
+            try:
+                with open(path, "r") as file:
+                    for line in file:
+                        entry = _parse_entry(line)
+                        if entry is not None and entry.sequence > after:
+                            yield entry
+            except FileNotFoundError:
+                # Rotated away while we were reading
+                continue
+
+    def segments(self) -> List[str]:
+        """
+        The paths of the journal segments, oldest first.
+        """
+        try:
+            names = os.listdir(self._directory)
+        except FileNotFoundError:
+            return []
+        return sorted(
+            os.path.join(self._directory, name)
+            for name in names
+            if name.endswith(".lines.json")
+        )
+
+    def last_sequence(self, segments: Optional[List[str]] = None) -> int:
+        """
+        The sequence number of the last entry in the journal, or zero if
+        it's empty.
+        """
+        from .backward import read_backward
+
+        for path in reversed(self.segments() if segments is None else segments):
+            with open(path, "rb") as file:
+                for line in read_backward(file):
+                    entry = _parse_entry(line)
+                    if entry is not None:
+                        return entry.sequence
+            # An empty segment is named for the entry that comes next
+            return self._first_sequence(path) - 1
+        return 0
+
+    def _segment_path(self, sequence: int) -> str:
+        return os.path.join(self._directory, f"{sequence:012d}.lines.json")
+
+    @staticmethod
+    def _first_sequence(path: str) -> int:
+        return int(os.path.basename(path).split(".")[0])
+
+
+def _parse_entry(line: str) -> Optional[JournalEntry]:
+    """
+    >>> _parse_entry('{"dataset": "d", "row": {"a": 1}, "seq": 3, "store": "s"}')
+    JournalEntry(sequence=3, dataset='d', store='s', row={'a': 1})
+    >>> _parse_entry('{"dataset": "d", "ro') is None
+    True
+    """
+    try:
+        entry: Dict[str, Any] = json.loads(line)
+    except ValueError:
+        # A partially written line
+        return None
+    return JournalEntry(entry["seq"], entry["dataset"], entry["store"], entry["row"])
+
+
+class Cursor:
+    """
+    A consumer's position in a journal, persisted so that the consumer
+    can pick up where it left off. Call ``commit`` once entries have been
+    processed, entries that were read but not committed are read again
+    next time.
+    """
+
+    _journal: Journal
+    _path: str
+
+    def __init__(self, journal: Journal, consumer: str):
+        self._journal = journal
+        self._path = os.path.join(journal.directory, f"{consumer}.cursor")
+
+    @property
+    def position(self) -> int:
+        """
+        The sequence number of the last committed entry.
+        """
+        try:
+            with open(self._path, "r") as file:
+                return int(file.read().strip() or 0)
+        except FileNotFoundError:
+            return 0
+
+    def read(self) -> Iterator[JournalEntry]:
+        """
+        Read the entries after the committed position.
+        """
+        return self._journal.read(self.position)
+
+    def commit(self, sequence: int) -> None:
+        """
+        Record that every entry up to and including ``sequence`` has been
+        processed.
+        """
+        os.makedirs(os.path.dirname(self._path), exist_ok=True)
+        temporary = f"{self._path}.tmp"
+        with open(temporary, "w") as file:
+            file.write(f"{sequence}\n")
+        os.replace(temporary, self._path)
@@ -0,0 +1,94 @@
+import os
+import threading
+import time
+from contextlib import contextmanager
+from typing import Dict, Iterator, TextIO
+
+# Guards ``_thread_locks``, the others are guarded by the per-path locks.
+_registry_lock = threading.Lock()
+_thread_locks: Dict[str, threading.RLock] = {}
+_held: Dict[str, TextIO] = {}
+_depths: Dict[str, int] = {}
+
+
+def lock_path(path: str) -> str:
+    """
+    The path of the file that is locked to protect the file at the given
+    path. A separate file is used so that the protected file can be
+    replaced (by renaming another file over it) while the lock is held.
+    """
+    return f"{path}.lock"
+
+
+@contextmanager
+def file_lock(path: str) -> Iterator[float]:
+    """
+    Hold an exclusive, advisory lock on the file at the given path for
+    the duration of the ``with`` block, waiting as long as it takes to
+    get it. The lock excludes other processes (using ``fcntl.flock``)
+    and other threads in this process. It is re-entrant, so code that
+    holds the lock can call other code that takes it again.
+
+    The value of the ``with`` statement is the number of seconds spent
+    waiting for the lock.
+
+    >>> import tempfile
+    >>> with tempfile.TemporaryDirectory() as directory:
+    ...     path = os.path.join(directory, 'data')
+    ...     with file_lock(path) as wait, file_lock(path) as again:
+    ...         wait < 1, again < 1
+    (True, True)
+    """
+    key = os.path.abspath(path)
+    with _registry_lock:
+        thread_lock = _thread_locks.setdefault(key, threading.RLock())
+
+    start = time.monotonic()
+    with thread_lock:
+        if _depths.get(key, 0) == 0:
+            _held[key] = _acquire(lock_path(key))
+        _depths[key] = _depths.get(key, 0) + 1
+        try:
+            yield time.monotonic() - start
+        finally:
+            _depths[key] -= 1
+            if _depths[key] == 0:
+                _release(_held.pop(key))
+
+
+def _acquire(path: str) -> TextIO:
+    file = open(path, "a")
+    try:
+        import fcntl
+    except ImportError:
+        # Not available on Windows, only threads are excluded there
+        return file
+    try:
+        fcntl.flock(file.fileno(), fcntl.LOCK_EX)
+    except BaseException:
+        file.close()
+        raise
+    return file
+
+
+def _release(file: TextIO) -> None:
+    try:
+        import fcntl
+
+        fcntl.flock(file.fileno(), fcntl.LOCK_UN)
+    except ImportError:
+        pass
+    finally:
+        file.close()
+
+
+def temporary_path(path: str) -> str:
+    """
+    A path, next to the file at the given path, that can be written and
+    then renamed over it with ``os.replace``. Readers then see either the
+    old file or the new one, never a partial file.
+
+    >>> temporary_path('data/a.csv').startswith('data/a.csv.')
+    True
+    """
+    return f"{path}.{os.getpid()}.{threading.get_ident()}.tmp"
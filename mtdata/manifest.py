@@ -1,46 +1,136 @@
-from typing import Iterable, Type, Optional
+"""
+Datasets and stores are discovered through package entry points so that
+third-party packages can provide their own. A package registers a dataset
+by adding an entry point to the ``mtdata.datasets`` group (or the
+``mtdata.stores`` group for a store) whose name matches the value
+returned by the class's ``name()`` method, for example:
+
+::
+
+    [project.entry-points."mtdata.datasets"]
+    my_dataset = "my_package.datasets:MyDataset"
+
+Only the names are read up front, the classes themselves are not imported
+until they are actually requested.
+"""
+
+from functools import lru_cache
+from typing import TYPE_CHECKING, Dict, FrozenSet, List, Optional, Type
 
 from .dataset import Dataset
-from .datasets.air_quality import AirQuality
-from .datasets.missoula_911 import Missoula911
-from .datasets.mt_covid_counts import CovidCounts
-from .storage import CSVBasic, Storage, JsonLines
+
+if TYPE_CHECKING:
+    # Only imported along with the stores themselves, see ``_load``
+    from .storage import Storage
+
+DATASETS_GROUP = "mtdata.datasets"
+
+STORES_GROUP = "mtdata.stores"
 
 # +----------------------------------------------------+
 # | Add new datasets below to have them made available |
 # | when the software is run.                          |
 # +----------------------------------------------------+
 
-ALL_DATASETS: Iterable[Type[Dataset]] = (
-    AirQuality,
-    Missoula911,
-    CovidCounts,
-)
+BUILTIN_DATASETS: Dict[str, str] = {
+    "air_quality": "mtdata.datasets.air_quality:AirQuality",
+    "missoula_911": "mtdata.datasets.missoula_911:Missoula911",
+    "mt_covid_counts": "mtdata.datasets.mt_covid_counts:CovidCounts",
+}
 
 # +----------------------------------------------------+
 # | Add new storages below to have them made available |
 # | when the software is run.                          |
 # +----------------------------------------------------+
 
-ALL_STORES: Iterable[Type[Storage]] = (
-    JsonLines,
-    CSVBasic,
-)
+BUILTIN_STORES: Dict[str, str] = {
+    "json-lines": "mtdata.storage:JsonLines",
+    "csv": "mtdata.storage:CSVBasic",
+    "json-chunks": "mtdata.storage:JsonChunks",
+    "json-deltas": "mtdata.storage:JsonDeltas",
+}
+
+# Stores that can be selected by name (``-s json-chunks``) but aren't
+# written to when no stores are given.
+OPT_IN_STORES: FrozenSet[str] = frozenset({"json-chunks", "json-deltas"})
 
 # +-------------------------------------+
 # | Helpers for accessing the manifests |
 # +-------------------------------------+
 
 
-def get_store(name: str) -> Optional[Type[Storage]]:
+def _entry_points(group: str) -> Dict[str, str]:
+    """
+    Read the names and object references of the entry points registered
+    in the given group by installed packages, without loading them.
+    """
+    from importlib.metadata import entry_points
+
+    found = entry_points()
+    if hasattr(found, "select"):
+        group_points = found.select(group=group)
+    else:
+        # Python < 3.10 returns a plain dict of groups
+        group_points = found.get(group, ())  # type: ignore
+
+    points: Dict[str, str] = {}
+    for point in group_points:
+        points.setdefault(point.name, point.value)
+    return points
+
+
+@lru_cache(maxsize=None)
+def _index(group: str) -> Dict[str, str]:
+    """
+    Build (once per process) the mapping from name to object reference
+    for the given group. Built-in implementations take precedence over
+    plugins with the same name.
+    """
+    builtins = BUILTIN_DATASETS if group == DATASETS_GROUP else BUILTIN_STORES
+    index = dict(builtins)
+    for name, reference in _entry_points(group).items():
+        index.setdefault(name, reference)
+    return index
+
+
+@lru_cache(maxsize=None)
+def _load(reference: str) -> type:
+    """
+    Import the object referred to by an entry point style reference
+    of the form ``module:attribute``.
+    """
+    from importlib import import_module
+
+    module_name, _, attribute = reference.partition(":")
+    target = import_module(module_name)
+    for part in attribute.split("."):
+        target = getattr(target, part)
+    return target  # type: ignore
+
+
+def dataset_names() -> List[str]:
+    """
+    The names of all available datasets. No dataset modules are imported.
+    """
+    return list(_index(DATASETS_GROUP))
+
+
+def store_names() -> List[str]:
+    """
+    The names of all available stores. No store modules are imported.
+    """
+    return list(_index(STORES_GROUP))
+
+
+def get_store(name: str) -> Optional[Type["Storage"]]:
     """
     Get the store class with the given name, or ``None`` if there is
     no store implementation in the manifest with that name.
     """
-    for store in ALL_STORES:
-        if store.name() == name:
-            return store
-    return None
+    reference = _index(STORES_GROUP).get(name)
+    if reference is None:
+        return None
+    return _load(reference)
 
 
 def get_dataset(name: str) -> Optional[Type[Dataset]]:
@@ -48,7 +138,43 @@ def get_dataset(name: str) -> Optional[Type[Dataset]]:
     Get the dataset class with the given name, or ``None`` if there is
     no dataset implementation in the manifest with that name.
     """
-    for dataset in ALL_DATASETS:
-        if dataset.name() == name:
-            return dataset
-    return None
+    reference = _index(DATASETS_GROUP).get(name)
+    if reference is None:
+        return None
+    return _load(reference)
+
+
+def all_datasets() -> List[Type[Dataset]]:
+    """
+    Load and return every available dataset class.
+    """
+    return [_load(reference) for reference in _index(DATASETS_GROUP).values()]
+
+
+def all_stores() -> List[Type["Storage"]]:
+    """
+    Load and return every available store class.
+    """
+    return [_load(reference) for reference in _index(STORES_GROUP).values()]
+
+
+def default_stores() -> List[Type["Storage"]]:
+    """
+    Load and return the store classes that are used when no stores are
+    given, every available store except the ``OPT_IN_STORES``.
+    """
+    return [
+        _load(reference)
+        for name, reference in _index(STORES_GROUP).items()
+        if name not in OPT_IN_STORES
+    ]
+
+
+def __getattr__(name: str):
+    # ALL_DATASETS and ALL_STORES used to be eagerly populated tuples,
+    # they are still available, but importing them loads every plugin.
+    if name == "ALL_DATASETS":
+        return tuple(all_datasets())
+    if name == "ALL_STORES":
+        return tuple(all_stores())
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
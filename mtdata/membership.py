@@ -0,0 +1,290 @@
+import json
+import os
+from hashlib import blake2b
+from math import ceil, log
+from typing import Any, Dict, Iterable, List, Optional, Sequence, Set, Tuple
+
+from .row import Row
+
+# The number of keys the first layer of a filter is sized for, each new
+# layer holds twice as many as the one before it.
+INITIAL_CAPACITY = 10_000
+
+# The probability that a filter reports a key it doesn't hold, across
+# all of its layers.
+ERROR_RATE = 0.01
+
+# Each new layer's error rate is this fraction of the previous one's, so
+# the combined rate never exceeds ``ERROR_RATE``.
+TIGHTENING = 0.5
+
+# The exact keys behind a filter are spread over this many bucket files,
+# so that checking a few keys only reads a small part of them.
+KEY_BUCKETS = 256
+
+
+def membership_key(row: Row, fields: Sequence[str]) -> str:
+    """
+    The key a row is filed under, made of the values of the given fields.
+    Numbers are normalized since stores don't always read them back with
+    the type they were written with.
+
+    >>> membership_key({'a': 1.0, 'b': 'x'}, ['a', 'b'])
+    '[1, "x"]'
+    >>> membership_key({'a': 1}, ['a', 'b'])
+    '[1, null]'
+    """
+    return json.dumps([_normalize(row.get(field)) for field in fields])
+
+
+def _normalize(value: Any) -> Any:
+    if isinstance(value, float) and value.is_integer():
+        return int(value)
+    return value
+
+
+class _Layer:
+    """
+    A fixed-size Bloom filter, sized for ``capacity`` keys at the given
+    error rate.
+    """
+
+    capacity: int
+    hashes: int
+    count: int
+    bits: bytearray
+
+    def __init__(self, capacity: int, hashes: int, bits: bytearray, count: int = 0):
+        self.capacity = capacity
+        self.hashes = hashes
+        self.bits = bits
+        self.count = count
+
+    @classmethod
+    def sized(cls, capacity: int, error_rate: float) -> "_Layer":
+        """
+        >>> layer = _Layer.sized(1000, 0.01)
+        >>> layer.hashes, len(layer.bits)
+        (7, 1199)
+        """
+        bits = ceil(-capacity * log(error_rate) / log(2) ** 2)
+        hashes = max(1, ceil(-log(error_rate) / log(2)))
+        return cls(capacity, hashes, bytearray((bits + 7) // 8))
+
+    def positions(self, digest: bytes) -> Iterable[int]:
+        # Double hashing: the k positions are h1 + i * h2
+        size = len(self.bits) * 8
+        first = int.from_bytes(digest[:8], "little")
+        second = int.from_bytes(digest[8:], "little") | 1
+        return ((first + i * second) % size for i in range(self.hashes))
+
+    def __contains__(self, digest: bytes) -> bool:
+        bits = self.bits
+        return all(bits[p >> 3] & (1 << (p & 7)) for p in self.positions(digest))
+
+    def add(self, digest: bytes) -> None:
+        bits = self.bits
+        for position in self.positions(digest):
+            bits[position >> 3] |= 1 << (position & 7)
+        self.count += 1
+
+
+class MembershipFilter:
+    """
+    A scalable Bloom filter over the keys (see ``membership_key``) of the
+    rows of a data file, so that stores can tell whether a row was ever
+    stored without reading the data. A key that was added is always
+    reported, a key that wasn't is reported with probability at most
+    ``error_rate``, so positive answers must be checked with ``stored``.
+
+    When the current layer is full a new, larger one is added, so the
+    filter grows with the data (by about ten bits per key at the default
+    error rate) rather than being sized up front.
+
+    The filter is stored in a sidecar file next to the data file: a JSON
+    header line, describing the layers and how much of the data file has
+    been added (``covered``), followed by the bits of each layer. It is
+    loaded on first use and written back with ``save``.
+
+    The keys themselves are kept too, in a directory next to the sidecar
+    file, split into ``KEY_BUCKETS`` files by their hash. ``stored`` only
+    reads the buckets of the keys it's asked about, so confirming a
+    false positive costs a small read rather than a scan of the data.
+    """
+
+    _path: str
+    _capacity: int
+    _error_rate: float
+    _layers: Optional[List[_Layer]]
+    _covered: Optional[int]
+    _pending: Dict[int, List[str]]
+    _cleared: bool
+
+    def __init__(
+        self,
+        path: str,
+        capacity: int = INITIAL_CAPACITY,
+        error_rate: float = ERROR_RATE,
+    ):
+        self._path = path
+        self._capacity = capacity
+        self._error_rate = error_rate
+        self._layers = None
+        self._covered = None
+        self._pending = {}
+        self._cleared = False
+
+    @property
+    def path(self) -> str:
+        """
+        The path to the sidecar file.
+        """
+        return self._path
+
+    @property
+    def keys_directory(self) -> str:
+        """
+        The path to the directory of key buckets.
+        """
+        return f"{self._path}.keys"
+
+    def __len__(self) -> int:
+        return sum(layer.count for layer in self._loaded())
+
+    def __contains__(self, key: str) -> bool:
+        digest = _digest(key)
+        return any(digest in layer for layer in self._loaded())
+
+    def add(self, key: str) -> None:
+        """
+        Add a key to the filter, growing it if the current layer is full.
+        """
+        layers = self._loaded()
+        if not layers or layers[-1].count >= layers[-1].capacity:
+            depth = len(layers)
+            layers.append(
+                _Layer.sized(
+                    self._capacity * 2**depth,
+                    self._error_rate * (1 - TIGHTENING) * TIGHTENING**depth,
+                )
+            )
+        digest = _digest(key)
+        layers[-1].add(digest)
+        self._pending.setdefault(digest[0] % KEY_BUCKETS, []).append(key)
+
+    def stored(self, keys: Iterable[str]) -> Set[str]:
+        """
+        The given keys that were actually added, read from the buckets
+        that hold them (and the keys added since the filter was loaded).
+        """
+        wanted: Dict[int, Set[str]] = {}
+        for key in keys:
+            wanted.setdefault(_digest(key)[0] % KEY_BUCKETS, set()).add(key)
+
+        found = set()
+        for bucket, bucket_keys in wanted.items():
+            found.update(bucket_keys.intersection(self._pending.get(bucket, ())))
+            if self._cleared:
+                continue
+            try:
+                with open(self._bucket_path(bucket), "r") as file:
+                    for line in file:
+                        key = line.rstrip("\n")
+                        if key in bucket_keys:
+                            found.add(key)
+            except FileNotFoundError:
+                continue
+        return found
+
+    def covered(self) -> Optional[int]:
+        """
+        The length of the data file whose rows have been added, or
+        ``None`` if there is no usable filter.
+        """
+        self._loaded()
+        return self._covered
+
+    def reset(self) -> None:
+        """
+        Remove every key from the filter (in memory, until it is saved).
+        """
+        self._layers = []
+        self._covered = 0
+        self._pending = {}
+        self._cleared = True
+
+    def save(self, covered: int) -> None:
+        """
+        Write the filter to its sidecar file, recording that the rows in
+        the first ``covered`` bytes of the data file have been added. The
+        keys are written first, so if saving is interrupted the filter
+        still covers the data it did before, and the keys that are added
+        again are only repeated in their buckets.
+        """
+        import shutil
+
+        from .locking import temporary_path
+
+        layers = self._loaded()
+        if self._cleared:
+            shutil.rmtree(self.keys_directory, ignore_errors=True)
+            self._cleared = False
+        os.makedirs(self.keys_directory, exist_ok=True)
+        for bucket, keys in self._pending.items():
+            with open(self._bucket_path(bucket), "a") as file:
+                file.write("".join(f"{key}\n" for key in keys))
+        self._pending = {}
+
+        header = {
+            "capacity": self._capacity,
+            "covered": covered,
+            "error_rate": self._error_rate,
+            "keys": KEY_BUCKETS,
+            "layers": [
+                [layer.capacity, layer.hashes, layer.count, len(layer.bits)]
+                for layer in layers
+            ],
+        }
+        temporary = temporary_path(self._path)
+        with open(temporary, "wb") as file:
+            file.write(json.dumps(header, sort_keys=True).encode() + b"\n")
+            for layer in layers:
+                file.write(layer.bits)
+        os.replace(temporary, self._path)
+        self._covered = covered
+
+    def _loaded(self) -> List[_Layer]:
+        if self._layers is None:
+            self._layers, self._covered = self._read()
+        return self._layers
+
+    def _read(self) -> Tuple[List[_Layer], Optional[int]]:
+        try:
+            with open(self._path, "rb") as file:
+                header = json.loads(file.readline())
+                if (
+                    header["capacity"] != self._capacity
+                    or header["error_rate"] != self._error_rate
+                    or header.get("keys") != KEY_BUCKETS
+                ):
+                    # Filters saved without their keys are rebuilt too
+                    return [], None
+                layers = []
+                for capacity, hashes, count, size in header["layers"]:
+                    bits = bytearray(file.read(size))
+                    if len(bits) != size:
+                        return [], None
+                    layers.append(_Layer(capacity, hashes, bits, count))
+                return layers, int(header["covered"])
+        except FileNotFoundError:
+            return [], None
+        except (KeyError, TypeError, ValueError):
+            # Partially written or from an incompatible version
+            return [], None
+
+    def _bucket_path(self, bucket: int) -> str:
+        return os.path.join(self.keys_directory, f"{bucket:03d}.keys")
+
+
+def _digest(key: str) -> bytes:
+    return blake2b(key.encode(), digest_size=16).digest()
@@ -0,0 +1,106 @@
+from heapq import merge
+from typing import Iterable, List, Sequence, Tuple, Type
+
+from .dataset import Dataset
+from .row import Row
+from .storage import Storage
+
+# Batches smaller than this aren't worth the cost of starting worker
+# processes and shipping rows to them.
+PARALLEL_THRESHOLD = 10_000
+
+IndexedRow = Tuple[int, Row]
+
+
+def _transform_dedup(
+    dataset_class: Type[Dataset],
+    rows: List[IndexedRow],
+    existing: List[List[Row]],
+) -> List[List[IndexedRow]]:
+    """
+    Transform one partition of a fetched batch, then de-duplicate it
+    against the matching slice of each store's existing data. Runs in a
+    worker process, so the dataset is passed as a class and its
+    transformer is rebuilt here (transformers may hold lambdas, which
+    can't be pickled).
+    """
+    dataset = dataset_class()
+    transformer = dataset.transformer
+
+    indices = {}
+    transformed = []
+    for index, row in rows:
+        row = transformer(row)
+        indices[id(row)] = index
+        transformed.append(row)
+
+    results = []
+    for existing_rows in existing:
+        deduped = Storage.dedup(
+            existing_rows,
+            transformed,
+            dataset.dedup_facets,
+            dataset.dedup_fields,
+        )
+        results.append([(indices[id(row)], row) for row in deduped])
+
+    return results
+
+
+def transform_dedup(
+    dataset_class: Type[Dataset],
+    data: Iterable[Row],
+    stores: Sequence[Storage],
+    workers: int,
+) -> List[List[Row]]:
+    """
+    Transform a batch of fetched rows and de-duplicate it against the data
+    already held by each of the given stores, spreading the work across a
+    pool of worker processes. Returns, for each store, the rows that need
+    to be appended to it, in the order they were fetched.
+
+    The batch is partitioned by the (transformed) values of the dataset's
+    ``dedup_facets``, so every row is only ever compared to existing rows
+    in the same partition. This means the dataset must have at least one
+    facet, de-duplication without facets depends on the order of the
+    whole batch and can't be split up this way.
+    """
+    from concurrent.futures import ProcessPoolExecutor
+
+    dataset = dataset_class()
+    name = dataset.name()
+    facets = list(dataset.dedup_facets)
+    if not facets:
+        raise ValueError(f"dataset {name} has no dedup facets to partition by")
+
+    transformer = dataset.transformer
+
+    partitions: List[List[IndexedRow]] = [[] for _ in range(workers)]
+    for index, row in enumerate(data):
+        key = transformer.transform_fields(row, facets)
+        partitions[hash(key) % workers].append((index, row))
+
+    # Each worker only needs the most recent row for each facet key that
+    # falls into its partition, for each store.
+    slices: List[List[List[Row]]] = [[[] for _ in stores] for _ in range(workers)]
+    for store_index, store in enumerate(stores):
+        latest = store.latest_by_facets(
+            name,
+            facets,
+            fields=Storage.dedup_columns(facets, dataset.dedup_fields),
+        )
+        for key, row in latest.items():
+            slices[hash(key) % workers][store_index].append(row)
+
+    with ProcessPoolExecutor(max_workers=workers) as executor:
+        futures = [
+            executor.submit(_transform_dedup, dataset_class, partition, existing)
+            for partition, existing in zip(partitions, slices)
+            if partition
+        ]
+        results = [future.result() for future in futures]
+
+    return [
+        [row for _, row in merge(*(result[store_index] for result in results))]
+        for store_index in range(len(stores))
+    ]
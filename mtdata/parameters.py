@@ -1,4 +1,5 @@
-from typing import NamedTuple, List, Tuple
+from datetime import datetime
+from typing import Callable, NamedTuple, List, Optional, Tuple
 
 from ._version import VERSION
 
@@ -13,16 +14,48 @@ def comma_tuple(arg: str) -> Tuple[str, ...]:
     return tuple((a.strip() for a in arg.split(",")))
 
 
+def timestamp(arg: str) -> datetime:
+    """
+    A "type" that can be used with ``ArgumentParser`` to parse an ISO 8601
+    date or date and time.
+
+    >>> timestamp('2021-09-13')
+    datetime.datetime(2021, 9, 13, 0, 0)
+    """
+    return datetime.fromisoformat(arg)
+
+
+def near(arg: str) -> Tuple[float, float, float]:
+    """
+    A "type" that can be used with ``ArgumentParser`` to parse a point and
+    a radius given as ``LATITUDE,LONGITUDE,KILOMETERS``.
+
+    >>> near('46.87,-113.99,2')
+    (46.87, -113.99, 2.0)
+    """
+    values = tuple(float(a) for a in arg.split(","))
+    if len(values) != 3:
+        raise ValueError(f"expected LATITUDE,LONGITUDE,KILOMETERS: {arg}")
+    return values[0], values[1], values[2]
+
+
 class Parameters(NamedTuple):
     """
     Parameters supported by the CLI.
     """
 
+    batch_rows: int
     datasets: Tuple[str]
+    force: bool
+    journal: bool
     list_datasets: bool
     list_stores: bool
-    namespace: str
+    namespaces: Tuple[str, ...]
+    record: Optional[str]
+    replay: Optional[str]
+    spatial_index: bool
     stores: Tuple[str]
+    workers: int
 
 
 def parse_parameters(args: List[str]) -> Parameters:
@@ -31,11 +64,24 @@ def parse_parameters(args: List[str]) -> Parameters:
     """
     from argparse import ArgumentParser
 
+    from .storage import WRITE_BATCH
+
     parser = ArgumentParser(
         "mtdata",
         description="A tool to help anyone build a mountain of public data",
+        epilog=(
+            "other commands (run with -h for details): "
+            "agg, backfill, convert, journal, query, retry-spool, serve-data, stand-in, "
+            "stats"
+        ),
     )
 
+    parser.add_argument(
+        "--batch-rows",
+        type=int,
+        help=f"rows held in memory at a time while storing (default: {WRITE_BATCH})",
+        default=WRITE_BATCH,
+    )
     parser.add_argument(
         "--datasets",
         "-d",
@@ -43,6 +89,18 @@ def parse_parameters(args: List[str]) -> Parameters:
         help="datasets to fetch, comma-delimited",
         default=(),
     )
+    parser.add_argument(
+        "--force",
+        action="store_true",
+        help="store fetched data even if it is unchanged since the last run",
+        default=False,
+    )
+    parser.add_argument(
+        "--journal",
+        action="store_true",
+        help="record appended rows in the namespace's change journal",
+        default=False,
+    )
     parser.add_argument(
         "--list-datasets",
         action="store_true",
@@ -58,9 +116,27 @@ def parse_parameters(args: List[str]) -> Parameters:
     parser.add_argument(
         "--namespace",
         "-n",
+        type=comma_tuple,
+        help="project namespaces, comma-delimited, each dataset is fetched once",
+        default=("data",),
+    )
+    parser.add_argument(
+        "--record",
         type=str,
-        help="project namespace",
-        default="data",
+        help="save each raw response in this directory, to be replayed later",
+        default=None,
+    )
+    parser.add_argument(
+        "--replay",
+        type=str,
+        help="fetch from the stand-in source server at this URL (see stand-in)",
+        default=None,
+    )
+    parser.add_argument(
+        "--spatial-index",
+        action="store_true",
+        help="maintain spatial indexes for datasets with coordinates",
+        default=False,
     )
     parser.add_argument(
         "--stores",
@@ -69,6 +145,13 @@ def parse_parameters(args: List[str]) -> Parameters:
         help="stores to use, comma-delimited",
         default=(),
     )
+    parser.add_argument(
+        "--workers",
+        "-w",
+        type=int,
+        help="worker processes used to transform large batches",
+        default=1,
+    )
     parser.add_argument(
         "--version",
         "-v",
@@ -79,9 +162,738 @@ def parse_parameters(args: List[str]) -> Parameters:
     parsed_args = parser.parse_args(args)
 
     return Parameters(
+        batch_rows=parsed_args.batch_rows,
         datasets=parsed_args.datasets,
+        force=parsed_args.force,
+        journal=parsed_args.journal,
         list_datasets=parsed_args.list_datasets,
         list_stores=parsed_args.list_stores,
+        namespaces=parsed_args.namespace,
+        record=parsed_args.record,
+        replay=parsed_args.replay,
+        spatial_index=parsed_args.spatial_index,
+        stores=parsed_args.stores,
+        workers=parsed_args.workers,
+    )
+
+
+class QueryParameters(NamedTuple):
+    """
+    Parameters supported by the ``query`` command.
+    """
+
+    dataset: str
+    fields: Optional[Tuple[str, ...]]
+    format: str
+    limit: Optional[int]
+    namespace: str
+    near: Optional[Tuple[float, float, float]]
+    since: Optional[datetime]
+    store: str
+    until: Optional[datetime]
+    where: Optional[str]
+
+
+def parse_query_parameters(args: List[str]) -> QueryParameters:
+    """
+    Turn a list of command line arguments for the ``query`` command into
+    a ``QueryParameters`` object.
+    """
+    from argparse import ArgumentParser
+
+    parser = ArgumentParser(
+        "mtdata query",
+        description="Stream the stored rows of a dataset that match a filter",
+    )
+
+    parser.add_argument(
+        "--dataset",
+        "-d",
+        type=str,
+        help="dataset to query",
+        required=True,
+    )
+    parser.add_argument(
+        "--fields",
+        type=comma_tuple,
+        help="fields to output, comma-delimited (default: all)",
+        default=None,
+    )
+    parser.add_argument(
+        "--format",
+        "-f",
+        choices=("json", "csv"),
+        help="output format",
+        default="json",
+    )
+    parser.add_argument(
+        "--limit",
+        type=int,
+        help="maximum number of rows to output",
+        default=None,
+    )
+    parser.add_argument(
+        "--namespace",
+        "-n",
+        type=str,
+        help="project namespace",
+        default="data",
+    )
+    parser.add_argument(
+        "--near",
+        type=near,
+        help="only rows within a distance of a point, as LAT,LON,KM",
+        metavar="LAT,LON,KM",
+        default=None,
+    )
+    parser.add_argument(
+        "--since",
+        type=timestamp,
+        help="only rows at or after this time (ISO 8601)",
+        default=None,
+    )
+    parser.add_argument(
+        "--store",
+        "-s",
+        type=str,
+        help="store to read from",
+        default="json-lines",
+    )
+    parser.add_argument(
+        "--until",
+        type=timestamp,
+        help="only rows at or before this time (ISO 8601)",
+        default=None,
+    )
+    parser.add_argument(
+        "--where",
+        type=str,
+        help="filter expression, e.g. 'site_name == \"Missoula\"'",
+        default=None,
+    )
+
+    parsed_args = parser.parse_args(args)
+
+    return QueryParameters(
+        dataset=parsed_args.dataset,
+        fields=parsed_args.fields,
+        format=parsed_args.format,
+        limit=parsed_args.limit,
+        namespace=parsed_args.namespace,
+        near=parsed_args.near,
+        since=parsed_args.since,
+        store=parsed_args.store,
+        until=parsed_args.until,
+        where=parsed_args.where,
+    )
+
+
+class AggParameters(NamedTuple):
+    """
+    Parameters supported by the ``agg`` command.
+    """
+
+    aggregations: Tuple[Tuple[str, str], ...]
+    by: Tuple[str, ...]
+    cache: bool
+    dataset: str
+    format: str
+    namespace: str
+    store: str
+
+
+def _aggregations(function: str) -> Callable[[str], Tuple[Tuple[str, str], ...]]:
+    return lambda arg: tuple((function, field) for field in comma_tuple(arg))
+
+
+def parse_agg_parameters(args: List[str]) -> AggParameters:
+    """
+    Turn a list of command line arguments for the ``agg`` command into
+    an ``AggParameters`` object.
+
+    >>> params = parse_agg_parameters(
+    ...     ['-d', 'x', '--by', 'a,day', '--mean', 'b', '--max', 'b,c'])
+    >>> params.by
+    ('a', 'day')
+    >>> params.aggregations
+    (('mean', 'b'), ('max', 'b'), ('max', 'c'))
+    """
+    from argparse import ArgumentParser
+
+    parser = ArgumentParser(
+        "mtdata agg",
+        description="Compute grouped aggregates over a stored dataset",
+    )
+
+    parser.add_argument(
+        "--by",
+        type=comma_tuple,
+        help="fields to group by, comma-delimited, "
+        "may include hour, day, month or year",
+        default=(),
+    )
+    parser.add_argument(
+        "--dataset",
+        "-d",
+        type=str,
+        help="dataset to aggregate",
+        required=True,
+    )
+    parser.add_argument(
+        "--format",
+        "-f",
+        choices=("json", "csv"),
+        help="output format",
+        default="json",
+    )
+    for function in ("sum", "mean", "min", "max"):
+        parser.add_argument(
+            f"--{function}",
+            dest="aggregations",
+            action="append",
+            type=_aggregations(function),
+            metavar="FIELDS",
+            help=f"fields to compute the {function} of, comma-delimited",
+        )
+    parser.add_argument(
+        "--namespace",
+        "-n",
+        type=str,
+        help="project namespace",
+        default="data",
+    )
+    parser.add_argument(
+        "--no-cache",
+        action="store_true",
+        help="ignore and don't update cached results",
+        default=False,
+    )
+    parser.add_argument(
+        "--store",
+        "-s",
+        type=str,
+        help="store to read from",
+        default="json-lines",
+    )
+
+    parsed_args = parser.parse_args(args)
+
+    return AggParameters(
+        aggregations=tuple(
+            a for group in parsed_args.aggregations or () for a in group
+        ),
+        by=parsed_args.by,
+        cache=not parsed_args.no_cache,
+        dataset=parsed_args.dataset,
+        format=parsed_args.format,
+        namespace=parsed_args.namespace,
+        store=parsed_args.store,
+    )
+
+
+class ServeParameters(NamedTuple):
+    """
+    Parameters supported by the ``serve-data`` command.
+    """
+
+    host: str
+    namespace: str
+    port: int
+    store: str
+
+
+def parse_serve_parameters(args: List[str]) -> ServeParameters:
+    """
+    Turn a list of command line arguments for the ``serve-data`` command
+    into a ``ServeParameters`` object.
+    """
+    from argparse import ArgumentParser
+
+    parser = ArgumentParser(
+        "mtdata serve-data",
+        description="Serve the stored datasets of a namespace over HTTP",
+    )
+
+    parser.add_argument(
+        "--host",
+        type=str,
+        help="address to listen on",
+        default="127.0.0.1",
+    )
+    parser.add_argument(
+        "--namespace",
+        "-n",
+        type=str,
+        help="project namespace",
+        default="data",
+    )
+    parser.add_argument(
+        "--port",
+        "-p",
+        type=int,
+        help="port to listen on",
+        default=8000,
+    )
+    parser.add_argument(
+        "--store",
+        "-s",
+        type=str,
+        help="store to read from",
+        default="json-lines",
+    )
+
+    parsed_args = parser.parse_args(args)
+
+    return ServeParameters(
+        host=parsed_args.host,
+        namespace=parsed_args.namespace,
+        port=parsed_args.port,
+        store=parsed_args.store,
+    )
+
+
+class JournalParameters(NamedTuple):
+    """
+    Parameters supported by the ``journal`` command.
+    """
+
+    after: Optional[int]
+    consumer: Optional[str]
+    limit: Optional[int]
+    namespace: str
+
+
+def parse_journal_parameters(args: List[str]) -> JournalParameters:
+    """
+    Turn a list of command line arguments for the ``journal`` command
+    into a ``JournalParameters`` object.
+    """
+    from argparse import ArgumentParser
+
+    parser = ArgumentParser(
+        "mtdata journal",
+        description="Print the rows recorded in the change journal",
+    )
+
+    group = parser.add_mutually_exclusive_group()
+    group.add_argument(
+        "--after",
+        type=int,
+        help="only entries after this sequence number",
+        default=None,
+    )
+    group.add_argument(
+        "--consumer",
+        "-c",
+        type=str,
+        help="resume from, and advance, this consumer's cursor",
+        default=None,
+    )
+    parser.add_argument(
+        "--limit",
+        type=int,
+        help="maximum number of entries to print",
+        default=None,
+    )
+    parser.add_argument(
+        "--namespace",
+        "-n",
+        type=str,
+        help="project namespace",
+        default="data",
+    )
+
+    parsed_args = parser.parse_args(args)
+
+    return JournalParameters(
+        after=parsed_args.after,
+        consumer=parsed_args.consumer,
+        limit=parsed_args.limit,
+        namespace=parsed_args.namespace,
+    )
+
+
+class StatsParameters(NamedTuple):
+    """
+    Parameters supported by the ``stats`` command.
+    """
+
+    datasets: Tuple[str, ...]
+    namespace: str
+    stores: Tuple[str, ...]
+
+
+def parse_stats_parameters(args: List[str]) -> StatsParameters:
+    """
+    Turn a list of command line arguments for the ``stats`` command into
+    a ``StatsParameters`` object.
+    """
+    from argparse import ArgumentParser
+
+    parser = ArgumentParser(
+        "mtdata stats",
+        description="Print the catalog statistics for stored datasets",
+    )
+
+    parser.add_argument(
+        "--datasets",
+        "-d",
+        type=comma_tuple,
+        help="datasets to include, comma-delimited (default: all)",
+        default=(),
+    )
+    parser.add_argument(
+        "--namespace",
+        "-n",
+        type=str,
+        help="project namespace",
+        default="data",
+    )
+    parser.add_argument(
+        "--stores",
+        "-s",
+        type=comma_tuple,
+        help="stores to include, comma-delimited (default: all)",
+        default=(),
+    )
+
+    parsed_args = parser.parse_args(args)
+
+    return StatsParameters(
+        datasets=parsed_args.datasets,
+        namespace=parsed_args.namespace,
+        stores=parsed_args.stores,
+    )
+
+
+class ConvertParameters(NamedTuple):
+    """
+    Parameters supported by the ``convert`` command.
+    """
+
+    dataset: str
+    from_store: str
+    namespace: str
+    to_namespace: str
+    to_store: str
+
+
+def parse_convert_parameters(args: List[str]) -> ConvertParameters:
+    """
+    Turn a list of command line arguments for the ``convert`` command into
+    a ``ConvertParameters`` object.
+    """
+    from argparse import ArgumentParser
+
+    parser = ArgumentParser(
+        "mtdata convert",
+        description="Copy a stored dataset from one store to another",
+    )
+
+    parser.add_argument(
+        "--dataset",
+        "-d",
+        type=str,
+        help="dataset to copy",
+        required=True,
+    )
+    parser.add_argument(
+        "--from",
+        dest="from_store",
+        type=str,
+        help="store to read from",
+        required=True,
+    )
+    parser.add_argument(
+        "--namespace",
+        "-n",
+        type=str,
+        help="project namespace",
+        default="data",
+    )
+    parser.add_argument(
+        "--to",
+        dest="to_store",
+        type=str,
+        help="store to write to (its data are replaced)",
+        required=True,
+    )
+    parser.add_argument(
+        "--to-namespace",
+        type=str,
+        help="namespace to write to (default: the same namespace)",
+        default=None,
+    )
+
+    parsed_args = parser.parse_args(args)
+
+    return ConvertParameters(
+        dataset=parsed_args.dataset,
+        from_store=parsed_args.from_store,
+        namespace=parsed_args.namespace,
+        to_namespace=parsed_args.to_namespace or parsed_args.namespace,
+        to_store=parsed_args.to_store,
+    )
+
+
+class RetrySpoolParameters(NamedTuple):
+    """
+    Parameters supported by the ``retry-spool`` command.
+    """
+
+    attempts: int
+    datasets: Tuple[str, ...]
+    interval: float
+    journal: bool
+    namespace: str
+    spatial_index: bool
+    stores: Tuple[str, ...]
+
+
+def parse_retry_spool_parameters(args: List[str]) -> RetrySpoolParameters:
+    """
+    Turn a list of command line arguments for the ``retry-spool`` command
+    into a ``RetrySpoolParameters`` object.
+    """
+    from argparse import ArgumentParser
+
+    parser = ArgumentParser(
+        "mtdata retry-spool",
+        description=(
+            "Write spooled rows to the stores that failed to store them, "
+            "without fetching anything"
+        ),
+    )
+
+    parser.add_argument(
+        "--attempts",
+        type=int,
+        help="times to retry while rows remain spooled (default: 1)",
+        default=1,
+    )
+    parser.add_argument(
+        "--datasets",
+        "-d",
+        type=comma_tuple,
+        help="datasets to retry, comma-delimited (default: all spooled)",
+        default=(),
+    )
+    parser.add_argument(
+        "--interval",
+        type=float,
+        help="seconds to wait between attempts (default: 60)",
+        default=60.0,
+    )
+    parser.add_argument(
+        "--journal",
+        action="store_true",
+        help="record appended rows in the namespace's change journal",
+        default=False,
+    )
+    parser.add_argument(
+        "--namespace",
+        "-n",
+        type=str,
+        help="project namespace",
+        default="data",
+    )
+    parser.add_argument(
+        "--spatial-index",
+        action="store_true",
+        help="maintain spatial indexes for datasets with coordinates",
+        default=False,
+    )
+    parser.add_argument(
+        "--stores",
+        "-s",
+        type=comma_tuple,
+        help="stores to retry, comma-delimited (default: all)",
+        default=(),
+    )
+
+    parsed_args = parser.parse_args(args)
+
+    return RetrySpoolParameters(
+        attempts=parsed_args.attempts,
+        datasets=parsed_args.datasets,
+        interval=parsed_args.interval,
+        journal=parsed_args.journal,
+        namespace=parsed_args.namespace,
+        spatial_index=parsed_args.spatial_index,
+        stores=parsed_args.stores,
+    )
+
+
+class StandInParameters(NamedTuple):
+    """
+    Parameters supported by the ``stand-in`` command.
+    """
+
+    failure_rate: float
+    host: str
+    latency: float
+    port: int
+    recordings: str
+    scale: int
+    seed: Optional[int]
+
+
+def parse_standin_parameters(args: List[str]) -> StandInParameters:
+    """
+    Turn a list of command line arguments for the ``stand-in`` command
+    into a ``StandInParameters`` object.
+    """
+    from argparse import ArgumentParser
+
+    parser = ArgumentParser(
+        "mtdata stand-in",
+        description=(
+            "Serve recorded source responses, scaled up and with injected "
+            "latency and failures, for datasets to fetch with --replay"
+        ),
+    )
+
+    parser.add_argument(
+        "--failure-rate",
+        type=float,
+        help="fraction of requests that fail with a 503 (default: 0)",
+        default=0.0,
+    )
+    parser.add_argument(
+        "--host",
+        type=str,
+        help="address to listen on",
+        default="127.0.0.1",
+    )
+    parser.add_argument(
+        "--latency",
+        type=float,
+        help="seconds to wait before each response (default: 0)",
+        default=0.0,
+    )
+    parser.add_argument(
+        "--port",
+        "-p",
+        type=int,
+        help="port to listen on",
+        default=8001,
+    )
+    parser.add_argument(
+        "--recordings",
+        "-r",
+        type=str,
+        help="directory of responses saved with --record",
+        required=True,
+    )
+    parser.add_argument(
+        "--scale",
+        type=int,
+        help="copies of each record to serve, as more sites or events (default: 1)",
+        default=1,
+    )
+    parser.add_argument(
+        "--seed",
+        type=int,
+        help="seed for the injected failures",
+        default=None,
+    )
+
+    parsed_args = parser.parse_args(args)
+
+    return StandInParameters(
+        failure_rate=parsed_args.failure_rate,
+        host=parsed_args.host,
+        latency=parsed_args.latency,
+        port=parsed_args.port,
+        recordings=parsed_args.recordings,
+        scale=parsed_args.scale,
+        seed=parsed_args.seed,
+    )
+
+
+class BackfillParameters(NamedTuple):
+    """
+    Parameters supported by the ``backfill`` command.
+    """
+
+    dataset: str
+    end: datetime
+    namespace: str
+    spatial_index: bool
+    start: datetime
+    stores: Tuple[str, ...]
+    workers: int
+
+
+def parse_backfill_parameters(args: List[str]) -> BackfillParameters:
+    """
+    Turn a list of command line arguments for the ``backfill`` command
+    into a ``BackfillParameters`` object.
+    """
+    from argparse import ArgumentParser
+
+    parser = ArgumentParser(
+        "mtdata backfill",
+        description="Fetch the history of a dataset over a range of dates",
+    )
+
+    parser.add_argument(
+        "--dataset",
+        "-d",
+        type=str,
+        help="dataset to backfill, it must support fetching a range of dates",
+        required=True,
+    )
+    parser.add_argument(
+        "--from",
+        dest="start",
+        type=timestamp,
+        help="first date to fetch (ISO 8601)",
+        required=True,
+    )
+    parser.add_argument(
+        "--namespace",
+        "-n",
+        type=str,
+        help="project namespace",
+        default="data",
+    )
+    parser.add_argument(
+        "--spatial-index",
+        action="store_true",
+        help="maintain spatial indexes for datasets with coordinates",
+        default=False,
+    )
+    parser.add_argument(
+        "--stores",
+        "-s",
+        type=comma_tuple,
+        help="stores to write to, comma-delimited (default: all)",
+        default=(),
+    )
+    parser.add_argument(
+        "--to",
+        dest="end",
+        type=timestamp,
+        help="last date to fetch (ISO 8601, default: today)",
+        default=None,
+    )
+    parser.add_argument(
+        "--workers",
+        "-w",
+        type=int,
+        help="date windows fetched at the same time (default: 4)",
+        default=4,
+    )
+
+    parsed_args = parser.parse_args(args)
+
+    return BackfillParameters(
+        dataset=parsed_args.dataset,
+        end=parsed_args.end or datetime.now(),
         namespace=parsed_args.namespace,
+        spatial_index=parsed_args.spatial_index,
+        start=parsed_args.start,
         stores=parsed_args.stores,
+        workers=parsed_args.workers,
     )
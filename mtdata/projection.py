@@ -0,0 +1,129 @@
+import json
+from functools import lru_cache
+from typing import Any, Callable, Iterable, Optional, Sequence
+
+from .row import Row
+from .schema import FieldTypes, apply_types
+
+Fields = Optional[Sequence[str]]
+
+_decoder = json.JSONDecoder()
+
+
+def project(row: Row, fields: Iterable[str]) -> Row:
+    """
+    Build a new row containing only the given fields of an existing
+    row. Fields that the row doesn't have are left out.
+
+    >>> project({'a': 1, 'b': 2, 'c': 3}, ['c', 'a', 'd'])
+    {'c': 3, 'a': 1}
+    """
+    return {field: row[field] for field in fields if field in row}
+
+
+@lru_cache(maxsize=None)
+def _encoded_key(field: str) -> str:
+    return json.dumps(field) + ":"
+
+
+def _value_index(line: str, field: str) -> int:
+    """
+    Find the index of the first character of the value that belongs to
+    the given top-level key in a JSON object, or -1 if it can't be found.
+
+    This works because an unescaped double quote can only appear in JSON
+    as part of the structure, so a key is any encoded key string that is
+    preceded by the opening brace or a comma, ignoring whitespace.
+    """
+    key = _encoded_key(field)
+    start = 0
+    while True:
+        index = line.find(key, start)
+        if index == -1:
+            return -1
+
+        before = index - 1
+        while before >= 0 and line[before] in " \t":
+            before -= 1
+
+        if before >= 0 and line[before] in "{,":
+            index += len(key)
+            while index < len(line) and line[index] in " \t":
+                index += 1
+            return index
+
+        start = index + 1
+
+
+def extract_json_fields(line: str, fields: Sequence[str]) -> Row:
+    """
+    Decode only the given top-level fields from a line of JSON that holds
+    an object. Each value is decoded on its own, the rest of the line is
+    skipped. Lines with nested objects or arrays, and lines that are
+    missing one of the fields, are decoded completely and then projected.
+
+    >>> extract_json_fields('{"a": 1, "b": "x, \\\\"c\\\\": 9", "c": 3}', ['c', 'a'])
+    {'c': 3, 'a': 1}
+    >>> extract_json_fields('{"a":1,"b":{"c":2}}', ['a'])
+    {'a': 1}
+    >>> extract_json_fields('{"a": 1}', ['a', 'z'])
+    {'a': 1}
+    """
+    if line.count("{") != 1 or "[" in line:
+        return project(json.loads(line), fields)
+
+    row: Row = {}
+    for field in fields:
+        index = _value_index(line, field)
+        if index == -1:
+            return project(json.loads(line), fields)
+        row[field], _ = _decoder.raw_decode(line, index)
+
+    return row
+
+
+def decode_json_line(line: str, fields: Fields = None) -> Row:
+    """
+    Decode a line of JSON, or only the given fields of it if ``fields``
+    is not ``None``.
+    """
+    if fields is None:
+        return json.loads(line)
+    return extract_json_fields(line, fields)
+
+
+def record_builder(
+    header: Sequence[str], fields: Fields = None, types: Optional[FieldTypes] = None
+) -> Callable[[Sequence[Any]], Row]:
+    """
+    Create a function that turns a CSV record (a list of values in header
+    order) into a row. If ``fields`` is given, only those columns are
+    picked out of the record, by index. Columns that have ``types`` are
+    converted to them (see :mod:`mtdata.schema`).
+
+    >>> from mtdata.schema import Integer
+    >>> build = record_builder(['a', 'b', 'c'], ['c', 'a', 'z'])
+    >>> build([1, 2, 3])
+    {'c': 3, 'a': 1}
+    >>> record_builder(['a', 'b'])([1, 2])
+    {'a': 1, 'b': 2}
+    >>> record_builder(['a', 'b'], types={'a': Integer()})([1.0, ''])
+    {'a': 1, 'b': ''}
+    """
+    if fields is None:
+        names = list(header)
+
+        def build(record: Sequence[Any]) -> Row:
+            return dict(zip(names, record))
+
+    else:
+        selected = [(field, header.index(field)) for field in fields if field in header]
+
+        def build(record: Sequence[Any]) -> Row:
+            return {field: record[index] for field, index in selected}
+
+    columns = header if fields is None else fields
+    present = {name: t for name, t in (types or {}).items() if name in columns}
+    if not present:
+        return build
+    return lambda record: apply_types(build(record), present)
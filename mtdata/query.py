@@ -0,0 +1,223 @@
+import ast
+import operator
+from datetime import datetime
+from typing import Any, Callable, Iterable, List, Optional, Set, TextIO, Tuple
+
+from .dataset import Dataset
+from .projection import Fields, project
+from .row import Row
+from .storage import Storage
+
+Predicate = Callable[[Row], bool]
+
+_COMPARISONS = {
+    ast.Eq: operator.eq,
+    ast.NotEq: operator.ne,
+    ast.Lt: operator.lt,
+    ast.LtE: operator.le,
+    ast.Gt: operator.gt,
+    ast.GtE: operator.ge,
+    ast.In: lambda a, b: a in b,
+    ast.NotIn: lambda a, b: a not in b,
+}
+
+
+def compile_predicate(expression: str) -> Tuple[Predicate, Set[str]]:
+    """
+    Compile a filter expression into a function that can be applied to
+    rows, along with the set of fields the expression refers to.
+
+    Expressions use Python syntax, but only comparisons, ``and``, ``or``,
+    ``not``, literals and bare names (which refer to fields) are
+    allowed. Fields that a row doesn't have are ``None``.
+
+    >>> match, fields = compile_predicate(
+    ...     'site == "Missoula" and (aqi > 50 or kind in ["a", "b"])')
+    >>> sorted(fields)
+    ['aqi', 'kind', 'site']
+    >>> match({'site': 'Missoula', 'aqi': 60})
+    True
+    >>> match({'site': 'Missoula', 'aqi': 10, 'kind': 'c'})
+    False
+    >>> compile_predicate("__import__('os')")
+    Traceback (most recent call last):
+    ...
+    ValueError: unsupported expression: __import__('os')
+    """
+    tree = ast.parse(expression, mode="eval")
+    fields: Set[str] = set()
+
+    def build(node: ast.AST) -> Callable[[Row], Any]:
+        if isinstance(node, ast.Expression):
+            return build(node.body)
+
+        if isinstance(node, ast.Name):
+            name = node.id
+            fields.add(name)
+            return lambda row: row.get(name)
+
+        if isinstance(node, ast.Constant):
+            value = node.value
+            return lambda row: value
+
+        if isinstance(node, (ast.List, ast.Tuple, ast.Set)):
+            items = [build(item) for item in node.elts]
+            return lambda row: [item(row) for item in items]
+
+        if isinstance(node, ast.UnaryOp):
+            operand = build(node.operand)
+            if isinstance(node.op, ast.Not):
+                return lambda row: not operand(row)
+            if isinstance(node.op, ast.USub):
+                return lambda row: -operand(row)
+
+        if isinstance(node, ast.BoolOp):
+            values = [build(value) for value in node.values]
+            if isinstance(node.op, ast.And):
+                return lambda row: all(value(row) for value in values)
+            return lambda row: any(value(row) for value in values)
+
+        if isinstance(node, ast.Compare) and all(
+            type(op) in _COMPARISONS for op in node.ops
+        ):
+            left = build(node.left)
+            steps = [
+                (_COMPARISONS[type(op)], build(right))
+                for op, right in zip(node.ops, node.comparators)
+            ]
+
+            def compare(row: Row) -> bool:
+                current = left(row)
+                for compare_op, right in steps:
+                    value = right(row)
+                    try:
+                        if not compare_op(current, value):
+                            return False
+                    except TypeError:
+                        # Missing fields (None) never match an ordering
+                        return False
+                    current = value
+                return True
+
+            return compare
+
+        raise ValueError(f"unsupported expression: {ast.unparse(node)}")
+
+    function = build(tree)
+    return (lambda row: bool(function(row))), fields
+
+
+def query(
+    store: Storage,
+    dataset: Dataset,
+    where: Optional[str] = None,
+    fields: Fields = None,
+    since: Optional[datetime] = None,
+    until: Optional[datetime] = None,
+    limit: Optional[int] = None,
+    near: Optional[Tuple[float, float, float]] = None,
+) -> Iterable[Row]:
+    """
+    Stream the rows of a stored dataset that match the ``where``
+    expression (see :func:`compile_predicate`), fall between ``since``
+    and ``until``, projected onto ``fields`` (if given). The projection
+    and the time bounds are handed to the store so that it can avoid
+    reading and decoding what isn't needed.
+
+    If ``near`` (a latitude, longitude and radius in kilometers) is given,
+    only rows within that distance of the point are returned. The store
+    must have been created with the dataset's ``spatial_fields``, and it
+    uses its spatial index, if it has one, instead of the time bounds.
+    """
+    match: Optional[Predicate] = None
+    columns: Optional[List[str]] = None if fields is None else list(fields)
+    if where:
+        match, where_fields = compile_predicate(where)
+        if columns is not None:
+            columns.extend(f for f in sorted(where_fields) if f not in columns)
+
+    name = dataset.name()
+    time_field = dataset.time_field
+    timed = since is not None or until is not None
+    if timed and time_field is None:
+        raise ValueError(f"dataset {name} has no time field")
+
+    if near is not None:
+        if timed and time_field is not None:
+            match = _in_range(match, time_field, dataset, since, until)
+            if columns is not None and time_field not in columns:
+                columns.append(time_field)
+        rows = store.load_near(name, *near, fields=columns)
+    elif timed and time_field is not None:
+        rows = store.load_range(
+            name, time_field, dataset.parse_time, since, until, fields=columns
+        )
+    else:
+        rows = store.load(name, fields=columns)
+
+    count = 0
+    for row in rows:
+        if limit is not None and count >= limit:
+            break
+        if match is not None and not match(row):
+            continue
+        yield row if fields is None else project(row, fields)
+        count += 1
+
+
+def _in_range(
+    match: Optional[Predicate],
+    time_field: str,
+    dataset: Dataset,
+    since: Optional[datetime],
+    until: Optional[datetime],
+) -> Predicate:
+    """
+    Extend a predicate to also require that rows fall between ``since``
+    and ``until``.
+    """
+    from .schema import time_filter
+
+    within = time_filter(dataset.parse_time, since, until)
+
+    def in_range(row: Row) -> bool:
+        if not within(row.get(time_field)):
+            return False
+        return match is None or match(row)
+
+    return in_range
+
+
+def write_rows(
+    rows: Iterable[Row], output: TextIO, output_format: str, fields: Fields = None
+) -> None:
+    """
+    Write rows to the output, one at a time, as either JSON-lines
+    (``"json"``) or CSV (``"csv"``). For CSV, the header comes from
+    ``fields`` or, if that isn't given, from the first row.
+    """
+    if output_format == "json":
+        import json
+
+        for row in rows:
+            output.write(json.dumps(row, sort_keys=True))
+            output.write("\n")
+        return
+
+    if output_format == "csv":
+        from csv import DictWriter, QUOTE_NONNUMERIC
+
+        writer = None
+        for row in rows:
+            if writer is None:
+                writer = DictWriter(
+                    output,
+                    fieldnames=list(fields) if fields is not None else list(row),
+                    quoting=QUOTE_NONNUMERIC,
+                    extrasaction="ignore",
+                )
+                writer.writeheader()
+            writer.writerow(row)
+        return
+
+    raise ValueError(f"unsupported output format: {output_format}")
@@ -1,12 +1,34 @@
+from contextlib import ExitStack
 from datetime import datetime
-from typing import Iterable, NamedTuple, Type, Tuple
+from functools import partial
+from tempfile import TemporaryDirectory
+from typing import (
+    Callable,
+    Dict,
+    Iterable,
+    List,
+    NamedTuple,
+    Optional,
+    Sequence,
+    Sized,
+    Type,
+    Tuple,
+    Union,
+)
 
-from .dataset import FetchResult, Dataset
+from .dataset import FetchResult, Dataset, Row
+from .fingerprint import payload_fingerprint, load_fingerprint, save_fingerprint
+from .journal import Journal
+from .parallel import PARALLEL_THRESHOLD, transform_dedup
 from .retry import retry
-from .storage import Storage, StoreResult
+from .spool import Spool, SpoolBatch
+from .storage import WRITE_BATCH, Storage, StoreOptions, StoreResult
 
 RegistryList = Iterable[Tuple[Type[Dataset], Iterable[Type[Storage]]]]
 
+# Reads the rows to append to a store, anew each time it's called.
+RowSource = Callable[[], Iterable[Row]]
+
 
 class UpdateResult(NamedTuple):
     """
@@ -14,6 +36,17 @@ class UpdateResult(NamedTuple):
     process. If anything at all failed, success will be ``False``. Finding
     the failure within the various sub-results is, at this time, up to
     the consumer.
+
+    If ``unchanged`` is ``True`` then the fetched payload was identical
+    to the one fetched during the previous successful update, so nothing
+    was transformed or stored.
+
+    If ``spooled`` is ``True`` then nothing was fetched, rows that were
+    checkpointed by an earlier update were written to the stores that
+    failed to store them, see :class:`mtdata.spool.Spool`.
+
+    ``namespace`` is the namespace the rows were stored in, since one
+    update can store the same fetch in several namespaces.
     """
 
     success: bool
@@ -21,6 +54,32 @@ class UpdateResult(NamedTuple):
     store_results: Iterable[StoreResult]
     name: str
     timestamp: datetime
+    unchanged: bool = False
+    spooled: bool = False
+    namespace: Optional[str] = None
+
+
+def store_options(
+    dataset: Dataset, spatial_index: bool = False, batch_rows: int = WRITE_BATCH
+) -> StoreOptions:
+    """
+    The options for a store that will hold the given dataset, so that it
+    can keep its catalog (and, if ``spatial_index`` is ``True``, its
+    spatial index) for the dataset. Datasets that are de-duplicated by
+    their ``dedup_fields`` alone are checked against their full history
+    with a membership filter. The store writes ``batch_rows`` rows at a
+    time, and is given the field types the dataset's transformer declares.
+    """
+    facets = tuple(dataset.dedup_facets)
+    return StoreOptions(
+        spatial_fields=dataset.spatial_fields if spatial_index else None,
+        time_field=dataset.time_field,
+        parse_time=dataset.parse_time,
+        facet_fields=facets,
+        membership_fields=() if facets else tuple(dataset.dedup_fields),
+        batch_rows=batch_rows,
+        field_types=dataset.transformer.field_types,
+    )
 
 
 class Registry:
@@ -28,58 +87,441 @@ class Registry:
     A collection of datasets mapped to stores that are used to persist
     the data they retrieve. This is where the actual ETL process happens,
     using the facilities provided by the datasets and stores.
+
+    When ``skip_unchanged`` is ``True`` (the default), the raw payload of
+    each fetch is fingerprinted and compared to the fingerprints saved by
+    the previous successful updates of the same dataset in the same
+    namespace, one for each store. Stores whose fingerprint matches are
+    left alone, and if every store's does, the dataset is not transformed,
+    de-duplicated or stored at all.
+
+    When ``workers`` is greater than one, large batches from datasets that
+    have ``dedup_facets`` are transformed and de-duplicated in that many
+    worker processes, see :func:`mtdata.parallel.transform_dedup`.
+
+    When ``spatial_index`` is ``True``, stores maintain a spatial index
+    for datasets that have ``spatial_fields``, see
+    :meth:`mtdata.storage.Storage.load_within`.
+
+    When ``journal`` is ``True``, every row appended to a store is also
+    recorded in the namespace's change-data-capture journal, see
+    :class:`mtdata.journal.Journal`.
+
+    When ``spool`` is ``True`` (the default), the transformed rows of each
+    update are checkpointed to the namespace's spool until every store
+    has them. Stores that failed are retried from the spool, before the
+    dataset is fetched again, by the next update or by ``retry_spool``.
+    Stores that succeeded aren't written again.
+
+    Rows are streamed from the fetch, through the transformer and the
+    spool, to each store, which de-duplicates and writes them
+    ``batch_rows`` at a time, so memory use doesn't grow with the size
+    of a fetch (as long as the dataset's ``fetch`` returns its rows as
+    they arrive). Only batches that are transformed by worker processes
+    are held in memory whole.
     """
 
+    _batch_rows: int
     _configs: RegistryList
+    _journal: bool
+    _spool: bool
+    _skip_unchanged: bool
+    _spatial_index: bool
+    _workers: int
 
-    def __init__(self, configs: RegistryList = ()):
+    def __init__(
+        self,
+        configs: RegistryList = (),
+        skip_unchanged: bool = True,
+        workers: int = 1,
+        spatial_index: bool = False,
+        journal: bool = False,
+        spool: bool = True,
+        batch_rows: int = WRITE_BATCH,
+    ):
+        self._batch_rows = batch_rows
         self._configs = list(configs)
+        self._journal = journal
+        self._spool = spool
+        self._skip_unchanged = skip_unchanged
+        self._spatial_index = spatial_index
+        self._workers = workers
 
-    def update(self, namespace: str) -> Iterable[UpdateResult]:
+    def update(self, namespace: Union[str, Sequence[str]]) -> Iterable[UpdateResult]:
         """
         Fetch new data for all datasets and store it accordingly.
+
+        ``namespace`` may also be a list of namespaces. Each dataset is
+        then fetched and transformed once, and its rows are written to
+        the stores of every namespace. Each namespace keeps its own
+        fingerprints, spool and de-duplication, and gets its own result.
         """
+        namespaces = [namespace] if isinstance(namespace, str) else list(namespace)
+        journals = {ns: Journal(ns) if self._journal else None for ns in namespaces}
+        spools = {
+            ns: Spool(ns, self._batch_rows) if self._spool else None
+            for ns in namespaces
+        }
+
         for dataset_class, store_classes in self._configs:
             dataset = dataset_class()
+            for ns in namespaces:
+                spool = spools[ns]
+                if spool is not None and spool.batches(dataset.name()):
+                    # Catch up the stores that failed last time before the
+                    # newly fetched rows are written after them
+                    yield self._retry_spooled(
+                        ns, spool, dataset, store_classes, journals[ns]
+                    )
+
             fetch_result = retry(dataset.fetch)
 
-            if fetch_result.success:
-                transformer = dataset.transformer
-                transformed_data = (transformer(d) for d in fetch_result.data)
-                store_results = []
-                success = True
-                for store_class in store_classes:
-                    store = store_class(namespace=namespace)
-                    store_result = store.append(
+            if not fetch_result.success:
+                for ns in namespaces:
+                    yield UpdateResult(
+                        success=False,
+                        fetch_result=fetch_result,
+                        store_results=(),
                         name=dataset.name(),
-                        data=transformed_data,
-                        dedup_facets=dataset.dedup_facets,
-                        dedup_fields=dataset.dedup_fields,
+                        timestamp=datetime.now(),
+                        namespace=ns,
                     )
-                    store_results.append(store_result)
-                    success = success and store_result.success
+                continue
 
-                if success:
+            fingerprint = None
+            if fetch_result.raw:
+                fingerprint = payload_fingerprint(fetch_result.raw)
+
+            pending = []
+            changed = {}
+            for ns in namespaces:
+                changed[ns] = self._changed(ns, dataset, store_classes, fingerprint)
+                if not changed[ns]:
                     yield UpdateResult(
                         success=True,
                         fetch_result=fetch_result,
-                        store_results=store_results,
+                        store_results=(),
                         name=dataset.name(),
                         timestamp=datetime.now(),
+                        unchanged=True,
+                        namespace=ns,
                     )
                 else:
-                    yield UpdateResult(
-                        success=False,
-                        fetch_result=fetch_result,
-                        store_results=store_results,
-                        name=dataset.name(),
-                        timestamp=datetime.now(),
+                    pending.append(ns)
+            if not pending:
+                continue
+
+            stores = {
+                ns: self._stores(ns, dataset, changed[ns], journals[ns])
+                for ns in pending
+            }
+
+            data = fetch_result.data
+            parallel = False
+            if self._workers > 1 and list(dataset.dedup_facets):
+                # Large batches are split up between worker processes, so
+                # they are held in memory
+                data = list(data)
+                parallel = len(data) >= PARALLEL_THRESHOLD
+
+            if parallel:
+                # Transformed once, de-duplicated against every store in
+                # every namespace
+                all_stores = [store for ns in pending for store in stores[ns]]
+                batches = iter(
+                    transform_dedup(dataset_class, data, all_stores, self._workers)
+                )
+                for ns in pending:
+                    targets = []
+                    for store in stores[ns]:
+                        batch = next(batches)
+                        spooled = self._checkpoint(
+                            spools[ns], dataset, batch, [store], fingerprint
+                        )
+                        targets.append((partial(iter, batch), [store], spooled))
+                    # Already de-duplicated against each store
+                    yield self._store_rows(
+                        ns,
+                        spools[ns],
+                        dataset,
+                        targets,
+                        False,
+                        fetch_result,
+                        fingerprint,
                     )
             else:
-                yield UpdateResult(
-                    success=False,
-                    fetch_result=fetch_result,
-                    store_results=(),
-                    name=dataset.name(),
-                    timestamp=datetime.now(),
+                with ExitStack() as stack:
+                    sources = self._sources(
+                        stack, dataset, data, pending, spools, stores, fingerprint
+                    )
+                    for ns in pending:
+                        read, spooled = sources[ns]
+                        yield self._store_rows(
+                            ns,
+                            spools[ns],
+                            dataset,
+                            [(read, stores[ns], spooled)],
+                            True,
+                            fetch_result,
+                            fingerprint,
+                        )
+
+    def _sources(
+        self,
+        stack: ExitStack,
+        dataset: Dataset,
+        data: Iterable[Row],
+        namespaces: List[str],
+        spools: Dict[str, Optional[Spool]],
+        stores: Dict[str, List[Storage]],
+        fingerprint: Optional[str],
+    ) -> Dict[str, Tuple[RowSource, Optional[SpoolBatch]]]:
+        """
+        Transform the fetched rows once, checkpoint them in the spool of
+        each namespace, and decide where the stores of each namespace read
+        them from, along with the spooled batch to complete, if any.
+
+        Rows are streamed rather than collected in memory: each store reads
+        the rows from its namespace's spool. Without a spool, they're
+        staged in a temporary directory (closed with ``stack``) unless a
+        single store can take them straight from the fetch. Fetches of no
+        more than ``batch_rows`` rows are simply kept in memory.
+        """
+        transformer = dataset.transformer
+        rows: Iterable[Row] = (transformer(row) for row in data)
+        shared: Optional[RowSource] = None
+        if isinstance(data, Sized) and len(data) <= self._batch_rows:
+            shared = partial(iter, list(rows))
+
+        sources: Dict[str, Tuple[RowSource, Optional[SpoolBatch]]] = {}
+        spooled_source: Optional[RowSource] = None
+        for ns in namespaces:
+            spool = spools[ns]
+            if spool is None:
+                continue
+            if shared is not None:
+                rows = shared()
+            elif spooled_source is not None:
+                # Copied from the first checkpoint, rather than kept
+                rows = spooled_source()
+            spooled = spool.save(
+                dataset.name(),
+                rows,
+                [store.name() for store in stores[ns]],
+                fingerprint,
+            )
+            read = partial(spool.rows, spooled)
+            spooled_source = spooled_source or read
+            sources[ns] = (shared or read, spooled)
+
+        unspooled = [ns for ns in namespaces if ns not in sources]
+        if unspooled:
+            if shared is None:
+                # A spooled batch is removed once its stores have it, so
+                # it can't be shared with another namespace's stores
+                if not sources and sum(len(stores[ns]) for ns in unspooled) == 1:
+                    shared = partial(iter, rows)
+                else:
+                    scratch = Spool(stack.enter_context(TemporaryDirectory()))
+                    staged = scratch.save(
+                        dataset.name(),
+                        rows if spooled_source is None else spooled_source(),
+                        [],
+                    )
+                    shared = partial(scratch.rows, staged)
+            for ns in unspooled:
+                sources[ns] = (shared, None)
+        return sources
+
+    def _store_rows(
+        self,
+        namespace: str,
+        spool: Optional[Spool],
+        dataset: Dataset,
+        targets: Iterable[Tuple[RowSource, List[Storage], Optional[SpoolBatch]]],
+        dedup: bool,
+        fetch_result: FetchResult,
+        fingerprint: Optional[str],
+    ) -> UpdateResult:
+        """
+        Append rows to their stores, which all belong to the given
+        namespace, reading them anew for each store. Each target is where
+        to read the rows, the stores to append them to, and the batch they
+        were checkpointed as. If ``dedup`` is ``False`` the rows have
+        already been de-duplicated against their stores.
+        """
+        store_results = []
+        success = True
+
+        for read, stores, spooled in targets:
+            for store in stores:
+                store_result = self._append(
+                    store,
+                    dataset.name(),
+                    read,
+                    dataset.dedup_facets if dedup else (),
+                    dataset.dedup_fields if dedup else (),
                 )
+                self._complete(spool, spooled, store, store_result)
+                store_results.append(store_result)
+                success = success and store_result.success
+                # Only remembered by the stores that have the payload,
+                # otherwise a failed store would never be retried.
+                if store_result.success and fingerprint is not None:
+                    save_fingerprint(
+                        namespace, dataset.name(), store.name(), fingerprint
+                    )
+
+        return UpdateResult(
+            success=success,
+            fetch_result=fetch_result,
+            store_results=store_results,
+            name=dataset.name(),
+            timestamp=datetime.now(),
+            namespace=namespace,
+        )
+
+    def retry_spool(self, namespace: str) -> Iterable[UpdateResult]:
+        """
+        Write the rows checkpointed by earlier updates to the stores that
+        failed to store them, without fetching anything. Only datasets and
+        stores that are part of this registry are retried.
+        """
+        journal = Journal(namespace) if self._journal else None
+        spool = Spool(namespace, self._batch_rows)
+
+        for dataset_class, store_classes in self._configs:
+            dataset = dataset_class()
+            if spool.batches(dataset.name()):
+                yield self._retry_spooled(
+                    namespace, spool, dataset, store_classes, journal
+                )
+
+    def _retry_spooled(
+        self,
+        namespace: str,
+        spool: Spool,
+        dataset: Dataset,
+        store_classes: Iterable[Type[Storage]],
+        journal: Optional[Journal],
+    ) -> UpdateResult:
+        name = dataset.name()
+        stores = {
+            store.name(): store
+            for store in self._stores(namespace, dataset, store_classes, journal)
+        }
+        store_results = []
+        success = True
+
+        for batch in spool.batches(name):
+            for store_name in batch.stores:
+                store = stores.get(store_name)
+                if store is None:
+                    # Left for an update that uses this store
+                    continue
+                store_result = self._append(
+                    store,
+                    name,
+                    partial(spool.rows, batch),
+                    dataset.dedup_facets,
+                    dataset.dedup_fields,
+                )
+                store_results.append(store_result)
+                success = success and store_result.success
+                if store_result.success:
+                    spool.complete(batch, store_name)
+                    if batch.fingerprint is not None:
+                        save_fingerprint(namespace, name, store_name, batch.fingerprint)
+
+        return UpdateResult(
+            success=success,
+            fetch_result=FetchResult(True, "retried from spool", []),
+            store_results=store_results,
+            name=name,
+            timestamp=datetime.now(),
+            spooled=True,
+            namespace=namespace,
+        )
+
+    def _changed(
+        self,
+        namespace: str,
+        dataset: Dataset,
+        store_classes: Iterable[Type[Storage]],
+        fingerprint: Optional[str],
+    ) -> List[Type[Storage]]:
+        """
+        The stores that don't have the fetched payload yet, according to
+        the fingerprints they saved in the given namespace.
+        """
+        if not self._skip_unchanged or fingerprint is None:
+            return list(store_classes)
+        return [
+            store_class
+            for store_class in store_classes
+            if load_fingerprint(namespace, dataset.name(), store_class.name())
+            != fingerprint
+        ]
+
+    def _stores(
+        self,
+        namespace: str,
+        dataset: Dataset,
+        store_classes: Iterable[Type[Storage]],
+        journal: Optional[Journal],
+    ) -> List[Storage]:
+        options = store_options(dataset, self._spatial_index, self._batch_rows)
+        stores = [
+            store_class(namespace=namespace, options=options)
+            for store_class in store_classes
+        ]
+        if journal is not None:
+            for store in stores:
+                store.subscribe(journal)
+        return stores
+
+    @staticmethod
+    def _checkpoint(
+        spool: Optional[Spool],
+        dataset: Dataset,
+        rows: Sequence[Row],
+        stores: Iterable[Storage],
+        fingerprint: Optional[str],
+    ) -> Optional[SpoolBatch]:
+        if spool is None:
+            return None
+        names = [store.name() for store in stores]
+        return spool.save(dataset.name(), rows, names, fingerprint)
+
+    @staticmethod
+    def _append(
+        store: Storage,
+        name: str,
+        read: RowSource,
+        dedup_facets: Iterable[str],
+        dedup_fields: Iterable[str],
+    ) -> StoreResult:
+        """
+        Append the rows to the store, reporting an exception raised by the
+        store (a full disk, say) as a failed result, so the rows stay
+        spooled and the other stores and datasets are still updated.
+        """
+        try:
+            return store.append(
+                name=name,
+                data=read(),
+                dedup_facets=dedup_facets,
+                dedup_fields=dedup_fields,
+            )
+        except Exception as e:
+            return StoreResult(success=False, message=f"{store.name()}: {e}")
+
+    @staticmethod
+    def _complete(
+        spool: Optional[Spool],
+        spooled: Optional[SpoolBatch],
+        store: Storage,
+        result: StoreResult,
+    ) -> None:
+        if spool is not None and spooled is not None and result.success:
+            spool.complete(spooled, store.name())
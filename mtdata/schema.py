@@ -0,0 +1,211 @@
+from abc import ABC, abstractmethod
+from calendar import timegm
+from datetime import datetime, timedelta
+from typing import Any, Callable, Dict, Iterable, Iterator, Optional
+
+from .row import Row
+
+_EPOCH = datetime(1970, 1, 1)
+
+
+def epoch_seconds(time: datetime) -> int:
+    """
+    The whole number of seconds from the epoch to the given time. Naive
+    times are taken to be UTC, so that ``from_epoch`` gives back the same
+    wall-clock time whatever zone it was recorded in.
+
+    >>> epoch_seconds(datetime(2021, 9, 13, 2, 0))
+    1631498400
+    """
+    if time.tzinfo is not None:
+        return int(time.timestamp())
+    return timegm(time.timetuple())
+
+
+def from_epoch(seconds: int) -> datetime:
+    """
+    The naive time that ``epoch_seconds`` converted to the given number
+    of seconds.
+
+    >>> from_epoch(1631498400)
+    datetime.datetime(2021, 9, 13, 2, 0)
+    """
+    return _EPOCH + timedelta(seconds=seconds)
+
+
+class FieldType(ABC):
+    """
+    The declared type of a (transformed) field, see
+    :class:`mtdata.transformer.Transformer`. It is applied to each value
+    when rows are transformed, so that stores are given values of that
+    type, and to the values read back from stores that can't keep the
+    type themselves (CSV only tells numbers from strings).
+
+    Applying a type to a value that already has it must return the value
+    unchanged, and ``None`` (or an empty string, which is how CSV reads
+    back ``None``) always becomes ``None``.
+    """
+
+    @abstractmethod
+    def __call__(self, value: Any) -> Any:
+        """
+        Convert a value to this type.
+        """
+
+
+class Integer(FieldType):
+    """
+    >>> Integer()(3.0), Integer()('3'), Integer()('')
+    (3, 3, None)
+    """
+
+    def __call__(self, value: Any) -> Optional[int]:
+        if value is None or value == "":
+            return None
+        if isinstance(value, int):
+            return value
+        return int(value)
+
+
+class Float(FieldType):
+    """
+    >>> Float()(3), Float()('3.5'), Float()(None)
+    (3.0, 3.5, None)
+    """
+
+    def __call__(self, value: Any) -> Optional[float]:
+        if value is None or value == "":
+            return None
+        return float(value)
+
+
+class Text(FieldType):
+    """
+    >>> Text()(30063), Text()('x'), Text()(None)
+    ('30063', 'x', None)
+    """
+
+    def __call__(self, value: Any) -> Optional[str]:
+        if value is None:
+            return None
+        return str(value)
+
+
+class EpochTime(FieldType):
+    """
+    A time, stored as the integer number of seconds since the epoch (see
+    ``epoch_seconds``) so that times compare, sort, and de-duplicate as
+    plain integers. Strings are parsed with the given ``strptime`` format,
+    or as ISO 8601 if there isn't one.
+
+    >>> EpochTime()('2021-09-13T02:00')
+    1631498400
+    >>> EpochTime('%m/%d/%Y %I:%M:%S %p')('9/13/2021 2:00:00 AM')
+    1631498400
+    >>> EpochTime()(1631498400.0)
+    1631498400
+    """
+
+    format: Optional[str]
+
+    def __init__(self, format: Optional[str] = None):
+        self.format = format
+
+    def __call__(self, value: Any) -> Optional[int]:
+        if value is None or value == "":
+            return None
+        if isinstance(value, int):
+            return value
+        if isinstance(value, float):
+            return int(value)
+        return epoch_seconds(self.parse(value))
+
+    def parse(self, value: Any) -> datetime:
+        """
+        Convert a value of this type, or a string in the format it was
+        fetched in (as rows stored before the field was typed hold), to
+        a naive ``datetime``.
+
+        >>> EpochTime('%Y-%m-%d').parse(1631491200)
+        datetime.datetime(2021, 9, 13, 0, 0)
+        >>> EpochTime('%Y-%m-%d').parse('2021-09-13')
+        datetime.datetime(2021, 9, 13, 0, 0)
+        """
+        if isinstance(value, (int, float)):
+            return from_epoch(int(value))
+        if self.format is None:
+            return datetime.fromisoformat(value)
+        return datetime.strptime(value, self.format)
+
+
+FieldTypes = Dict[str, FieldType]
+
+
+def apply_types(row: Row, types: FieldTypes) -> Row:
+    """
+    Convert the fields of a row that have declared types, in place. Fields
+    the row doesn't have are left out.
+
+    >>> apply_types({'a': 1.0, 'b': 'x'}, {'a': Integer(), 'c': Integer()})
+    {'a': 1, 'b': 'x'}
+    """
+    for name, field_type in types.items():
+        if name in row:
+            row[name] = field_type(row[name])
+    return row
+
+
+def typed_rows(rows: Iterable[Row], types: Optional[FieldTypes]) -> Iterable[Row]:
+    """
+    Apply the declared types to each of the rows as they are read, or pass
+    the rows through if there are no types.
+    """
+    if not types:
+        return rows
+    return (apply_types(row, types) for row in rows)
+
+
+def time_filter(
+    parse_time: Callable[[Any], datetime],
+    since: Optional[datetime],
+    until: Optional[datetime],
+) -> Callable[[Any], bool]:
+    """
+    A test of whether a time value falls between ``since`` and ``until``
+    (inclusive, either may be ``None``). Epoch values (see ``EpochTime``)
+    are compared to the bounds as integers, anything else is converted
+    with ``parse_time`` first.
+
+    >>> within = time_filter(datetime.fromisoformat, datetime(2021, 9, 13), None)
+    >>> within(1631498400), within('2021-09-12T23:00'), within(None)
+    (True, False, False)
+    """
+    low = None if since is None else epoch_seconds(since)
+    high = None if until is None else epoch_seconds(until)
+
+    def within(value: Any) -> bool:
+        if value is None:
+            return False
+        if type(value) is int:
+            return (low is None or value >= low) and (high is None or value <= high)
+        time = parse_time(value)
+        return (since is None or time >= since) and (until is None or time <= until)
+
+    return within
+
+
+def time_key(parse_time: Callable[[Any], datetime]) -> Callable[[Any], int]:
+    """
+    A sort key for time values that uses epoch values as they are and
+    converts anything else with ``parse_time``.
+
+    >>> sorted([1631498400, '2021-09-13T01:00'], key=time_key(datetime.fromisoformat))
+    ['2021-09-13T01:00', 1631498400]
+    """
+
+    def key(value: Any) -> int:
+        if type(value) is int:
+            return value
+        return epoch_seconds(parse_time(value))
+
+    return key
@@ -0,0 +1,370 @@
+import json
+import threading
+from bisect import bisect_left
+from datetime import datetime
+from itertools import chain, islice
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Dict, Iterable, Iterator, List, NamedTuple, Optional, Tuple, Type
+from urllib.parse import parse_qs, urlsplit
+
+from .dataset import Dataset
+from .manifest import get_dataset
+from .row import Row
+from .storage import Storage
+
+# An offset is remembered for every this many rows of a dataset.
+INDEX_STRIDE = 1_000
+
+# Rows are buffered until a response chunk holds about this many bytes.
+CHUNK_BYTES = 1 << 16
+
+
+class RequestError(Exception):
+    """
+    A request that can't be answered, along with the HTTP status that
+    should be sent back.
+    """
+
+    status: int
+
+    def __init__(self, status: int, message: str):
+        super().__init__(message)
+        self.status = status
+
+
+class OffsetIndex(NamedTuple):
+    """
+    A sparse, in-memory index over the rows of a stored dataset: the
+    time of every ``INDEX_STRIDE``-th row, along with its byte offset.
+    ``length`` is the length of the data that has been indexed and
+    ``rows`` is the number of rows it holds.
+    """
+
+    version: str
+    length: int
+    rows: int
+    times: List[datetime]
+    offsets: List[int]
+
+    def start(self, since: Optional[datetime]) -> int:
+        """
+        The offset of a row before the first row at or after ``since``,
+        so reading can begin there. Rows must be in chronological order.
+
+        >>> times = [datetime(2021, 1, 1), datetime(2021, 1, 3)]
+        >>> index = OffsetIndex('1', 30, 3, times, [0, 20])
+        >>> index.start(datetime(2021, 1, 3)), index.start(datetime(2021, 1, 4))
+        (0, 20)
+        """
+        if since is None or not self.times:
+            return 0
+        position = bisect_left(self.times, since) - 1
+        return self.offsets[max(position, 0)]
+
+
+class DataService:
+    """
+    Answers requests for the rows of the datasets in a namespace, read
+    from a single kind of store. Each dataset is read through a store of
+    the same class opened with the dataset's own options (so its field
+    types are applied). Offset indexes are built the first time a
+    dataset is requested and kept in memory. When the data grow, only the
+    new rows are indexed, when they are replaced the index is rebuilt.
+    """
+
+    _store: Storage
+    _stores: Dict[str, Storage]
+    _stores_lock: threading.Lock
+    _indexes: Dict[str, OffsetIndex]
+    _lock: threading.Lock
+
+    def __init__(self, store: Storage):
+        self._store = store
+        self._stores = {}
+        self._stores_lock = threading.Lock()
+        self._indexes = {}
+        self._lock = threading.Lock()
+
+    @property
+    def store(self) -> Storage:
+        return self._store
+
+    def dataset(self, name: str) -> Dataset:
+        """
+        The dataset with the given name, which must have data in the store.
+        """
+        dataset_class = get_dataset(name)
+        if dataset_class is None or self._store.version(name) is None:
+            raise RequestError(404, f"no such dataset: {name}")
+        return dataset_class()
+
+    def dataset_store(self, dataset: Dataset) -> Storage:
+        """
+        The store the rows of the dataset are read from.
+        """
+        from .registry import store_options
+
+        name = dataset.name()
+        with self._stores_lock:
+            store = self._stores.get(name)
+            if store is None:
+                store_class = type(self._store)
+                store = store_class(self._store.namespace, store_options(dataset))
+                self._stores[name] = store
+            return store
+
+    def rows(
+        self,
+        dataset: Dataset,
+        since: Optional[datetime] = None,
+        limit: Optional[int] = None,
+        fields: Optional[List[str]] = None,
+    ) -> Iterator[Row]:
+        """
+        Stream the rows of the dataset at or after ``since``, at most
+        ``limit`` of them, projected onto ``fields``.
+        """
+        from .projection import project
+
+        rows: Iterable[Row]
+        if since is None:
+            rows = self.dataset_store(dataset).load(dataset.name(), fields=fields)
+        else:
+            rows = self._since(dataset, since, fields)
+
+        for count, row in enumerate(rows):
+            if limit is not None and count >= limit:
+                break
+            yield row if fields is None else project(row, fields)
+
+    def _since(
+        self, dataset: Dataset, since: datetime, fields: Optional[List[str]]
+    ) -> Iterator[Row]:
+        name = dataset.name()
+        time_field = dataset.time_field
+        if time_field is None:
+            raise RequestError(400, f"dataset {name} has no time field")
+
+        columns = fields
+        if columns is not None and time_field not in columns:
+            columns = columns + [time_field]
+
+        store = self.dataset_store(dataset)
+        try:
+            index = self.index(dataset)
+        except NotImplementedError:
+            yield from store.load_range(
+                name, time_field, dataset.parse_time, since, fields=columns
+            )
+            return
+
+        for _, row in store.load_offsets(name, index.start(since), columns):
+            value = row.get(time_field)
+            if value is not None and dataset.parse_time(value) >= since:
+                yield row
+
+    def index(self, dataset: Dataset) -> OffsetIndex:
+        """
+        The offset index for the dataset, brought up to date with the
+        store. Raises ``NotImplementedError`` if the store can't read
+        rows from an offset.
+        """
+        name = dataset.name()
+        with self._lock:
+            version = self._store.version(name) or ""
+            index = self._indexes.get(name)
+            if index is not None and index.version == version:
+                return index
+            if index is None or not self._still_valid(dataset, index):
+                index = OffsetIndex(version, 0, 0, [], [])
+
+            index = self._extend(dataset, index, version)
+            self._indexes[name] = index
+            return index
+
+    def _still_valid(self, dataset: Dataset, index: OffsetIndex) -> bool:
+        """
+        Whether the data an index was built from are still there (and
+        have only been appended to) by checking the last indexed row.
+        """
+        name = dataset.name()
+        store = self.dataset_store(dataset)
+        if store.data_length(name) < index.length:
+            return False
+        if not index.offsets:
+            return True
+
+        time_field = dataset.time_field or ""
+        for row in store.load_at(name, index.offsets[-1:], [time_field]):
+            value = row.get(time_field)
+            return value is not None and dataset.parse_time(value) == index.times[-1]
+        return False
+
+    def _extend(
+        self, dataset: Dataset, index: OffsetIndex, version: str
+    ) -> OffsetIndex:
+        name = dataset.name()
+        time_field = dataset.time_field or ""
+        times = list(index.times)
+        offsets = list(index.offsets)
+        store = self.dataset_store(dataset)
+        length = store.data_length(name)
+
+        count = index.rows
+        for offset, row in store.load_offsets(name, index.length, [time_field]):
+            # Rows written while indexing are left for next time
+            if offset >= length:
+                break
+            count += 1
+            if (count - 1) % INDEX_STRIDE:
+                continue
+            value = row.get(time_field)
+            if value is not None:
+                times.append(dataset.parse_time(value))
+                offsets.append(offset)
+
+        return OffsetIndex(version, length, count, times, offsets)
+
+
+def _parse_request(
+    query: str,
+) -> Tuple[Optional[datetime], Optional[int], Optional[List[str]]]:
+    """
+    Parse the ``since``, ``limit`` and ``fields`` parameters of a query
+    string.
+
+    >>> _parse_request('since=2021-09-13&limit=5&fields=a,b')
+    (datetime.datetime(2021, 9, 13, 0, 0), 5, ['a', 'b'])
+    >>> _parse_request('')
+    (None, None, None)
+    """
+    values = {key: value[-1] for key, value in parse_qs(query).items()}
+    try:
+        since = None
+        if "since" in values:
+            since = datetime.fromisoformat(values["since"])
+        limit = int(values["limit"]) if "limit" in values else None
+    except ValueError as error:
+        raise RequestError(400, str(error))
+
+    fields = None
+    if "fields" in values:
+        fields = [f.strip() for f in values["fields"].split(",") if f.strip()]
+    return since, limit, fields
+
+
+def _handler(service: DataService) -> Type[BaseHTTPRequestHandler]:
+    class Handler(BaseHTTPRequestHandler):
+        protocol_version = "HTTP/1.1"
+
+        def do_GET(self) -> None:
+            try:
+                self._get()
+            except RequestError as error:
+                self._send_error(error.status, str(error))
+
+        def _get(self) -> None:
+            url = urlsplit(self.path)
+            parts = [part for part in url.path.split("/") if part]
+            if len(parts) != 2 or parts[0] != "datasets":
+                raise RequestError(404, f"not found: {url.path}")
+
+            dataset = service.dataset(parts[1])
+            since, limit, fields = _parse_request(url.query)
+
+            gzip = "gzip" in self.headers.get("Accept-Encoding", "")
+            etag = f'"{service.store.version(dataset.name())}{"-gz" if gzip else ""}"'
+            if etag in _etags(self.headers.get("If-None-Match", "")):
+                self.send_response(304)
+                self.send_header("ETag", etag)
+                self.send_header("Content-Length", "0")
+                self.end_headers()
+                return
+
+            rows = service.rows(dataset, since, limit, fields)
+            # Find errors before the response begins
+            first = list(islice(rows, 1))
+
+            self.send_response(200)
+            self.send_header("Content-Type", "application/x-ndjson")
+            self.send_header("Transfer-Encoding", "chunked")
+            self.send_header("ETag", etag)
+            self.send_header("Vary", "Accept-Encoding")
+            if gzip:
+                self.send_header("Content-Encoding", "gzip")
+            self.end_headers()
+
+            self._stream(_lines(chain(first, rows)), gzip)
+
+        def _stream(self, lines: Iterator[bytes], gzip: bool) -> None:
+            import zlib
+
+            compressor = zlib.compressobj(wbits=31) if gzip else None
+            buffer: List[bytes] = []
+            size = 0
+            for line in lines:
+                buffer.append(line)
+                size += len(line)
+                if size >= CHUNK_BYTES:
+                    data = b"".join(buffer)
+                    self._chunk(compressor.compress(data) if compressor else data)
+                    buffer, size = [], 0
+
+            data = b"".join(buffer)
+            if compressor is not None:
+                data = compressor.compress(data) + compressor.flush()
+            self._chunk(data)
+            self.wfile.write(b"0\r\n\r\n")
+
+        def _chunk(self, data: bytes) -> None:
+            if data:
+                self.wfile.write(f"{len(data):x}\r\n".encode() + data + b"\r\n")
+
+        def _send_error(self, status: int, message: str) -> None:
+            body = json.dumps({"error": message}).encode()
+            self.send_response(status)
+            self.send_header("Content-Type", "application/json")
+            self.send_header("Content-Length", str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+
+    return Handler
+
+
+def _lines(rows: Iterable[Row]) -> Iterator[bytes]:
+    for row in rows:
+        yield json.dumps(row, sort_keys=True).encode() + b"\n"
+
+
+def _etags(header: str) -> List[str]:
+    """
+    The entity tags listed in an ``If-None-Match`` header.
+
+    >>> _etags('"a", W/"b"')
+    ['"a"', '"b"']
+    """
+    tags = []
+    for tag in header.split(","):
+        tag = tag.strip()
+        if tag.startswith("W/"):
+            tag = tag[2:]
+        if tag:
+            tags.append(tag)
+    return tags
+
+
+def make_server(
+    store: Storage, host: str = "127.0.0.1", port: int = 8000
+) -> ThreadingHTTPServer:
+    """
+    Create (but don't start) a read-only HTTP server for the datasets in
+    the given store. Each dataset is available at ``/datasets/<name>``
+    as JSON-lines, filtered by the optional ``since`` (ISO 8601),
+    ``limit`` and ``fields`` (comma-delimited) query parameters.
+
+    Responses are streamed in chunks, gzip-compressed if the client
+    accepts it, and carry an ``ETag`` that changes whenever the stored
+    data change, so clients can send ``If-None-Match`` to avoid
+    downloading data they already have.
+    """
+    return ThreadingHTTPServer((host, port), _handler(DataService(store)))
@@ -0,0 +1,86 @@
+import os
+from typing import TYPE_CHECKING, Any, Optional
+
+if TYPE_CHECKING:
+    from requests import Response
+
+# If set, the raw response to each successful fetch is saved in this
+# directory, see ``save_recording``.
+RECORD_ENV = "MTDATA_RECORD"
+
+# If set, datasets are fetched from the stand-in source server at this
+# URL instead of from their real sources, see :mod:`mtdata.standin`.
+REPLAY_ENV = "MTDATA_REPLAY"
+
+
+def http_get(
+    dataset: str, url: str, params: Optional[Any] = None, **kwargs: Any
+) -> "Response":
+    """
+    Send a GET request to the source of the dataset with the given name.
+    Datasets use this instead of calling ``requests.get`` themselves so
+    that their responses can be recorded, and replayed, for testing.
+
+    If the ``MTDATA_REPLAY`` environment variable holds the URL of a
+    stand-in server, the request is sent to ``<URL>/sources/<dataset>``
+    instead, with the same parameters. If ``MTDATA_RECORD`` names a
+    directory, the body of a successful response is saved there.
+    """
+    import requests
+
+    replay = os.environ.get(REPLAY_ENV)
+    if replay:
+        url = source_url(replay, dataset)
+        kwargs.pop("verify", None)
+
+    resp = requests.get(url, params, **kwargs)
+
+    record = os.environ.get(RECORD_ENV)
+    if record and resp.status_code == 200:
+        save_recording(record, dataset, resp.content)
+
+    return resp
+
+
+def source_url(base: str, dataset: str) -> str:
+    """
+    The URL a stand-in server at the given base URL serves a dataset at.
+
+    >>> source_url('http://127.0.0.1:8001/', 'air_quality')
+    'http://127.0.0.1:8001/sources/air_quality'
+    """
+    return f"{base.rstrip('/')}/sources/{dataset}"
+
+
+def recording_path(directory: str, dataset: str) -> str:
+    """
+    The path of the recorded response for the given dataset.
+    """
+    return os.path.join(directory, f"{dataset}.recording")
+
+
+def save_recording(directory: str, dataset: str, body: bytes) -> None:
+    """
+    Save a raw response for the given dataset, replacing any response
+    recorded earlier.
+    """
+    from .locking import temporary_path
+
+    os.makedirs(directory, exist_ok=True)
+    path = recording_path(directory, dataset)
+    temporary = temporary_path(path)
+    with open(temporary, "wb") as file:
+        file.write(body)
+    os.replace(temporary, path)
+
+
+def load_recording(directory: str, dataset: str) -> Optional[bytes]:
+    """
+    Load the response recorded for the given dataset, or ``None`` if
+    there isn't one.
+    """
+    try:
+        with open(recording_path(directory, dataset), "rb") as file:
+            return file.read()
+    except FileNotFoundError:
+        return None
@@ -0,0 +1,238 @@
+from math import asin, cos, degrees, floor, radians, sin, sqrt
+from typing import Dict, Iterable, Iterator, List, NamedTuple, Optional, Tuple
+
+from .row import Row
+
+# The default size, in degrees, of the cells in a grid index. At Montana's
+# latitude this is roughly 5 by 4 kilometers.
+GRID_SIZE = 0.05
+
+EARTH_RADIUS_KM = 6371.0088
+
+
+class BoundingBox(NamedTuple):
+    """
+    A latitude / longitude rectangle, in degrees. Edges are inclusive.
+    """
+
+    south: float
+    west: float
+    north: float
+    east: float
+
+    def contains(self, latitude: float, longitude: float) -> bool:
+        """
+        Whether the given point lies within the box.
+
+        >>> BoundingBox(46.0, -115.0, 47.0, -113.0).contains(46.87, -114.0)
+        True
+        >>> BoundingBox(46.0, -115.0, 47.0, -113.0).contains(45.0, -114.0)
+        False
+        """
+        return (
+            self.south <= latitude <= self.north and self.west <= longitude <= self.east
+        )
+
+
+def coordinates(row: Row, fields: Tuple[str, str]) -> Optional[Tuple[float, float]]:
+    """
+    Extract the latitude and longitude of a row, given the names of the
+    fields that hold them, or ``None`` if the row doesn't have usable
+    coordinates.
+
+    >>> coordinates({'lat': '46.5', 'lon': -114}, ('lat', 'lon'))
+    (46.5, -114.0)
+    >>> coordinates({'lat': '', 'lon': -114}, ('lat', 'lon')) is None
+    True
+    """
+    try:
+        return float(row[fields[0]]), float(row[fields[1]])
+    except (KeyError, TypeError, ValueError):
+        return None
+
+
+def grid_cell(latitude: float, longitude: float, size: float = GRID_SIZE) -> str:
+    """
+    The identifier of the grid cell that contains the given point.
+
+    >>> grid_cell(46.87, -114.01)
+    '937:-2281'
+    """
+    return f"{floor(latitude / size)}:{floor(longitude / size)}"
+
+
+def grid_cells(box: BoundingBox, size: float = GRID_SIZE) -> List[str]:
+    """
+    The identifiers of every grid cell that overlaps the given box.
+
+    >>> grid_cells(BoundingBox(46.87, -114.01, 46.91, -113.99))
+    ['937:-2281', '937:-2280', '938:-2281', '938:-2280']
+    """
+    return [
+        f"{row}:{column}"
+        for row in range(floor(box.south / size), floor(box.north / size) + 1)
+        for column in range(floor(box.west / size), floor(box.east / size) + 1)
+    ]
+
+
+def distance_km(
+    latitude: float, longitude: float, other_latitude: float, other_longitude: float
+) -> float:
+    """
+    The great-circle distance between two points, in kilometers.
+
+    >>> round(distance_km(46.87, -113.99, 46.59, -112.04), 1)
+    151.8
+    """
+    phi1, phi2 = radians(latitude), radians(other_latitude)
+    half_phi = (phi2 - phi1) / 2
+    half_lambda = radians(other_longitude - longitude) / 2
+    a = sin(half_phi) ** 2 + cos(phi1) * cos(phi2) * sin(half_lambda) ** 2
+    return 2 * EARTH_RADIUS_KM * asin(sqrt(a))
+
+
+def bounding_box(latitude: float, longitude: float, radius_km: float) -> BoundingBox:
+    """
+    A box that contains every point within the given distance of the
+    given point (and some points that are a little further away).
+
+    >>> box = bounding_box(46.87, -113.99, 2)
+    >>> box.contains(46.885, -113.99), box.contains(46.9, -113.99)
+    (True, False)
+    """
+    latitude_delta = degrees(radius_km / EARTH_RADIUS_KM)
+    scale = max(cos(radians(latitude)), 1e-6)
+    longitude_delta = min(latitude_delta / scale, 180.0)
+    return BoundingBox(
+        latitude - latitude_delta,
+        longitude - longitude_delta,
+        latitude + latitude_delta,
+        longitude + longitude_delta,
+    )
+
+
+class GridIndex:
+    """
+    A fixed-grid spatial index over the rows of a data file, mapping grid
+    cells to the byte offsets of the rows whose coordinates fall into
+    them. It is stored in an append-only sidecar file next to the data
+    file, so indexing new rows only costs writing their entries.
+
+    The sidecar begins with a line that records the cell size, each
+    entry is a line of the form ``cell<TAB>offset``, and each batch of
+    entries is followed by a line ``#<TAB>length`` that records how much
+    of the data file has been indexed. That way a data file that grew
+    without the index being updated can be caught up later.
+    """
+
+    _path: str
+    _size: float
+
+    def __init__(self, path: str, size: float = GRID_SIZE):
+        self._path = path
+        self._size = size
+
+    @property
+    def path(self) -> str:
+        """
+        The path to the sidecar file.
+        """
+        return self._path
+
+    def read(self) -> Tuple[Dict[str, List[int]], int]:
+        """
+        Read the index, returning the mapping from cell to row offsets and
+        the length of the data file that has been indexed. An index with
+        a different cell size is treated as empty.
+        """
+        cells: Dict[str, List[int]] = {}
+        covered = 0
+        try:
+            with open(self._path, "r") as file:
+                if file.readline().strip() != f"@\t{self._size!r}":
+                    return {}, 0
+                for line in file:
+                    cell, _, value = line.rstrip("\n").partition("\t")
+                    if cell == "#":
+                        covered = int(value)
+                    elif value:
+                        cells.setdefault(cell, []).append(int(value))
+        except FileNotFoundError:
+            pass
+        return cells, covered
+
+    def covered(self) -> Optional[int]:
+        """
+        The length of the data file that has been indexed, or ``None`` if
+        there is no usable index. Only the ends of the sidecar are read.
+        """
+        from .backward import read_backward
+
+        try:
+            with open(self._path, "rb") as file:
+                if file.readline().decode().strip() != f"@\t{self._size!r}":
+                    return None
+                for line in read_backward(file):
+                    cell, _, value = line.rstrip("\n").partition("\t")
+                    if cell == "#":
+                        return int(value)
+        except FileNotFoundError:
+            pass
+        return None
+
+    def reset(self) -> None:
+        """
+        Remove every entry from the index.
+        """
+        with open(self._path, "w") as file:
+            file.write(f"@\t{self._size!r}\n#\t0\n")
+
+    def extend(
+        self, rows: Iterable[Tuple[int, Row]], fields: Tuple[str, str], length: int
+    ) -> None:
+        """
+        Add entries for the given rows, which are paired with their byte
+        offsets in the data file, and record that the data file has been
+        indexed up to ``length``.
+        """
+        entries: List[str] = []
+        for offset, row in rows:
+            point = coordinates(row, fields)
+            if point is not None:
+                entries.append(f"{grid_cell(*point, self._size)}\t{offset}\n")
+        entries.append(f"#\t{length}\n")
+
+        with open(self._path, "a") as file:
+            file.write("".join(entries))
+
+    def candidates(self, cells: Dict[str, List[int]], box: BoundingBox) -> List[int]:
+        """
+        The sorted offsets of every row that might lie within the box.
+        """
+        rows = range(floor(box.south / self._size), floor(box.north / self._size) + 1)
+        columns = range(floor(box.west / self._size), floor(box.east / self._size) + 1)
+
+        offsets: List[int] = []
+        if len(rows) * len(columns) <= len(cells):
+            for cell in grid_cells(box, self._size):
+                offsets.extend(cells.get(cell, ()))
+        else:
+            # The box covers more cells than the index holds, so it's
+            # cheaper to check each indexed cell against the box.
+            for cell, cell_offsets in cells.items():
+                row, _, column = cell.partition(":")
+                if int(row) in rows and int(column) in columns:
+                    offsets.extend(cell_offsets)
+        return sorted(offsets)
+
+
+def within(
+    rows: Iterable[Row], fields: Tuple[str, str], box: BoundingBox
+) -> Iterator[Row]:
+    """
+    Filter rows down to those whose coordinates lie within the box.
+    """
+    for row in rows:
+        point = coordinates(row, fields)
+        if point is not None and box.contains(*point):
+            yield row
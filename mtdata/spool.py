@@ -0,0 +1,194 @@
+import json
+import os
+import time
+from typing import Iterable, Iterator, List, NamedTuple, Optional
+
+from .row import Row
+
+
+class SpoolBatch(NamedTuple):
+    """
+    A batch of transformed rows that has been checkpointed to the spool,
+    along with the stores that haven't stored it yet and the fingerprint
+    of the payload it came from, if there was one.
+    """
+
+    dataset: str
+    batch: str
+    stores: List[str]
+    fingerprint: Optional[str] = None
+    created: Optional[str] = None
+
+
+class Spool:
+    """
+    A local checkpoint of the transformed rows of each update, kept until
+    every store has them, so that stores that failed can be retried
+    without fetching or transforming the data again.
+
+    Each batch is a JSON-lines file of rows with a small JSON file next
+    to it that lists the stores still waiting for it, in a directory per
+    dataset under ``<namespace>/spool``. A batch is removed once its
+    last store completes. Rows are written ``batch_rows`` at a time and
+    read back one at a time, so a batch is never held in memory whole.
+    """
+
+    _batch_rows: int
+    _directory: str
+
+    def __init__(self, namespace: str, batch_rows: Optional[int] = None):
+        from .storage import WRITE_BATCH
+
+        self._batch_rows = batch_rows or WRITE_BATCH
+        self._directory = os.path.join(namespace, "spool")
+
+    @property
+    def directory(self) -> str:
+        return self._directory
+
+    def save(
+        self,
+        name: str,
+        rows: Iterable[Row],
+        stores: Iterable[str],
+        fingerprint: Optional[str] = None,
+    ) -> SpoolBatch:
+        """
+        Checkpoint a batch of rows for the dataset with the given name,
+        to be stored in each of the given stores.
+        """
+        from datetime import datetime
+        from itertools import islice
+
+        from .codec import encode_json_rows
+        from .locking import temporary_path
+
+        directory = self._dataset_directory(name)
+        os.makedirs(directory, exist_ok=True)
+        batch = SpoolBatch(
+            dataset=name,
+            batch=f"{time.time_ns():020d}",
+            stores=list(stores),
+            fingerprint=fingerprint,
+            created=datetime.now().isoformat(timespec="seconds"),
+        )
+
+        path = self._rows_path(batch)
+        temporary = temporary_path(path)
+        rows = iter(rows)
+        with open(temporary, "wb") as file:
+            while True:
+                block = list(islice(rows, self._batch_rows))
+                if not block:
+                    break
+                file.write(encode_json_rows(block))
+        os.replace(temporary, path)
+
+        self._save_meta(batch)
+        return batch
+
+    def batches(self, name: Optional[str] = None) -> List[SpoolBatch]:
+        """
+        The batches still waiting for at least one store, oldest first,
+        for the dataset with the given name or, if it's ``None``, for
+        every dataset.
+        """
+        names = [name] if name is not None else self.datasets()
+        found = []
+        for dataset in names:
+            directory = self._dataset_directory(dataset)
+            try:
+                files = sorted(os.listdir(directory))
+            except FileNotFoundError:
+                continue
+            for file_name in files:
+                if not file_name.endswith(".meta.json"):
+                    continue
+                batch = self._load_meta(os.path.join(directory, file_name))
+                if batch is not None:
+                    found.append(batch)
+        return found
+
+    def datasets(self) -> List[str]:
+        """
+        The names of the datasets that have spooled batches.
+        """
+        try:
+            names = os.listdir(self._directory)
+        except FileNotFoundError:
+            return []
+        return sorted(
+            name for name in names if os.path.isdir(os.path.join(self._directory, name))
+        )
+
+    def rows(self, batch: SpoolBatch) -> Iterator[Row]:
+        """
+        Read the rows of a spooled batch.
+        """
+        with open(self._rows_path(batch), "r", encoding="utf-8") as file:
+            for line in file:
+                if line.strip():
+                    yield json.loads(line)
+
+    def complete(self, batch: SpoolBatch, store: str) -> Optional[SpoolBatch]:
+        """
+        Record that the given store has stored a batch. Returns the batch
+        with the stores still waiting for it, or ``None`` if there are
+        none left, in which case the batch is removed from the spool.
+        """
+        from .locking import file_lock
+
+        with file_lock(self._dataset_directory(batch.dataset)):
+            current = self._load_meta(self._meta_path(batch))
+            if current is None:
+                return None
+            remaining = [s for s in current.stores if s != store]
+            if remaining:
+                current = current._replace(stores=remaining)
+                self._save_meta(current)
+                return current
+            self._remove(current)
+            return None
+
+    def _remove(self, batch: SpoolBatch) -> None:
+        for path in [self._meta_path(batch), self._rows_path(batch)]:
+            try:
+                os.remove(path)
+            except FileNotFoundError:
+                pass
+        try:
+            os.rmdir(self._dataset_directory(batch.dataset))
+        except OSError:
+            # Other batches are still waiting
+            pass
+
+    def _save_meta(self, batch: SpoolBatch) -> None:
+        from .locking import temporary_path
+
+        path = self._meta_path(batch)
+        temporary = temporary_path(path)
+        with open(temporary, "w") as file:
+            json.dump(batch._asdict(), file, sort_keys=True)
+            file.write("\n")
+        os.replace(temporary, path)
+
+    @staticmethod
+    def _load_meta(path: str) -> Optional[SpoolBatch]:
+        try:
+            with open(path, "r") as file:
+                return SpoolBatch(**json.load(file))
+        except (FileNotFoundError, TypeError, ValueError):
+            return None
+
+    def _dataset_directory(self, name: str) -> str:
+        return os.path.join(self._directory, name)
+
+    def _meta_path(self, batch: SpoolBatch) -> str:
+        return os.path.join(
+            self._dataset_directory(batch.dataset), f"{batch.batch}.meta.json"
+        )
+
+    def _rows_path(self, batch: SpoolBatch) -> str:
+        return os.path.join(
+            self._dataset_directory(batch.dataset), f"{batch.batch}.lines.json"
+        )
@@ -0,0 +1,220 @@
+import json
+import random
+import threading
+import time
+from copy import deepcopy
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Any, Dict, List, NamedTuple, Optional, Tuple, Type
+from urllib.parse import urlsplit
+
+from .dataset import Dataset
+
+# Numeric values in scaled copies are moved this far from the original.
+COPY_OFFSET = 10**12
+
+
+class StandInOptions(NamedTuple):
+    """
+    How a stand-in server alters the recorded responses it serves.
+
+    Each payload is made ``scale`` times larger by adding copies of its
+    records, each copy is made distinct with ``scale_payload``. Every
+    response is delayed by ``latency`` seconds, and fails (with a 503
+    status) with probability ``failure_rate``. ``seed`` makes the
+    failures repeatable.
+    """
+
+    scale: int = 1
+    latency: float = 0.0
+    failure_rate: float = 0.0
+    seed: Optional[int] = None
+
+
+def _vary(value: Any, copy: int) -> Any:
+    """
+    A value for the given copy of a record that differs from the
+    original, and from every other copy.
+
+    >>> _vary('Missoula', 2), _vary(7, 2), _vary(None, 1)
+    ('Missoula #2', 2000000000007, '#1')
+    """
+    if isinstance(value, bool):
+        return value
+    if isinstance(value, (int, float)):
+        return value + copy * COPY_OFFSET
+    if value is None:
+        return f"#{copy}"
+    return f"{value} #{copy}"
+
+
+def _records(payload: Any) -> Tuple[List[Any], bool]:
+    """
+    Find the list of records in a payload: the payload itself if it's a
+    list, otherwise the first list it holds. The second value is ``True``
+    if each record holds its fields in ``attributes`` (as ArcGIS does).
+
+    >>> _records({'features': [{'attributes': {'a': 1}}]})
+    ([{'attributes': {'a': 1}}], True)
+    """
+    records: List[Any] = []
+    if isinstance(payload, list):
+        records = payload
+    elif isinstance(payload, dict):
+        records = next((v for v in payload.values() if isinstance(v, list)), [])
+    wrapped = bool(records) and all(
+        isinstance(r, dict) and isinstance(r.get("attributes"), dict) for r in records
+    )
+    return records, wrapped
+
+
+def scale_payload(payload: Any, dataset: Dataset, scale: int) -> Any:
+    """
+    Make a decoded payload for the given dataset ``scale`` times larger by
+    adding copies of its records. In each copy the source fields behind
+    the dataset's ``dedup_facets`` (or, if it has none, its
+    ``dedup_fields``) are changed, so that copies look like more sites,
+    counties, or events, rather than duplicates.
+
+    >>> from mtdata.datasets.missoula_911 import Missoula911
+    >>> scaled = scale_payload([{'CFSNumber': 'A1'}], Missoula911(), 3)
+    >>> [record['CFSNumber'] for record in scaled]
+    ['A1', 'A1 #1', 'A1 #2']
+    """
+    if scale <= 1:
+        return payload
+
+    transformer = dataset.transformer
+    names = list(dataset.dedup_facets) or list(dataset.dedup_fields)
+    sources = []
+    for name in names:
+        try:
+            sources.append(transformer.source_name(name))
+        except KeyError:
+            continue
+
+    payload = deepcopy(payload)
+    records, wrapped = _records(payload)
+    originals = list(records)
+    for copy in range(1, scale):
+        for original in originals:
+            record = deepcopy(original)
+            fields = record["attributes"] if wrapped else record
+            for source in sources:
+                if source in fields:
+                    fields[source] = _vary(fields[source], copy)
+            records.append(record)
+    return payload
+
+
+class StandIn:
+    """
+    Serves the responses recorded in a directory (see
+    :func:`mtdata.source.save_recording`) in place of the real sources,
+    altered according to the given options. Scaled payloads are built
+    the first time they are requested and kept in memory.
+    """
+
+    _directory: str
+    _options: StandInOptions
+    _random: random.Random
+    _lock: threading.Lock
+    _payloads: Dict[str, bytes]
+
+    def __init__(self, directory: str, options: StandInOptions = StandInOptions()):
+        self._directory = directory
+        self._options = options
+        self._random = random.Random(options.seed)
+        self._lock = threading.Lock()
+        self._payloads = {}
+
+    def payload(self, name: str) -> Optional[bytes]:
+        """
+        The (scaled) payload for the dataset with the given name, or
+        ``None`` if nothing was recorded for it.
+        """
+        from .manifest import get_dataset
+        from .source import load_recording
+
+        with self._lock:
+            if name in self._payloads:
+                return self._payloads[name]
+
+        body = load_recording(self._directory, name)
+        if body is None:
+            return None
+        dataset_class = get_dataset(name)
+        if self._options.scale > 1 and dataset_class is not None:
+            scaled = scale_payload(
+                json.loads(body), dataset_class(), self._options.scale
+            )
+            body = json.dumps(scaled).encode()
+
+        with self._lock:
+            self._payloads[name] = body
+        return body
+
+    def should_fail(self) -> bool:
+        """
+        Decide whether the next response should fail.
+        """
+        with self._lock:
+            return self._random.random() < self._options.failure_rate
+
+    @property
+    def latency(self) -> float:
+        return self._options.latency
+
+
+def _handler(standin: StandIn) -> Type[BaseHTTPRequestHandler]:
+    class Handler(BaseHTTPRequestHandler):
+        protocol_version = "HTTP/1.1"
+
+        def do_GET(self) -> None:
+            if standin.latency > 0:
+                time.sleep(standin.latency)
+
+            parts = [part for part in urlsplit(self.path).path.split("/") if part]
+            if len(parts) != 2 or parts[0] != "sources":
+                self._send(404, {"error": f"not found: {self.path}"})
+                return
+            if standin.should_fail():
+                self._send(503, {"error": "injected failure"})
+                return
+
+            body = standin.payload(parts[1])
+            if body is None:
+                self._send(404, {"error": f"nothing recorded for {parts[1]}"})
+                return
+            self._send_body(200, body)
+
+        def _send(self, status: int, message: Dict[str, str]) -> None:
+            self._send_body(status, json.dumps(message).encode())
+
+        def _send_body(self, status: int, body: bytes) -> None:
+            self.send_response(status)
+            self.send_header("Content-Type", "application/json")
+            self.send_header("Content-Length", str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+
+        def log_message(self, format: str, *args: Any) -> None:
+            # Load tests make a lot of requests
+            pass
+
+    return Handler
+
+
+def make_standin_server(
+    directory: str,
+    host: str = "127.0.0.1",
+    port: int = 8001,
+    options: StandInOptions = StandInOptions(),
+) -> ThreadingHTTPServer:
+    """
+    Create (but don't start) a stand-in source server for the responses
+    recorded in the given directory. Each dataset is served at
+    ``/sources/<name>``, which is where datasets fetch from when the
+    ``MTDATA_REPLAY`` environment variable holds the server's URL (see
+    :func:`mtdata.source.http_get`).
+    """
+    return ThreadingHTTPServer((host, port), _handler(StandIn(directory, options)))
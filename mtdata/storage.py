@@ -1,8 +1,71 @@
+import json
+import os
 from abc import ABC, abstractmethod
-from typing import Iterable, List, Optional, NamedTuple
-
-from .backward import read_backward
+from datetime import datetime
+from contextlib import nullcontext
+from functools import lru_cache, wraps
+from itertools import chain
+from typing import (
+    Any,
+    BinaryIO,
+    Callable,
+    ContextManager,
+    Dict,
+    Iterable,
+    Iterator,
+    List,
+    Optional,
+    NamedTuple,
+    Sequence,
+    Tuple,
+    TypeVar,
+    Union,
+    cast,
+)
+
+from .backward import read_backward, read_records_backward
+from .catalog import CatalogEntry, load_entry, save_entry
+from .codec import encode_csv_header, encode_csv_rows, encode_json_rows
+from .chunked import (
+    RANGES_PER_WORKER,
+    bisect_lines,
+    load_ranges,
+    parse_csv_range,
+    parse_json_range,
+    read_records,
+    split_ranges,
+)
 from .dataset import Row
+from .delta import KEYFRAME_INTERVAL, DeltaCodec
+from .locking import file_lock, temporary_path
+from .membership import MembershipFilter, membership_key
+from .projection import Fields, decode_json_line, extract_json_fields, record_builder
+from .schema import FieldTypes, time_filter, typed_rows
+from .spatial import (
+    GRID_SIZE,
+    BoundingBox,
+    GridIndex,
+    bounding_box,
+    coordinates,
+    distance_km,
+    within,
+)
+
+TimeParser = Callable[[Any], datetime]
+
+# Called with the name of a store, the name of a dataset, and the rows
+# that were appended to it.
+AppendListener = Callable[[str, str, Sequence[Row]], None]
+
+# Rows are written this many at a time, so that replacing a dataset
+# doesn't require holding all of it in memory.
+WRITE_BATCH = 10_000
+
+# Stores that split data into chunk files start a new chunk once the
+# newest one would grow beyond this size.
+CHUNK_FILE_BYTES = 1 << 20
+
+WriteMethod = TypeVar("WriteMethod", bound=Callable[..., "StoreResult"])
 
 
 class StoreResult(NamedTuple):
@@ -14,6 +77,63 @@ class StoreResult(NamedTuple):
 
     success: bool
     message: str
+    lock_wait: float = 0.0
+
+
+class StoreOptions(NamedTuple):
+    """
+    Optional behavior that a store may support, beyond reading and
+    writing rows.
+
+    If ``spatial_fields`` (the latitude and longitude fields, in that
+    order) is given, stores that support it maintain a grid index, with
+    cells ``grid_size`` degrees on a side, to speed up ``load_within``
+    and ``load_near``.
+
+    The ``time_field`` (with ``parse_time`` to compare its values) and
+    the ``facet_fields`` are summarized in the store's catalog entry for
+    each dataset, see ``update_catalog``.
+
+    If ``membership_fields`` is given, stores that support it keep a
+    membership filter over the values of those fields in every stored
+    row, and de-duplicate data that have those ``dedup_fields`` (and no
+    ``dedup_facets``) against the full history, see ``dedup_history``.
+
+    Rows are de-duplicated, written, and passed to listeners
+    ``batch_rows`` at a time, so that is about the most rows a store
+    holds in memory while it writes, however many rows it is given.
+
+    The ``field_types`` are the declared types of the dataset's fields
+    (see :mod:`mtdata.schema`). Stores that can't keep those types apply
+    them to the rows they read, so rows come back as they were written,
+    and stored rows are compared to new ones with their types applied.
+    """
+
+    spatial_fields: Optional[Tuple[str, str]] = None
+    grid_size: float = GRID_SIZE
+    time_field: Optional[str] = None
+    parse_time: Optional[TimeParser] = None
+    facet_fields: Tuple[str, ...] = ()
+    membership_fields: Tuple[str, ...] = ()
+    batch_rows: int = WRITE_BATCH
+    field_types: Optional[FieldTypes] = None
+
+
+def locked(method: WriteMethod) -> WriteMethod:
+    """
+    Decorate the ``append`` or ``replace`` method of a store so that it
+    holds the store's lock (see ``Storage.lock``) for the dataset while
+    it runs, and reports the time spent waiting for the lock in the
+    ``lock_wait`` of its result.
+    """
+
+    @wraps(method)
+    def write(self: "Storage", name: str, *args: Any, **kwargs: Any) -> StoreResult:
+        with self.lock(name) as wait:
+            result = method(self, name, *args, **kwargs)
+        return result._replace(lock_wait=wait)
+
+    return cast(WriteMethod, write)
 
 
 class Storage(ABC):
@@ -23,9 +143,13 @@ class Storage(ABC):
     """
 
     _namespace: str
+    _options: StoreOptions
+    _listeners: List[AppendListener]
 
-    def __init__(self, namespace: str):
+    def __init__(self, namespace: str, options: StoreOptions = StoreOptions()):
         self._namespace = namespace
+        self._options = options
+        self._listeners = []
 
     @staticmethod
     @abstractmethod
@@ -47,6 +171,13 @@ class Storage(ABC):
         """
         return self._namespace
 
+    @property
+    def options(self) -> StoreOptions:
+        """
+        The optional behavior requested for this store.
+        """
+        return self._options
+
     @abstractmethod
     def append(
         self,
@@ -70,7 +201,13 @@ class Storage(ABC):
         """
 
     @abstractmethod
-    def load(self, name: str) -> Iterable[Row]:
+    def load(
+        self,
+        name: str,
+        workers: int = 1,
+        ordered: bool = True,
+        fields: Fields = None,
+    ) -> Iterable[Row]:
         """
         Read in all data and return it as an iterable of rows. The
         implementation may choose to read all rows into memory or
@@ -79,7 +216,418 @@ class Storage(ABC):
         The ``name`` is the identifier associated with the dataset being
         stored and should be used to construct any files or tables
         required by the storage implementation.
+
+        If ``workers`` is greater than one, the implementation may parse
+        the data in that many worker processes. In that case, if
+        ``ordered`` is ``False``, rows may be returned in any order.
+        Implementations that can't load in parallel ignore both
+        parameters.
+
+        If ``fields`` is not ``None``, each row only needs to contain
+        those fields. Implementations should avoid decoding the rest of
+        the row where they can.
+        """
+
+    def load_backward(self, name: str, fields: Fields = None) -> Iterable[Row]:
+        """
+        Load data from the store in reverse order. In other words, the
+        first row returned is the row that was most recently added to
+        the store, and so on. The ``fields`` parameter works the same as
+        it does for ``load``.
+
+        The default implementation reads everything into memory, stores
+        that can do better should override it.
+        """
+        return reversed(list(self.load(name, fields=fields)))
+
+    def load_range(
+        self,
+        name: str,
+        time_field: str,
+        parse_time: TimeParser,
+        since: Optional[datetime] = None,
+        until: Optional[datetime] = None,
+        fields: Fields = None,
+    ) -> Iterable[Row]:
+        """
+        Load the rows whose ``time_field``, once converted with
+        ``parse_time``, falls between ``since`` and ``until`` (inclusive).
+        Either bound may be ``None``. The ``fields`` parameter works the
+        same as it does for ``load``, the time field is always included.
+
+        The default implementation filters the result of ``load``. Stores
+        that keep rows in chronological order can skip the rows that are
+        too old without reading them.
+        """
+        columns = None if fields is None else _with_field(fields, time_field)
+        within = time_filter(parse_time, since, until)
+        for row in self.load(name, fields=columns):
+            if within(row.get(time_field)):
+                yield row
+
+    def latest_by_facets(
+        self,
+        name: str,
+        dedup_facets: Iterable[str],
+        fields: Fields = None,
+    ) -> Dict[Tuple[Any, ...], Row]:
+        """
+        Find the most recently stored row for each distinct combination
+        of values of the given facets. The keys of the returned dictionary
+        are tuples of facet values, in the order the facets were given.
+        If ``fields`` is given, the rows only need to contain those fields
+        (the facets are always included). The ``field_types`` from the
+        store's options are applied, as they are for ``dedup_batches``,
+        so rows stored before their fields were typed compare equal to
+        new rows.
+        """
+        facets = list(dedup_facets)
+        if fields is not None:
+            fields = facets + [f for f in fields if f not in facets]
+
+        latest: Dict[Tuple[Any, ...], Row] = {}
+        rows = typed_rows(
+            self.load_backward(name, fields=fields), self._options.field_types
+        )
+        for row in rows:
+            latest.setdefault(tuple(row[facet] for facet in facets), row)
+        return latest
+
+    def load_within(
+        self, name: str, box: BoundingBox, fields: Fields = None
+    ) -> Iterable[Row]:
+        """
+        Load the rows whose coordinates lie within the given box. The
+        store must have been given ``spatial_fields`` in its options, and
+        those fields are always included in the rows returned. The
+        ``fields`` parameter otherwise works the same as it does for
+        ``load``.
+
+        If the store keeps a spatial index (see ``spatial_index``), only
+        rows in the grid cells that overlap the box are read, otherwise
+        every row is checked. The index is only read, never written, so
+        rows stored without it (or an index left over from other data)
+        are checked one by one until the next write brings it up to date.
+        """
+        spatial_fields = self._spatial_fields()
+        columns = None if fields is None else list(fields)
+        if columns is not None:
+            for field in spatial_fields:
+                columns = _with_field(columns, field)
+
+        index = self.spatial_index(name)
+        if index is None:
+            yield from within(self.load(name, fields=columns), spatial_fields, box)
+            return
+
+        # The index and the data are read together, under the lock, so a
+        # write can't change one without the other in between
+        with self.lock(name):
+            cells, covered = index.read()
+            if covered > self.data_length(name):
+                cells, covered = {}, 0
+            offsets = index.candidates(cells, box)
+            rows = list(
+                within(self.load_at(name, offsets, columns), spatial_fields, box)
+            )
+            unindexed = (row for _, row in self.load_offsets(name, covered, columns))
+            rows.extend(within(unindexed, spatial_fields, box))
+        yield from rows
+
+    def load_near(
+        self,
+        name: str,
+        latitude: float,
+        longitude: float,
+        radius_km: float,
+        fields: Fields = None,
+    ) -> Iterable[Row]:
+        """
+        Load the rows whose coordinates lie within ``radius_km``
+        kilometers of the given point. See ``load_within``.
+        """
+        spatial_fields = self._spatial_fields()
+        box = bounding_box(latitude, longitude, radius_km)
+        for row in self.load_within(name, box, fields):
+            point = coordinates(row, spatial_fields)
+            if point is not None and distance_km(latitude, longitude, *point) <= (
+                radius_km
+            ):
+                yield row
+
+    def spatial_index(self, name: str) -> Optional[GridIndex]:
+        """
+        The spatial index for the given name, or ``None`` if the store
+        doesn't keep one (or wasn't asked to). Stores that return an index
+        must also implement ``load_offsets`` and ``load_at``.
+        """
+        return None
+
+    def update_spatial_index(self, name: str) -> None:
+        """
+        Bring the spatial index for the given name, if there is one, up to
+        date by indexing the rows added since it was last updated. Stores
+        call this after they write, it only needs to be called directly
+        to index data that were written without it.
+        """
+        index = self.spatial_index(name)
+        if index is None:
+            return
+
+        with self.lock(name):
+            length = self.data_length(name)
+            covered = index.covered()
+            if covered is None or covered > length:
+                index.reset()
+                covered = 0
+            if covered == length:
+                return
+
+            spatial_fields = self._spatial_fields()
+            rows = self.load_offsets(name, covered, fields=spatial_fields)
+            index.extend(rows, spatial_fields, length)
+
+    def load_offsets(
+        self, name: str, start: int = 0, fields: Fields = None
+    ) -> Iterable[Tuple[int, Row]]:
+        """
+        Load the rows that begin at or after the byte offset ``start``,
+        each paired with its offset. Only needed by stores that keep a
+        spatial index.
+        """
+        raise NotImplementedError(f"{self.name()} doesn't support row offsets")
+
+    def load_at(
+        self, name: str, offsets: Iterable[int], fields: Fields = None
+    ) -> Iterable[Row]:
+        """
+        Load the rows that begin at the given byte offsets, in the order
+        given. Only needed by stores that keep a spatial index.
+        """
+        raise NotImplementedError(f"{self.name()} doesn't support row offsets")
+
+    def data_length(self, name: str) -> int:
+        """
+        The length, in bytes, of the stored data for the given name. Only
+        needed by stores that keep a spatial index.
+        """
+        raise NotImplementedError(f"{self.name()} doesn't support row offsets")
+
+    def membership_filter(self, name: str) -> Optional[MembershipFilter]:
+        """
+        The membership filter for the given name, or ``None`` if the store
+        doesn't keep one (or wasn't asked to). Stores that return a filter
+        must also implement ``load_offsets`` and ``data_length``.
+        """
+        return None
+
+    def update_membership_filter(self, name: str) -> Optional[MembershipFilter]:
+        """
+        Bring the membership filter for the given name, if there is one, up
+        to date by adding the keys of the rows stored since it was last
+        updated, and return it. Stores call this after they write.
+        """
+        membership = self.membership_filter(name)
+        if membership is None:
+            return None
+
+        length = self.data_length(name)
+        covered = membership.covered()
+        if covered is None or covered > length:
+            membership.reset()
+            covered = 0
+        if covered == length:
+            return membership
+
+        fields = list(self._options.membership_fields)
+        for _, row in self.load_offsets(name, covered, fields=fields):
+            membership.add(membership_key(row, fields))
+        membership.save(length)
+        return membership
+
+    def _spatial_fields(self) -> Tuple[str, str]:
+        spatial_fields = self._options.spatial_fields
+        if spatial_fields is None:
+            raise ValueError(f"{self.name()} store has no spatial fields")
+        return spatial_fields
+
+    def subscribe(self, listener: AppendListener) -> None:
+        """
+        Register a function to be called after each successful append
+        with the name of the store, the name of the dataset, and the rows
+        that were actually written (after de-duplication), see
+        :class:`mtdata.journal.Journal`.
+        """
+        self._listeners.append(listener)
+
+    def notify_append(self, name: str, rows: Sequence[Row]) -> None:
+        """
+        Pass rows that were appended to the store to the subscribed
+        listeners. Implementations call this at the end of ``append``.
+        """
+        if not rows:
+            return
+        for listener in self._listeners:
+            listener(self.name(), name, rows)
+
+    def update_catalog(
+        self, name: str, rows: Iterable[Row], replaced: bool = False
+    ) -> CatalogEntry:
+        """
+        Update the catalog entry for the given name to account for rows
+        that were just written, see :class:`mtdata.catalog.CatalogEntry`.
+        If ``replaced`` is ``True`` the rows are all the store now holds.
+        Implementations call this at the end of ``append`` and
+        ``replace``.
+
+        If there is no entry yet for data that were stored earlier, every
+        row is read once to create it.
+        """
+        entry = load_entry(self.namespace, name, self.name())
+        if entry is None or replaced:
+            if entry is None and not replaced:
+                rows = self.load(name)
+            entry = CatalogEntry(name, self.name())
+
+        return self.save_catalog(self.add_to_catalog(entry, rows))
+
+    def add_to_catalog(self, entry: CatalogEntry, rows: Iterable[Row]) -> CatalogEntry:
+        """
+        Account for the given rows in a catalog entry, using the time and
+        facet fields given in the store's options.
+        """
+        options = self._options
+        return entry.add(
+            rows,
+            options.time_field,
+            options.parse_time or datetime.fromisoformat,
+            options.facet_fields,
+        )
+
+    def save_catalog(self, entry: CatalogEntry) -> CatalogEntry:
+        """
+        Save a catalog entry for this store, recording the current size of
+        the data.
+        """
+        try:
+            entry = entry._replace(bytes=self.data_length(entry.dataset))
+        except NotImplementedError:
+            pass
+
+        save_entry(self.namespace, entry)
+        return entry
+
+    def raw_path(self, name: str) -> Optional[str]:
         """
+        The path of the single file that holds all of the data for the
+        given name, if the store keeps data that way, otherwise ``None``.
+        Stores that return a path support ``copy_from``.
+        """
+        return None
+
+    @locked
+    def copy_from(self, name: str, source: "Storage") -> StoreResult:
+        """
+        Replace the data for the given name with a byte-for-byte copy of
+        the data held by another store of the same kind (generally in a
+        different namespace), without decoding any rows. Raises
+        ``ValueError`` if the stores can't be copied between, use
+        ``replace`` with the rows loaded from the source instead.
+        """
+        import shutil
+
+        path = self.raw_path(name)
+        source_path = source.raw_path(name)
+        if type(source) is not type(self) or path is None or source_path is None:
+            raise ValueError(f"can't copy {source.name()} data to {self.name()}")
+        if os.path.abspath(path) == os.path.abspath(source_path):
+            raise ValueError(f"can't copy {source_path} to itself")
+
+        temporary = temporary_path(path)
+        with source.lock(name):
+            try:
+                shutil.copyfile(source_path, temporary)
+            except FileNotFoundError:
+                return StoreResult(success=False, message=f"no data for {name}")
+            catalog = load_entry(source.namespace, name, source.name())
+        os.replace(temporary, path)
+
+        if catalog is None:
+            catalog = self.add_to_catalog(
+                CatalogEntry(name, self.name()), self.load(name)
+            )
+        self.finish_replace(name, catalog)
+        return StoreResult(success=True, message="")
+
+    def finish_replace(self, name: str, catalog: CatalogEntry) -> None:
+        """
+        A helper for implementations of ``replace`` that rebuilds the
+        spatial index and membership filter, if there are any, and saves
+        the catalog entry for the new data once they are in place.
+        """
+        index = self.spatial_index(name)
+        if index is not None:
+            index.reset()
+            self.update_spatial_index(name)
+        membership = self.membership_filter(name)
+        if membership is not None:
+            membership.reset()
+            membership.save(0)
+            self.update_membership_filter(name)
+        self.save_catalog(catalog)
+
+    def replace_new(self, name: str, data: Iterable[Row]) -> StoreResult:
+        """
+        A helper for implementations of ``append`` that store the rows
+        with ``replace`` when there are no data yet, and still notify the
+        subscribed listeners.
+        """
+        result = self.replace(name, data)
+        if result.success and self._listeners:
+            # Read back in batches, rather than kept in memory
+            for batch in _batches(self.load(name), self._options.batch_rows):
+                self.notify_append(name, batch)
+        return result
+
+    def append_batches(
+        self,
+        name: str,
+        batches: Iterable[List[Row]],
+        write: Callable[[List[Row]], Optional[str]],
+    ) -> Optional[str]:
+        """
+        A helper for implementations of ``append`` that passes each batch
+        of (de-duplicated) rows to ``write``, then accounts for it in the
+        catalog and passes it to the subscribed listeners, so only one
+        batch is held in memory at a time. The spatial index, membership
+        filter, and catalog entry are brought up to date at the end.
+
+        ``write`` must have stored its batch when it returns, since the
+        next batch may be de-duplicated against it (see ``dedup_batches``).
+        It returns the reason it couldn't store the batch, if it couldn't,
+        in which case the rows written so far are kept and the reason is
+        returned.
+        """
+        entry = load_entry(self.namespace, name, self.name())
+        failure = None
+        for batch in batches:
+            failure = write(batch)
+            if failure is not None:
+                break
+            if entry is not None:
+                entry = self.add_to_catalog(entry, batch)
+            self.notify_append(name, batch)
+
+        self.update_spatial_index(name)
+        self.update_membership_filter(name)
+        if entry is None:
+            # Data stored before there was a catalog, every row is read
+            # once to create the entry
+            entry = self.add_to_catalog(
+                CatalogEntry(name, self.name()), self.load(name)
+            )
+        self.save_catalog(entry)
+        return failure
 
     @abstractmethod
     def replace(self, name: str, data: Iterable[Row]) -> StoreResult:
@@ -98,7 +646,7 @@ class Storage(ABC):
         new_data: Iterable[Row],
         dedup_facets: Iterable[str] = (),
         dedup_fields: Iterable[str] = (),
-    ) -> Iterable[Row]:
+    ) -> Iterator[Row]:
         """
         A helper function to de-duplicate data based on the given facets
         and fields. This algorithm won't work for every possible case,
@@ -131,45 +679,58 @@ class Storage(ABC):
         ...   reversed([{'a': 1}, {'a': 2}]),
         ...   [{'a': 2}, {'a': 3}], [], ['a']))
         [{'a': 3}]
+        >>> list(Storage.dedup(
+        ...   reversed([{'f': 1, 'a': 1}, {'f': 2, 'a': 1}]),
+        ...   [{'f': 1, 'a': 1}, {'f': 2, 'a': 1}, {'f': 1, 'a': 2}],
+        ...   ['f'], ['a']))
+        [{'f': 1, 'a': 2}]
+
+        Rows are passed along as they are checked, except without
+        ``dedup_facets``, where every new row has to be seen first.
         """
         facets = set(dedup_facets)
         fields = set(dedup_fields)
 
-        deduped_data: List[Row] = []
-
         if facets:
+            # The existing data may be a one-shot iterator, so we only walk
+            # it once, remembering the most recent row for each facet
+            # combination we pass along the way.
+            facet_list = list(facets)
+            existing_rows = iter(existing_data)
+            latest: Dict[Tuple[Any, ...], Row] = {}
             for row in new_data:
-                matched_row: Optional[Row] = None
-                for existing_row in existing_data:
-                    matches = True
-                    for facet in facets:
-                        if row[facet] != existing_row[facet]:
-                            matches = False
-                            break
-
-                    if matches:
-                        matched_row = existing_row
+                key = tuple(row[facet] for facet in facet_list)
+                matched_row: Optional[Row] = latest.get(key)
+                while matched_row is None:
+                    existing_row = next(existing_rows, None)
+                    if existing_row is None:
                         break
+                    existing_key = tuple(existing_row[facet] for facet in facet_list)
+                    latest.setdefault(existing_key, existing_row)
+                    if existing_key == key:
+                        matched_row = existing_row
 
-                if matched_row:
+                if matched_row is not None:
                     equal = True
                     for field in fields:
                         if row[field] != matched_row[field]:
                             equal = False
                             break
                     if not equal:
-                        deduped_data.append(row)
+                        yield row
                 else:
-                    deduped_data.append(row)
+                    yield row
         else:
             if dedup_fields:
                 # This is complicated-ish. We assume that `data` are in
                 # chronological order, and therefore if some element, `i`,
                 # in `data` matches the last row we've got stored, then
                 # every element in the range `[0, i]` is already stored,
-                # and every element in the range `(i, N)` is "new".
+                # and every element in the range `(i, N)` is "new". Nothing
+                # can be passed along until every new row has been seen.
                 last_row = next(iter(existing_data))
 
+                deduped_data: List[Row] = []
                 for row in new_data:
                     equal = True
                     for field in fields:
@@ -179,11 +740,157 @@ class Storage(ABC):
                         deduped_data.clear()
                     else:
                         deduped_data.append(row)
+                yield from deduped_data
             else:
-                for row in new_data:
-                    deduped_data.append(row)
+                yield from new_data
+
+    def dedup_batches(
+        self,
+        name: str,
+        data: Iterable[Row],
+        dedup_facets: Iterable[str],
+        dedup_fields: Iterable[str],
+    ) -> Iterator[List[Row]]:
+        """
+        A helper for implementations of ``append`` that de-duplicates new
+        rows against the stored data, in batches of at most ``batch_rows``
+        rows, see ``append_batches``. Each batch must be stored before the
+        next one is requested. Data with ``dedup_fields`` but no
+        ``dedup_facets`` are checked against every stored row with
+        ``dedup_history`` if the store keeps a membership filter over
+        those fields, otherwise ``dedup`` is used.
+        """
+        facets = list(dedup_facets)
+        fields = list(dedup_fields)
+        if (
+            not facets
+            and fields
+            and tuple(fields) == self._options.membership_fields
+            and self.membership_filter(name) is not None
+        ):
+            return self.dedup_history(name, data)
+
+        # The backward read starts from the end of the data as they were
+        # before the first batch was written, which is all dedup compares.
+        # Rows stored before their fields were typed are compared as if
+        # they had been.
+        existing_data = typed_rows(
+            self.load_backward(name, fields=self.dedup_columns(facets, fields)),
+            self._options.field_types,
+        )
+        return _batches(
+            self.dedup(existing_data, data, facets, fields), self._options.batch_rows
+        )
+
+    def dedup_history(self, name: str, data: Iterable[Row]) -> Iterator[List[Row]]:
+        """
+        De-duplicate new rows against every row stored for the given name,
+        comparing the ``membership_fields`` from the store's options, in
+        batches of at most ``batch_rows`` rows. Unlike ``dedup`` without
+        facets, which only compares against the most recent row, this
+        drops old rows that show up again out of order. Rows repeated
+        within the new data are dropped as well, which is why each batch
+        must be stored before the next one is requested.
+
+        The membership filter answers for most rows without reading the
+        data, and the keys it reports are confirmed against the filter's
+        own record of the stored keys (see ``MembershipFilter.stored``),
+        so false positives don't cost a read of the data either.
+        """
+        membership = self.update_membership_filter(name)
+        if membership is None:
+            raise ValueError(f"{self.name()} store has no membership filter")
+
+        fields = list(self._options.membership_fields)
+        for rows in _batches(data, self._options.batch_rows):
+            candidates: List[Tuple[str, Row]] = []
+            seen = set()
+            possible = set()
+            for row in rows:
+                key = membership_key(row, fields)
+                if key in seen:
+                    continue
+                seen.add(key)
+                if key in membership:
+                    possible.add(key)
+                candidates.append((key, row))
+
+            stored = membership.stored(possible) if possible else set()
+
+            batch = [row for key, row in candidates if key not in stored]
+            if batch:
+                yield batch
+                # The batch has been stored by now, so repeats of its rows
+                # in later batches are reported, and confirmed, by the
+                # filter (in memory only, the store saves the filter itself)
+                for key, _ in candidates:
+                    if key not in stored:
+                        membership.add(key)
+
+    @staticmethod
+    def drop_repeats(
+        rows: Iterable[Row],
+        dedup_facets: Iterable[str],
+        dedup_fields: Iterable[str],
+    ) -> List[Row]:
+        """
+        Drop rows that repeat the facets and fields of an earlier row
+        among the given rows. ``dedup`` only compares new rows to stored
+        ones, so this is for rows gathered from several fetches (or
+        appends) before they are appended together.
+
+        >>> Storage.drop_repeats(
+        ...   [{'f': 1, 'a': 1}, {'f': 2, 'a': 1}, {'f': 1, 'a': 1}], ['f'], ['a'])
+        [{'f': 1, 'a': 1}, {'f': 2, 'a': 1}]
+        """
+        columns = Storage.dedup_columns(dedup_facets, dedup_fields)
+        if not columns:
+            return list(rows)
+
+        kept = []
+        seen = set()
+        for row in rows:
+            key = tuple(str(row.get(column)) for column in columns)
+            if key not in seen:
+                seen.add(key)
+                kept.append(row)
+        return kept
 
-        return deduped_data
+    @staticmethod
+    def dedup_columns(
+        dedup_facets: Iterable[str], dedup_fields: Iterable[str]
+    ) -> List[str]:
+        """
+        The fields of existing rows that ``dedup`` actually looks at, so
+        that stores only need to load those.
+
+        >>> Storage.dedup_columns(['a'], ['b', 'a'])
+        ['a', 'b']
+        """
+        columns: List[str] = []
+        for column in list(dedup_facets) + list(dedup_fields):
+            if column not in columns:
+                columns.append(column)
+        return columns
+
+    def lock(self, name: str) -> ContextManager[float]:
+        """
+        A context manager that gives the caller exclusive write access to
+        the data for the given name, across processes, for the duration
+        of a ``with`` block. Its value is the number of seconds spent
+        waiting. Stores lock around ``append`` and ``replace`` (see
+        ``locked``), the default implementation doesn't lock at all.
+        """
+        return nullcontext(0.0)
+
+    def version(self, name: str) -> Optional[str]:
+        """
+        A token that changes whenever the stored data for the given name
+        change, or ``None`` if the store can't provide one (or there are
+        no data). Used to decide whether results computed from the data
+        earlier can be reused.
+        """
+        return None
 
     def get_path(self, name: str, extension: str) -> str:
         """
@@ -195,6 +902,63 @@ class Storage(ABC):
 
         return path.join(self.namespace, f"{name}.{extension}")
 
+    def file_spatial_index(self, path: str) -> Optional[GridIndex]:
+        """
+        A helper for implementations that use the filesystem. Returns a
+        spatial index kept next to the data file at the given path, if
+        the store was given ``spatial_fields``.
+        """
+        if self._options.spatial_fields is None:
+            return None
+        return GridIndex(f"{path}.grid", self._options.grid_size)
+
+    def file_membership_filter(self, path: str) -> Optional[MembershipFilter]:
+        """
+        A helper for implementations that use the filesystem. Returns a
+        membership filter kept next to the data file at the given path, if
+        the store was given ``membership_fields``.
+        """
+        if not self._options.membership_fields:
+            return None
+        return MembershipFilter(f"{path}.bloom")
+
+    @staticmethod
+    def file_version(path: str) -> Optional[str]:
+        """
+        A helper for implementations that use the filesystem. Returns a
+        version token, see ``version``, based on the size and modification
+        time of the file at the given path.
+        """
+        from os import stat
+
+        try:
+            info = stat(path)
+        except FileNotFoundError:
+            return None
+        return f"{info.st_size}-{info.st_mtime_ns}"
+
+
+def _batches(rows: Iterable[Row], size: int) -> Iterator[List[Row]]:
+    """
+    >>> list(_batches([{'a': 1}, {'a': 2}, {'a': 3}], 2))
+    [[{'a': 1}, {'a': 2}], [{'a': 3}]]
+    """
+    batch: List[Row] = []
+    for row in rows:
+        batch.append(row)
+        if len(batch) >= size:
+            yield batch
+            batch = []
+    if batch:
+        yield batch
+
+
+def _with_field(fields: Iterable[str], field: str) -> List[str]:
+    columns = list(fields)
+    if field not in columns:
+        columns.append(field)
+    return columns
+
 
 class JsonLines(Storage):
     """
@@ -212,6 +976,7 @@ class JsonLines(Storage):
     def name() -> str:
         return "json-lines"
 
+    @locked
     def append(
         self,
         name: str,
@@ -219,76 +984,165 @@ class JsonLines(Storage):
         dedup_facets: Iterable[str],
         dedup_fields: Iterable[str],
     ) -> StoreResult:
-
-        for _ in self.load(name):
-            break
-        else:
+        path = self.name_to_path(name)
+        if self.data_length(name) == 0:
             # There are no data (yet) so we can just
             # append all rows in data and return
-            return self.replace(name, data)
-
-        existing_data = self.load_backward(name)
-        deduped_data = self.dedup(
-            existing_data,
-            data,
-            dedup_facets,
-            dedup_fields,
-        )
+            return self.replace_new(name, data)
 
-        with open(self.name_to_path(name), "a") as file:
-            import json
+        def write(batch: List[Row]) -> None:
+            with open(path, "ab") as file:
+                file.write(encode_json_rows(batch))
 
-            for row in deduped_data:
-                json.dump(row, file, sort_keys=True)
-                file.write("\n")
+        batches = self.dedup_batches(name, data, dedup_facets, dedup_fields)
+        self.append_batches(name, batches, write)
 
         return StoreResult(
             success=True,
             message="",
         )
 
-    def load(self, name: str) -> Iterable[Row]:
-        try:
-            with open(self.name_to_path(name), "r") as file:
-                import json
+    def load(
+        self,
+        name: str,
+        workers: int = 1,
+        ordered: bool = True,
+        fields: Fields = None,
+    ) -> Iterable[Row]:
+        if workers > 1:
+            path = self.name_to_path(name)
+            try:
+                ranges = split_ranges(path, workers * RANGES_PER_WORKER)
+            except FileNotFoundError:
+                return
+            yield from load_ranges(
+                parse_json_range, path, ranges, workers, ordered, args=(fields,)
+            )
+            return
 
+        try:
+            with open(self.name_to_path(name), "r", encoding="utf-8") as file:
                 for line in file:
-                    yield json.loads(line)
+                    yield decode_json_line(line, fields)
         except FileNotFoundError:
             # TODO: Handle file not found better
             pass
 
-    def load_backward(self, name: str) -> Iterable[Row]:
+    def load_backward(self, name: str, fields: Fields = None) -> Iterable[Row]:
         """
         Load data from the store in reverse order. In other words, the
         first row returned is the row that was most recently added to
         the store, and so on.
-
-        TODO: Consider making this abstract on the base class
         """
         try:
             with open(self.name_to_path(name), "rb") as file:
-                import json
-
                 for line in read_backward(file):
-                    yield json.loads(line)
+                    yield decode_json_line(line, fields)
         except FileNotFoundError:
             # TODO: Handle file not found better
             pass
 
+    def load_range(
+        self,
+        name: str,
+        time_field: str,
+        parse_time: TimeParser,
+        since: Optional[datetime] = None,
+        until: Optional[datetime] = None,
+        fields: Fields = None,
+    ) -> Iterable[Row]:
+        """
+        Since rows are stored in chronological order, the first row at or
+        after ``since`` is found with a binary search over the file, then
+        rows are streamed from there.
+        """
+        columns = None if fields is None else _with_field(fields, time_field)
+
+        def key(line: bytes) -> datetime:
+            value = extract_json_fields(line.decode(), [time_field]).get(time_field)
+            if value is None:
+                return datetime.min
+            return parse_time(value)
+
+        try:
+            with open(self.name_to_path(name), "rb") as file:
+                offset = 0
+                if since is not None:
+                    offset = bisect_lines(file, key, since)
+
+                file.seek(offset)
+                within = time_filter(parse_time, since, until)
+                for line in file:
+                    row = decode_json_line(line.decode(), columns)
+                    if within(row.get(time_field)):
+                        yield row
+        except FileNotFoundError:
+            pass
+
+    def load_offsets(
+        self, name: str, start: int = 0, fields: Fields = None
+    ) -> Iterable[Tuple[int, Row]]:
+        try:
+            with open(self.name_to_path(name), "rb") as file:
+                file.seek(start)
+                offset = start
+                for line in file:
+                    if line.strip():
+                        yield offset, decode_json_line(line.decode(), fields)
+                    offset += len(line)
+        except FileNotFoundError:
+            pass
+
+    def load_at(
+        self, name: str, offsets: Iterable[int], fields: Fields = None
+    ) -> Iterable[Row]:
+        try:
+            with open(self.name_to_path(name), "rb") as file:
+                for offset in offsets:
+                    file.seek(offset)
+                    yield decode_json_line(file.readline().decode(), fields)
+        except FileNotFoundError:
+            pass
+
+    def data_length(self, name: str) -> int:
+        try:
+            return os.path.getsize(self.name_to_path(name))
+        except FileNotFoundError:
+            return 0
+
+    def spatial_index(self, name: str) -> Optional[GridIndex]:
+        return self.file_spatial_index(self.name_to_path(name))
+
+    def membership_filter(self, name: str) -> Optional[MembershipFilter]:
+        return self.file_membership_filter(self.name_to_path(name))
+
+    def lock(self, name: str) -> ContextManager[float]:
+        return file_lock(self.name_to_path(name))
+
+    def raw_path(self, name: str) -> Optional[str]:
+        return self.name_to_path(name)
+
+    def version(self, name: str) -> Optional[str]:
+        return self.file_version(self.name_to_path(name))
+
     def name_to_path(self, name: str) -> str:
         """
         Convert a name to a file path with the correct extension.
         """
         return self.get_path(name, "lines.json")
 
+    @locked
     def replace(self, name: str, data: Iterable[Row]) -> StoreResult:
-        with open(self.name_to_path(name), "w") as file:
-            import json
+        path = self.name_to_path(name)
+        temporary = temporary_path(path)
+        catalog = CatalogEntry(name, self.name())
+        with open(temporary, "wb") as file:
+            for batch in _batches(data, self._options.batch_rows):
+                file.write(encode_json_rows(batch))
+                catalog = self.add_to_catalog(catalog, batch)
+        os.replace(temporary, path)
 
-            for row in data:
-                json.dump(row, file, sort_keys=True)
-                file.write("\n")
+        self.finish_replace(name, catalog)
 
         return StoreResult(
             success=True,
@@ -296,16 +1150,25 @@ class JsonLines(Storage):
         )
 
 
-class CSVBasic(Storage):
+class JsonChunks(Storage):
     """
-    A minimal CSV implementation that uses a `DictWriter` to write rows
-    to the indicated file.
+    A JSON-lines store that splits each dataset into chunk files of about
+    ``CHUNK_FILE_BYTES`` each, in a directory named after the dataset.
+    Rows are only ever appended to the newest chunk, older chunks are
+    never modified, so a namespace kept in version control only changes
+    one small file (and, when a chunk fills up, the index) per update.
+
+    The directory holds the chunks along with ``index.json``, which lists
+    them in order. Replacing the data writes new chunks, then swaps the
+    index, then removes the old chunks. Row offsets (see
+    ``load_offsets``) run across the chunks as if they were one file.
     """
 
     @staticmethod
     def name() -> str:
-        return "csv"
+        return "json-chunks"
 
+    @locked
     def append(
         self,
         name: str,
@@ -313,104 +1176,645 @@ class CSVBasic(Storage):
         dedup_facets: Iterable[str],
         dedup_fields: Iterable[str],
     ) -> StoreResult:
+        if self.data_length(name) == 0:
+            # There are no data (yet) so we can just
+            # append all rows in data and return
+            return self.replace_new(name, data)
+
+        directory = self.name_to_path(name)
+        written = self.chunks(name)
+
+        def write(batch: List[Row]) -> None:
+            nonlocal written
+            chunks = self._write_chunks(directory, written, batch)
+            if chunks != written:
+                # Listed right away, so the next batch is compared to
+                # the rows in the new chunk
+                self._save_index(directory, chunks)
+            written = chunks
+
+        batches = self.dedup_batches(name, data, dedup_facets, dedup_fields)
+        self.append_batches(name, batches, write)
+
+        return StoreResult(success=True, message="")
+
+    def load(
+        self,
+        name: str,
+        workers: int = 1,
+        ordered: bool = True,
+        fields: Fields = None,
+    ) -> Iterable[Row]:
+        for path in self._chunk_paths(name):
+            try:
+                with open(path, "r", encoding="utf-8") as file:
+                    for line in file:
+                        yield decode_json_line(line, fields)
+            except FileNotFoundError:
+                # Removed by a replace while we were reading
+                continue
+
+    def load_backward(self, name: str, fields: Fields = None) -> Iterable[Row]:
+        for path in reversed(self._chunk_paths(name)):
+            try:
+                with open(path, "rb") as file:
+                    for line in read_backward(file):
+                        yield decode_json_line(line, fields)
+            except FileNotFoundError:
+                continue
+
+    def load_range(
+        self,
+        name: str,
+        time_field: str,
+        parse_time: TimeParser,
+        since: Optional[datetime] = None,
+        until: Optional[datetime] = None,
+        fields: Fields = None,
+    ) -> Iterable[Row]:
+        """
+        Since rows are stored in chronological order, chunks whose last
+        row is before ``since`` are skipped after reading only that row,
+        and the first row at or after ``since`` is found with a binary
+        search over the first chunk that is read.
+        """
+        columns = None if fields is None else _with_field(fields, time_field)
+
+        def key(line: Union[bytes, str]) -> datetime:
+            text = line.decode() if isinstance(line, bytes) else line
+            value = extract_json_fields(text, [time_field]).get(time_field)
+            if value is None:
+                return datetime.min
+            return parse_time(value)
+
+        within = time_filter(parse_time, since, until)
+        started = since is None
+        for path in self._chunk_paths(name):
+            try:
+                with open(path, "rb") as file:
+                    offset = 0
+                    if not started:
+                        last = next(iter(read_backward(file)), None)
+                        if last is None or key(last) < cast(datetime, since):
+                            continue
+                        offset = bisect_lines(file, key, since)
+                        started = True
+
+                    file.seek(offset)
+                    for line in file:
+                        row = decode_json_line(line.decode(), columns)
+                        if within(row.get(time_field)):
+                            yield row
+            except FileNotFoundError:
+                continue
+
+    def load_offsets(
+        self, name: str, start: int = 0, fields: Fields = None
+    ) -> Iterable[Tuple[int, Row]]:
+        for base, path, size in self._chunk_spans(name):
+            if base + size <= start:
+                continue
+            try:
+                with open(path, "rb") as file:
+                    local = max(start - base, 0)
+                    file.seek(local)
+                    for line in file:
+                        if line.strip():
+                            yield base + local, decode_json_line(line.decode(), fields)
+                        local += len(line)
+            except FileNotFoundError:
+                continue
+
+    def load_at(
+        self, name: str, offsets: Iterable[int], fields: Fields = None
+    ) -> Iterable[Row]:
+        from bisect import bisect_right
 
-        for _ in self.load(name):
-            break
+        spans = self._chunk_spans(name)
+        bases = [base for base, _, _ in spans]
+        files: Dict[str, BinaryIO] = {}
+        try:
+            for offset in offsets:
+                position = bisect_right(bases, offset) - 1
+                if position < 0:
+                    continue
+                base, path, _ = spans[position]
+                if path not in files:
+                    files[path] = open(path, "rb")
+                file = files[path]
+                file.seek(offset - base)
+                yield decode_json_line(file.readline().decode(), fields)
+        finally:
+            for file in files.values():
+                file.close()
+
+    def data_length(self, name: str) -> int:
+        return sum(size for _, _, size in self._chunk_spans(name))
+
+    def spatial_index(self, name: str) -> Optional[GridIndex]:
+        return self.file_spatial_index(self.name_to_path(name))
+
+    def membership_filter(self, name: str) -> Optional[MembershipFilter]:
+        return self.file_membership_filter(self.name_to_path(name))
+
+    def lock(self, name: str) -> ContextManager[float]:
+        os.makedirs(self.name_to_path(name), exist_ok=True)
+        return file_lock(self.index_path(name))
+
+    def version(self, name: str) -> Optional[str]:
+        chunks = self.chunks(name)
+        if not chunks:
+            return None
+        path = os.path.join(self.name_to_path(name), chunks[-1])
+        version = self.file_version(path)
+        return None if version is None else f"{chunks[-1]}-{len(chunks)}-{version}"
+
+    def name_to_path(self, name: str) -> str:
+        """
+        The directory that holds the chunks for a dataset.
+        """
+        return self.get_path(name, "chunks")
+
+    def index_path(self, name: str) -> str:
+        """
+        The path of the index that lists the chunks for a dataset.
+        """
+        return os.path.join(self.name_to_path(name), "index.json")
+
+    def chunks(self, name: str) -> List[str]:
+        """
+        The file names of the chunks for a dataset, oldest first.
+        """
+        try:
+            with open(self.index_path(name), "r") as file:
+                return list(json.load(file)["chunks"])
+        except FileNotFoundError:
+            return []
+
+    @locked
+    def replace(self, name: str, data: Iterable[Row]) -> StoreResult:
+        directory = self.name_to_path(name)
+        os.makedirs(directory, exist_ok=True)
+        old_chunks = self.chunks(name)
+        # New chunks never reuse a name, readers may still have old ones open
+        number = _chunk_number(old_chunks[-1]) + 1 if old_chunks else 0
+
+        chunks: List[str] = []
+        catalog = CatalogEntry(name, self.name())
+        for batch in _batches(data, self._options.batch_rows):
+            chunks = self._write_chunks(directory, chunks, batch, number)
+            catalog = self.add_to_catalog(catalog, batch)
+        self._save_index(directory, chunks)
+
+        for chunk in set(old_chunks) - set(chunks):
+            try:
+                os.remove(os.path.join(directory, chunk))
+            except FileNotFoundError:
+                pass
+
+        self.finish_replace(name, catalog)
+
+        return StoreResult(success=True, message="")
+
+    def _chunk_paths(self, name: str) -> List[str]:
+        directory = self.name_to_path(name)
+        return [os.path.join(directory, chunk) for chunk in self.chunks(name)]
+
+    def _chunk_spans(self, name: str) -> List[Tuple[int, str, int]]:
+        """
+        The offset at which each chunk begins, its path, and its size.
+        """
+        spans = []
+        base = 0
+        for path in self._chunk_paths(name):
+            try:
+                size = os.path.getsize(path)
+            except FileNotFoundError:
+                size = 0
+            spans.append((base, path, size))
+            base += size
+        return spans
+
+    @staticmethod
+    def _write_chunks(
+        directory: str, chunks: List[str], rows: Sequence[Row], number: int = 0
+    ) -> List[str]:
+        """
+        Append rows to the newest of the given chunks (or a new chunk with
+        the given number, if there are none), starting new chunks as each
+        one fills up. Returns the chunks that now exist.
+        """
+        chunks = list(chunks)
+        if chunks:
+            path = os.path.join(directory, chunks[-1])
+            size = os.path.getsize(path) if os.path.exists(path) else 0
         else:
+            chunks.append(_chunk_name(number))
+            size = 0
+
+        lines: List[bytes] = []
+        for row in rows:
+            line = encode_json_rows([row])
+            if size and size + len(line) > CHUNK_FILE_BYTES:
+                with open(os.path.join(directory, chunks[-1]), "ab") as file:
+                    file.write(b"".join(lines))
+                chunks.append(_chunk_name(_chunk_number(chunks[-1]) + 1))
+                lines, size = [], 0
+            lines.append(line)
+            size += len(line)
+
+        with open(os.path.join(directory, chunks[-1]), "ab") as file:
+            file.write(b"".join(lines))
+        return chunks
+
+    @staticmethod
+    def _save_index(directory: str, chunks: List[str]) -> None:
+        path = os.path.join(directory, "index.json")
+        temporary = temporary_path(path)
+        with open(temporary, "w") as file:
+            # One chunk per line, so adding a chunk is a one-line diff
+            json.dump({"chunks": chunks}, file, indent=2)
+            file.write("\n")
+        os.replace(temporary, path)
+
+
+def _chunk_name(number: int) -> str:
+    """
+    >>> _chunk_name(12)
+    '000012.lines.json'
+    """
+    return f"{number:06d}.lines.json"
+
+
+def _chunk_number(chunk: str) -> int:
+    """
+    >>> _chunk_number('000012.lines.json')
+    12
+    """
+    return int(chunk.split(".")[0])
+
+
+class JsonDeltas(Storage):
+    """
+    A JSON-lines store for snapshot-style datasets, where each new row
+    repeats most of the previous row for the same facets. Rows are
+    delta-encoded (see :class:`mtdata.delta.DeltaCodec`), grouped by the
+    ``facet_fields`` in the store's options: a full keyframe is stored
+    for each group every ``KEYFRAME_INTERVAL`` rows, and only the fields
+    that changed in between. Rows are rebuilt as they are loaded.
+
+    Since a row can only be rebuilt from the rows before it, the data are
+    always read forward. One pass over the file yields the latest row in
+    each group, which is all that appending needs to de-duplicate and
+    encode new rows.
+    """
+
+    @staticmethod
+    def name() -> str:
+        return "json-deltas"
+
+    @locked
+    def append(
+        self,
+        name: str,
+        data: Iterable[Row],
+        dedup_facets: Iterable[str],
+        dedup_fields: Iterable[str],
+    ) -> StoreResult:
+        codec = self._codec()
+        for _ in self._decode(name, codec):
+            pass
+        if not codec.latest:
             # There are no data (yet) so we can just
             # append all rows in data and return
-            return self.replace(name, data)
-
-        existing_data = self.load_backward(name)
-        deduped_data = self.dedup(
-            existing_data,
-            data,
-            dedup_facets,
-            dedup_fields,
-        )
+            return self.replace_new(name, data)
+
+        facets = list(dedup_facets)
+        if facets and tuple(facets) == self._options.facet_fields:
+            # The codec's latest rows change as rows are encoded, new rows
+            # are only compared to the ones that were already stored. The
+            # types are applied to copies, the codec encodes against the
+            # rows as they were stored.
+            latest = list(
+                typed_rows(
+                    (dict(row) for row in codec.latest.values()),
+                    self._options.field_types,
+                )
+            )
+            batches = _batches(
+                self.dedup(latest, data, facets, dedup_fields),
+                self._options.batch_rows,
+            )
+        else:
+            batches = self.dedup_batches(name, data, facets, dedup_fields)
+
+        path = self.name_to_path(name)
 
-        with open(self.name_to_path(name), "a") as file:
-            from csv import DictWriter, QUOTE_NONNUMERIC
+        def write(batch: List[Row]) -> None:
+            with open(path, "ab") as file:
+                file.write(encode_json_rows([codec.encode(row) for row in batch]))
 
-            writer = None
-            for row in deduped_data:
-                if writer is None:
-                    writer = DictWriter(
-                        file,
-                        fieldnames=list(row.keys()),
-                        quoting=QUOTE_NONNUMERIC,
-                    )
-                writer.writerow(row)
+        self.append_batches(name, batches, write)
 
         return StoreResult(success=True, message="")
 
-    def load(self, name: str) -> Iterable[Row]:
-        from csv import DictReader, QUOTE_NONNUMERIC
+    def load(
+        self,
+        name: str,
+        workers: int = 1,
+        ordered: bool = True,
+        fields: Fields = None,
+    ) -> Iterable[Row]:
+        from .projection import project
+
+        for row in self._decode(name, self._codec()):
+            yield row if fields is None else project(row, fields)
 
+    def _decode(self, name: str, codec: DeltaCodec) -> Iterator[Row]:
         try:
-            with open(self.name_to_path(name), "r") as file:
-                reader = DictReader(file, quoting=QUOTE_NONNUMERIC)
-                for row in reader:
-                    yield row
+            with open(self.name_to_path(name), "r", encoding="utf-8") as file:
+                for line in file:
+                    if line.strip():
+                        yield codec.decode(json.loads(line))
         except FileNotFoundError:
             pass
 
-    def load_backward(self, name: str) -> Iterable[Row]:
+    def _codec(self) -> DeltaCodec:
+        return DeltaCodec(self._options.facet_fields, KEYFRAME_INTERVAL)
+
+    def data_length(self, name: str) -> int:
+        try:
+            return os.path.getsize(self.name_to_path(name))
+        except FileNotFoundError:
+            return 0
+
+    def lock(self, name: str) -> ContextManager[float]:
+        return file_lock(self.name_to_path(name))
+
+    def raw_path(self, name: str) -> Optional[str]:
+        return self.name_to_path(name)
+
+    def version(self, name: str) -> Optional[str]:
+        return self.file_version(self.name_to_path(name))
+
+    def name_to_path(self, name: str) -> str:
         """
-        Load the data in reverse order. Used for de-duplication.
+        Convert a name to a file path with the correct extension.
         """
-        from csv import DictReader, QUOTE_NONNUMERIC
-        from itertools import chain
+        return self.get_path(name, "deltas.json")
 
-        # We have to kind of hack this because the reader doesn't have
-        # support for loading a CSV backward.
+    @locked
+    def replace(self, name: str, data: Iterable[Row]) -> StoreResult:
+        path = self.name_to_path(name)
+        temporary = temporary_path(path)
+        codec = self._codec()
+        catalog = CatalogEntry(name, self.name())
+        with open(temporary, "wb") as file:
+            for batch in _batches(data, self._options.batch_rows):
+                file.write(encode_json_rows([codec.encode(row) for row in batch]))
+                catalog = self.add_to_catalog(catalog, batch)
+        os.replace(temporary, path)
+
+        self.finish_replace(name, catalog)
+
+        return StoreResult(success=True, message="")
+
+
+@lru_cache(maxsize=128)
+def _parse_header(line: bytes) -> Tuple[str, ...]:
+    from csv import reader, QUOTE_NONNUMERIC
+
+    return tuple(next(reader([line.decode()], quoting=QUOTE_NONNUMERIC), ()))
+
+
+def _parse_record(record: bytes) -> List[Any]:
+    from csv import reader, QUOTE_NONNUMERIC
+
+    return next(reader([record.decode()], quoting=QUOTE_NONNUMERIC), [])
+
+
+class CSVBasic(Storage):
+    """
+    A minimal CSV implementation that uses a `DictWriter` to write rows
+    to the indicated file.
+
+    The header is written along with the first rows. Rows that are
+    appended later are always written in the column order recorded in
+    the header.
+
+    CSV reads every number back as a float and ``None`` as an empty
+    string, so the ``field_types`` from the store's options are applied
+    to the rows as they are read.
+    """
 
-        # First grab the header line
-        with open(self.name_to_path(name), "r") as header_file:
-            header_line = header_file.readline()
+    @staticmethod
+    def name() -> str:
+        return "csv"
 
-        # Then read the file backward and parse each line, but adding
-        # the header line at the beginning of the iterator. Skip the
-        # last line of the iterator since that's the header row again.
-        with open(self.name_to_path(name), "rb") as data_file:
-            reader = DictReader(
-                chain([header_line], read_backward(data_file)),
+    @locked
+    def append(
+        self,
+        name: str,
+        data: Iterable[Row],
+        dedup_facets: Iterable[str],
+        dedup_fields: Iterable[str],
+    ) -> StoreResult:
+        path = self.name_to_path(name)
+        header = self.read_header(path)
+        if not header:
+            # There are no data (yet) so we can just
+            # append all rows in data and return
+            return self.replace_new(name, data)
+
+        columns = set(header)
+
+        def write(batch: List[Row]) -> Optional[str]:
+            unknown = sorted({key for row in batch for key in row} - columns)
+            if unknown:
+                return f"fields not in the header of {path}: {', '.join(unknown)}"
+            with open(path, "a") as file:
+                file.write(encode_csv_rows(batch, header))
+            return None
+
+        batches = self.dedup_batches(name, data, dedup_facets, dedup_fields)
+        failure = self.append_batches(name, batches, write)
+        if failure is not None:
+            return StoreResult(success=False, message=failure)
+
+        return StoreResult(success=True, message="")
+
+    @staticmethod
+    def read_header(path: str) -> Tuple[str, ...]:
+        """
+        Read the field names from the header of the CSV file at the given
+        path. The file is read every time, so the result is always up to
+        date, but each distinct header is only parsed once. Returns an
+        empty tuple if the file doesn't exist or is empty.
+        """
+        try:
+            with open(path, "rb") as file:
+                line = file.readline()
+        except FileNotFoundError:
+            return ()
+        return _parse_header(line)
+
+    def load(
+        self,
+        name: str,
+        workers: int = 1,
+        ordered: bool = True,
+        fields: Fields = None,
+    ) -> Iterable[Row]:
+        from csv import reader, QUOTE_NONNUMERIC
+
+        if workers > 1:
+            yield from self._load_parallel(name, workers, ordered, fields)
+            return
+
+        try:
+            with open(self.name_to_path(name), "r", newline="") as file:
+                records = reader(file, quoting=QUOTE_NONNUMERIC)
+                header = next(records, None)
+                if header is None:
+                    return
+                build = record_builder(header, fields, self._options.field_types)
+                for record in records:
+                    if record:
+                        yield build(record)
+        except FileNotFoundError:
+            pass
+
+    def _load_parallel(
+        self, name: str, workers: int, ordered: bool, fields: Fields
+    ) -> Iterable[Row]:
+        path = self.name_to_path(name)
+        header = self.read_header(path)
+        if not header:
+            return
+
+        with open(path, "rb") as file:
+            header_length = len(file.readline())
+
+        ranges = split_ranges(
+            path,
+            workers * RANGES_PER_WORKER,
+            start=header_length,
+            quoted=True,
+        )
+        yield from load_ranges(
+            parse_csv_range,
+            path,
+            ranges,
+            workers,
+            ordered,
+            args=(list(header), fields, self._options.field_types),
+        )
+
+    def load_backward(self, name: str, fields: Fields = None) -> Iterable[Row]:
+        """
+        Load the data in reverse order. Used for de-duplication.
+        """
+        from csv import reader, QUOTE_NONNUMERIC
+
+        path = self.name_to_path(name)
+        header = self.read_header(path)
+        if not header:
+            return
+        build = record_builder(header, fields, self._options.field_types)
+
+        # Records are read backward in blocks, keeping quoted fields that
+        # span lines together. The last record read is the header, so we
+        # stay one record behind and drop it.
+        with open(path, "rb") as data_file:
+            records = reader(
+                read_records_backward(data_file),
                 quoting=QUOTE_NONNUMERIC,
             )
 
-            curr = next(reader, None)
-            if curr is None:
-                return
-
-            while True:
-                prev = curr
-                curr = next(reader, None)
-                if prev is not None:
-                    if curr is None:
-                        break
-                    else:
-                        yield prev
+            previous = None
+            for record in records:
+                if not record:
+                    continue
+                if previous is not None:
+                    yield build(previous)
+                previous = record
 
+    @locked
     def replace(self, name: str, data: Iterable[Row]) -> StoreResult:
-        with open(self.name_to_path(name), "w") as file:
-            from csv import DictWriter, QUOTE_NONNUMERIC
-
-            writer = None
-            for row in data:
-                if writer is None:
-                    writer = DictWriter(
-                        file,
-                        fieldnames=list(row.keys()),
-                        quoting=QUOTE_NONNUMERIC,
-                    )
-                    writer.writeheader()
-                writer.writerow(row)
+        path = self.name_to_path(name)
+        temporary = temporary_path(path)
+        catalog = CatalogEntry(name, self.name())
+        with open(temporary, "w") as file:
+            batches = _batches(data, self._options.batch_rows)
+            first = next(batches, None)
+            if first is not None:
+                # The first row decides the columns
+                header = list(first[0].keys())
+                file.write(encode_csv_header(header))
+                for batch in chain([first], batches):
+                    file.write(encode_csv_rows(batch, header))
+                    catalog = self.add_to_catalog(catalog, batch)
+        os.replace(temporary, path)
+
+        self.finish_replace(name, catalog)
 
         return StoreResult(
             success=True,
             message="",
         )
 
+    def load_offsets(
+        self, name: str, start: int = 0, fields: Fields = None
+    ) -> Iterable[Tuple[int, Row]]:
+        path = self.name_to_path(name)
+        header = self.read_header(path)
+        if not header:
+            return
+        build = record_builder(header, fields, self._options.field_types)
+
+        with open(path, "rb") as file:
+            start = max(start, len(file.readline()))
+            for offset, record in read_records(file, start):
+                values = _parse_record(record)
+                if values:
+                    yield offset, build(values)
+
+    def load_at(
+        self, name: str, offsets: Iterable[int], fields: Fields = None
+    ) -> Iterable[Row]:
+        path = self.name_to_path(name)
+        header = self.read_header(path)
+        if not header:
+            return
+        build = record_builder(header, fields, self._options.field_types)
+
+        with open(path, "rb") as file:
+            for offset in offsets:
+                for _, record in read_records(file, offset):
+                    yield build(_parse_record(record))
+                    break
+
+    def data_length(self, name: str) -> int:
+        try:
+            return os.path.getsize(self.name_to_path(name))
+        except FileNotFoundError:
+            return 0
+
+    def spatial_index(self, name: str) -> Optional[GridIndex]:
+        return self.file_spatial_index(self.name_to_path(name))
+
+    def membership_filter(self, name: str) -> Optional[MembershipFilter]:
+        return self.file_membership_filter(self.name_to_path(name))
+
+    def lock(self, name: str) -> ContextManager[float]:
+        return file_lock(self.name_to_path(name))
+
+    def raw_path(self, name: str) -> Optional[str]:
+        return self.name_to_path(name)
+
+    def version(self, name: str) -> Optional[str]:
+        return self.file_version(self.name_to_path(name))
+
     def name_to_path(self, name: str) -> str:
         """
         Name to path conversion that assumes the file extension.
@@ -2,10 +2,15 @@ from typing import Callable, Any, Optional, Dict, Tuple, Iterable, Union
 
 from .fields import rename_fields, prune_fields
 from .row import Row
+from .schema import FieldType, FieldTypes
 
 UpdaterFunction = Callable[[Any], Any]
 
-FieldSpecifier = Union[Tuple[str, str, UpdaterFunction], Tuple[str, str]]
+FieldSpecifier = Union[
+    Tuple[str, str, UpdaterFunction, FieldType],
+    Tuple[str, str, UpdaterFunction],
+    Tuple[str, str],
+]
 
 
 class Transformer:
@@ -19,6 +24,7 @@ class Transformer:
     1. Any fields not included in the transformation will be pruned
     2. Fields that have old names specified will be renamed
     3. Values will be updated for fields that have update functions
+    4. Values will be converted for fields that have declared types
 
     The row will be transformed in-place but also returned to the caller.
 
@@ -31,6 +37,7 @@ class Transformer:
 
     _name_mapping: Dict[str, str]
     _update_functions: Dict[str, Callable[[Any], Any]]
+    _field_types: FieldTypes
 
     def __init__(self, fields: Iterable[FieldSpecifier] = ()):
         """
@@ -39,10 +46,12 @@ class Transformer:
 
         ::
 
-            (new name, old name, value update function)
+            (new name, old name, value update function, field type)
 
         The value update function may be omitted and the identity
-        function will be used by default.
+        function will be used by default. The field type (see
+        :mod:`mtdata.schema`) is optional too, and may take the place of
+        the update function if the value only needs converting.
 
         It is also possible to omit the old name if the name doesn't
         need to change by setting it to ``None``.
@@ -63,6 +72,7 @@ class Transformer:
         """
         self._name_mapping = {}
         self._update_functions = {}
+        self._field_types = {}
 
         for field in fields:
             self.add_field(*field)
@@ -76,25 +86,85 @@ class Transformer:
 
         return row
 
+    @property
+    def field_types(self) -> FieldTypes:
+        """
+        The declared types of the transformed fields that have one.
+
+        >>> from mtdata.schema import Integer
+        >>> types = Transformer([('a', 'A', Integer()), ('b', 'B')]).field_types
+        >>> {name: type(field_type).__name__ for name, field_type in types.items()}
+        {'a': 'Integer'}
+        """
+        return dict(self._field_types)
+
+    def source_name(self, name: str) -> str:
+        """
+        The name of the field in an untransformed row that ends up as the
+        field with the given name once the transformation is applied.
+
+        >>> t = Transformer([('a', 'A'), ('b', None)])
+        >>> t.source_name('a'), t.source_name('b')
+        ('A', 'b')
+        """
+        for old, new in self._name_mapping.items():
+            if new == name:
+                return old
+        raise KeyError(name)
+
+    def transform_fields(self, row: Row, names: Iterable[str]) -> Tuple[Any, ...]:
+        """
+        Compute the transformed values of only the named fields of an
+        untransformed row, without modifying the row. This is useful for
+        deciding what to do with a row before paying for the full
+        transformation.
+
+        >>> t = Transformer([('a', 'A', lambda x: x.lower()), ('b', 'B')])
+        >>> row = {'A': 'XYZ', 'B': 1}
+        >>> t.transform_fields(row, ['a'])
+        ('xyz',)
+        >>> row
+        {'A': 'XYZ', 'B': 1}
+        """
+        return tuple(
+            self._update_functions[name](row[self.source_name(name)]) for name in names
+        )
+
     def add_field(
         self,
         name: str,
         old_name: Optional[str] = None,
         updater: UpdaterFunction = lambda a: a,
+        field_type: Optional[FieldType] = None,
     ) -> None:
         """
-        Add a field to the transformation.
+        Add a field to the transformation. If a ``field_type`` is given,
+        it is applied to the result of the update function.
 
+        >>> from mtdata.schema import EpochTime
         >>> t = Transformer()
         >>> t.add_field('a', 'A', lambda x: x.lower())
         >>> t._name_mapping
         {'A': 'a'}
         >>> t._update_functions['a']('ABC')
         'abc'
+        >>> t.add_field('b', 'B', lambda x: x[:10], EpochTime())
+        >>> t._update_functions['b']('2021-09-13 (Monday)')
+        1631491200
         """
         if old_name is not None:
             self._name_mapping[old_name] = name
         else:
             self._name_mapping[name] = name
 
+        if field_type is None and isinstance(updater, FieldType):
+            field_type = updater
+        elif field_type is not None:
+            update, convert = updater, field_type
+            updater = lambda a: convert(update(a))  # noqa: E731
+
         self._update_functions[name] = updater
+        if field_type is not None:
+            self._field_types[name] = field_type
+        else:
+            self._field_types.pop(name, None)
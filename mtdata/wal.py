@@ -0,0 +1,532 @@
+import json
+import os
+import threading
+import time
+from contextlib import ExitStack
+from typing import (
+    Any,
+    BinaryIO,
+    Dict,
+    Iterator,
+    List,
+    NamedTuple,
+    Optional,
+    Sequence,
+    Tuple,
+)
+
+from .dataset import Dataset
+from .row import Row
+from .storage import Storage, StoreResult
+
+# A group of appends is committed (written and synced to disk) once it
+# holds this many rows, or once its first append is ``GROUP_MS`` old.
+GROUP_ROWS = 1_000
+GROUP_MS = 10.0
+
+# Committed appends are folded into the stores this often, at most
+# ``FOLD_ROWS`` rows at a time.
+FOLD_MS = 1_000.0
+FOLD_ROWS = 100_000
+
+# A new segment is started once the current one reaches this size.
+SEGMENT_BYTES = 16 << 20
+
+
+class LogRecord(NamedTuple):
+    """
+    One append in a write-ahead log: the rows for a dataset and the
+    stores they go to, along with its position (``sequence``) in the log.
+    """
+
+    sequence: int
+    dataset: str
+    stores: List[str]
+    rows: List[Row]
+
+
+class FoldState(NamedTuple):
+    """
+    How far a write-ahead log has been folded into the stores. Every
+    record up to and including ``through`` has been folded, and
+    ``folded`` holds the sequence number of the last record folded into
+    each ``<store>/<dataset>``, which may be further along.
+    """
+
+    through: int = 0
+    folded: Dict[str, int] = {}
+
+
+class WriteAheadLog:
+    """
+    A write-ahead log for a namespace, for callers that append small
+    batches of (transformed) rows often, such as long-running processes.
+
+    Appending a batch to a store directly opens, de-duplicates against,
+    writes and closes the store's files every time, and nothing is synced
+    to disk. ``append`` instead adds the rows to a log file that stays
+    open, and the log is synced once per group of appends: as soon as
+    the group holds ``group_rows`` rows, or ``group_ms`` milliseconds
+    after its first append, whichever comes first. A crash loses at most
+    the group that was being collected, and ``sync`` commits it early.
+
+    Every ``fold_ms`` milliseconds, a background thread folds the
+    committed appends into the stores, with one ``append`` (and so one
+    de-duplication and one write) for each store and dataset, after
+    dropping rows that repeat an earlier row (see
+    ``Storage.drop_repeats``). Rows only show up in the stores once they
+    have been folded. An append that a store fails to take is folded
+    again on the next pass, the rest carry on.
+
+    The log is a directory of JSON-lines segments, in ``<namespace>/wal``,
+    named after the sequence number of their first record, with the fold
+    progress in ``folded.json``. Segments are deleted once everything in
+    them has been folded. Opening a log folds whatever an earlier process
+    left unfolded, including after a crash, before anything new is
+    appended. The log is locked while it's open, so only one process
+    writes to it at a time, and it must be closed by the thread that
+    opened it.
+
+    Stores are created by name, with the options for each dataset (see
+    :func:`mtdata.registry.store_options`). If ``journal`` is ``True``,
+    rows are recorded in the namespace's change journal as they are
+    folded, see :class:`mtdata.journal.Journal`.
+    """
+
+    _directory: str
+    _namespace: str
+    _group_rows: int
+    _group_ms: float
+    _fold_ms: float
+    _fold_rows: int
+    _segment_bytes: int
+    _spatial_index: bool
+    _journal: bool
+
+    _lock: threading.Lock
+    _fold_lock: threading.Lock
+    _closed: threading.Event
+    _exit: ExitStack
+    _threads: List[threading.Thread]
+    _stores: Dict[Tuple[str, str], Tuple[Optional[Storage], Optional[Dataset]]]
+
+    _file: Optional[BinaryIO]
+    _segment_size: int
+    _sequence: int
+    _committed: int
+    _group_rows_pending: int
+    _group_started: float
+
+    def __init__(
+        self,
+        namespace: str,
+        group_rows: int = GROUP_ROWS,
+        group_ms: float = GROUP_MS,
+        fold_ms: float = FOLD_MS,
+        fold_rows: int = FOLD_ROWS,
+        segment_bytes: int = SEGMENT_BYTES,
+        spatial_index: bool = False,
+        journal: bool = False,
+    ):
+        self._namespace = namespace
+        self._directory = os.path.join(namespace, "wal")
+        self._group_rows = group_rows
+        self._group_ms = group_ms
+        self._fold_ms = fold_ms
+        self._fold_rows = fold_rows
+        self._segment_bytes = segment_bytes
+        self._spatial_index = spatial_index
+        self._journal = journal
+
+        self._lock = threading.Lock()
+        self._fold_lock = threading.Lock()
+        self._closed = threading.Event()
+        self._closed.set()
+        self._exit = ExitStack()
+        self._threads = []
+        self._stores = {}
+
+        self._file = None
+        self._segment_size = 0
+        self._sequence = 0
+        self._committed = 0
+        self._group_rows_pending = 0
+        self._group_started = 0.0
+
+    @property
+    def directory(self) -> str:
+        return self._directory
+
+    def __enter__(self) -> "WriteAheadLog":
+        self.open()
+        return self
+
+    def __exit__(self, *exc: Any) -> None:
+        self.close()
+
+    def open(self) -> List[StoreResult]:
+        """
+        Lock the log, fold whatever is left in it from earlier, and start
+        committing and folding in the background. Returns the results of
+        folding the leftovers into the stores.
+        """
+        from .locking import file_lock
+
+        if not self._closed.is_set():
+            raise ValueError("write-ahead log is already open")
+
+        os.makedirs(self._directory, exist_ok=True)
+        self._exit.enter_context(file_lock(os.path.join(self._directory, "wal")))
+        try:
+            state = self.fold_state()
+            self._sequence = max(
+                [self._last_sequence(), state.through, *state.folded.values()]
+            )
+            self._committed = self._sequence
+            results = self._fold_all()
+
+            # Appends go to a new segment, after any partly written record
+            self._start_segment()
+        except BaseException:
+            self._exit.close()
+            raise
+
+        self._closed.clear()
+        self._threads = [
+            threading.Thread(target=self._commit_loop, daemon=True),
+            threading.Thread(target=self._fold_loop, daemon=True),
+        ]
+        for thread in self._threads:
+            thread.start()
+        return results
+
+    def close(self) -> List[StoreResult]:
+        """
+        Commit the current group, fold everything that is left into the
+        stores, and unlock the log. Returns the results of that last fold.
+        Appends that a store failed to take stay in the log, and are
+        folded the next time it's opened.
+        """
+        if self._closed.is_set():
+            return []
+
+        with self._lock:
+            self._commit()
+            self._closed.set()
+        for thread in self._threads:
+            thread.join()
+        self._threads = []
+
+        try:
+            return self._fold_all()
+        finally:
+            with self._lock:
+                if self._file is not None:
+                    self._file.close()
+                    self._file = None
+            self._exit.close()
+
+    def append(self, name: str, rows: Sequence[Row], stores: Sequence[str]) -> int:
+        """
+        Add rows for the dataset with the given name to the log, to be
+        folded into each of the named stores. Returns the sequence number
+        of the append, which is durable once ``committed`` reaches it.
+        """
+        rows = list(rows)
+        body = json.dumps({"dataset": name, "rows": rows, "stores": list(stores)})
+        with self._lock:
+            if self._closed.is_set() or self._file is None:
+                raise ValueError("write-ahead log is closed")
+
+            # The sequence number is only known once the lock is held
+            self._sequence += 1
+            line = f'{{"seq": {self._sequence}, {body[1:]}\n'.encode()
+            self._file.write(line)
+            self._segment_size += len(line)
+
+            if not self._group_rows_pending:
+                self._group_started = time.monotonic()
+            self._group_rows_pending += max(1, len(rows))
+            if self._group_rows_pending >= self._group_rows:
+                self._commit()
+            return self._sequence
+
+    def sync(self) -> int:
+        """
+        Commit the current group now, rather than waiting for it to fill
+        up or grow old. Returns the sequence number of the last durable
+        append.
+        """
+        with self._lock:
+            self._commit()
+            return self._committed
+
+    @property
+    def committed(self) -> int:
+        """
+        The sequence number of the last append that was synced to disk.
+        """
+        with self._lock:
+            return self._committed
+
+    def fold(self) -> List[StoreResult]:
+        """
+        Fold up to ``fold_rows`` rows of committed appends into the stores
+        now, rather than waiting for the background thread. Returns the
+        result of each store's ``append``.
+        """
+        with self._lock:
+            until = self._committed
+        return self._fold(until)
+
+    def fold_state(self) -> FoldState:
+        """
+        How far the log has been folded into the stores.
+        """
+        try:
+            with open(self._state_path(), "r") as file:
+                state = json.load(file)
+            return FoldState(state["through"], state["folded"])
+        except (FileNotFoundError, KeyError, TypeError, ValueError):
+            return FoldState()
+
+    def records(
+        self, after: int = 0, until: Optional[int] = None
+    ) -> Iterator[LogRecord]:
+        """
+        Read the records with a sequence number greater than ``after`` (and
+        no greater than ``until``), in order. Segments that only hold
+        older records are skipped without being opened, and a partly
+        written record at the end of a segment is ignored.
+        """
+        segments = self.segments()
+        starts = [_first_sequence(path) for path in segments]
+        for index, path in enumerate(segments):
+            if index + 1 < len(starts) and starts[index + 1] <= after + 1:
+                continue
+            if until is not None and starts[index] > until:
+                return
+            with open(path, "rb") as file:
+                for line in file:
+                    record = _parse_record(line)
+                    if record is None or record.sequence <= after:
+                        continue
+                    if until is not None and record.sequence > until:
+                        return
+                    yield record
+
+    def segments(self) -> List[str]:
+        """
+        The paths of the log segments, oldest first.
+        """
+        try:
+            names = os.listdir(self._directory)
+        except FileNotFoundError:
+            return []
+        return sorted(
+            os.path.join(self._directory, name)
+            for name in names
+            if name.endswith(".lines.json")
+        )
+
+    def _commit(self) -> None:
+        """
+        Write and sync the current group, and start a new segment if this
+        one is full. The caller holds ``_lock``.
+        """
+        if self._file is None or self._committed == self._sequence:
+            return
+        self._file.flush()
+        os.fsync(self._file.fileno())
+        self._committed = self._sequence
+        self._group_rows_pending = 0
+        if self._segment_size >= self._segment_bytes:
+            self._file.close()
+            self._start_segment()
+
+    def _start_segment(self) -> None:
+        path = os.path.join(self._directory, f"{self._sequence + 1:012d}.lines.json")
+        self._file = open(path, "ab")
+        self._segment_size = self._file.tell()
+        if self._segment_size:
+            # Only a partly written record is left in it, which mustn't
+            # run into the next one
+            with open(path, "rb") as file:
+                file.seek(-1, os.SEEK_END)
+                if file.read(1) != b"\n":
+                    self._file.write(b"\n")
+                    self._segment_size += 1
+
+    def _commit_loop(self) -> None:
+        # Commits groups that don't fill up before they grow old
+        interval = self._group_ms / 1000
+        while not self._closed.wait(interval / 2):
+            with self._lock:
+                age = time.monotonic() - self._group_started
+                if self._group_rows_pending and age >= interval:
+                    self._commit()
+
+    def _fold_loop(self) -> None:
+        while not self._closed.wait(self._fold_ms / 1000):
+            try:
+                self.fold()
+            except Exception:
+                # Whatever failed stays in the log for the next pass
+                pass
+
+    def _fold_all(self) -> List[StoreResult]:
+        """
+        Fold everything that has been committed, a pass at a time, until
+        it has all been folded or a store fails.
+        """
+        results: List[StoreResult] = []
+        while True:
+            with self._lock:
+                until = self._committed
+            before = self.fold_state().through
+            passed = self._fold(until)
+            results.extend(passed)
+            failed = any(not result.success for result in passed)
+            through = self.fold_state().through
+            if failed or through >= until or through == before:
+                return results
+
+    def _fold(self, until: int) -> List[StoreResult]:
+        with self._fold_lock:
+            state = self.fold_state()
+            groups: Dict[str, List[LogRecord]] = {}
+            count = 0
+            last = state.through
+            for record in self.records(state.through, until):
+                for store in record.stores:
+                    key = f"{store}/{record.dataset}"
+                    if record.sequence > state.folded.get(key, 0):
+                        groups.setdefault(key, []).append(record)
+                last = record.sequence
+                count += len(record.rows)
+                if count >= self._fold_rows:
+                    break
+            if last == state.through:
+                return []
+
+            folded = dict(state.folded)
+            results = []
+            through = last
+            for key, records in groups.items():
+                store_name, name = key.split("/", 1)
+                result = self._fold_records(store_name, name, records)
+                results.append(result)
+                if result.success:
+                    folded[key] = records[-1].sequence
+                else:
+                    through = min(through, records[0].sequence - 1)
+
+            # Keys that are caught up don't need remembering
+            folded = {key: seq for key, seq in folded.items() if seq > through}
+            self._save_state(FoldState(through, folded))
+            self._remove_folded(through)
+            return results
+
+    def _fold_records(
+        self, store_name: str, name: str, records: List[LogRecord]
+    ) -> StoreResult:
+        store, dataset = self._store(store_name, name)
+        if store is None:
+            return StoreResult(success=False, message=f"unknown store {store_name}")
+
+        facets = list(dataset.dedup_facets) if dataset is not None else []
+        fields = list(dataset.dedup_fields) if dataset is not None else []
+        rows = Storage.drop_repeats(
+            (row for record in records for row in record.rows), facets, fields
+        )
+        try:
+            return store.append(name, rows, facets, fields)
+        except Exception as e:
+            return StoreResult(success=False, message=f"{store_name}: {e}")
+
+    def _store(
+        self, store_name: str, name: str
+    ) -> Tuple[Optional[Storage], Optional[Dataset]]:
+        """
+        The store with the given name, set up for the dataset with the
+        given name, and the dataset (or ``None`` if it isn't known).
+        """
+        from .journal import Journal
+        from .manifest import get_dataset, get_store
+        from .registry import store_options
+        from .storage import StoreOptions
+
+        key = (store_name, name)
+        if key not in self._stores:
+            store_class = get_store(store_name)
+            dataset_class = get_dataset(name)
+            dataset = dataset_class() if dataset_class is not None else None
+            store = None
+            if store_class is not None:
+                options = (
+                    store_options(dataset, self._spatial_index)
+                    if dataset is not None
+                    else StoreOptions()
+                )
+                store = store_class(namespace=self._namespace, options=options)
+                if self._journal:
+                    store.subscribe(Journal(self._namespace))
+            self._stores[key] = (store, dataset)
+        return self._stores[key]
+
+    def _last_sequence(self) -> int:
+        from .backward import read_backward
+
+        for path in reversed(self.segments()):
+            with open(path, "rb") as file:
+                for line in read_backward(file):
+                    record = _parse_record(line)
+                    if record is not None:
+                        return record.sequence
+            # An empty segment is named for the record that comes next
+            return _first_sequence(path) - 1
+        return 0
+
+    def _remove_folded(self, through: int) -> None:
+        """
+        Remove the segments, other than the one being written, whose
+        records have all been folded.
+        """
+        segments = self.segments()
+        # The last segment is the one being written, so it's never removed
+        for path, following in zip(segments, segments[1:]):
+            if _first_sequence(following) - 1 > through:
+                break
+            os.remove(path)
+
+    def _save_state(self, state: FoldState) -> None:
+        from .locking import temporary_path
+
+        path = self._state_path()
+        temporary = temporary_path(path)
+        with open(temporary, "w") as file:
+            json.dump(state._asdict(), file, sort_keys=True)
+            file.write("\n")
+        os.replace(temporary, path)
+
+    def _state_path(self) -> str:
+        return os.path.join(self._directory, "folded.json")
+
+
+def _first_sequence(path: str) -> int:
+    return int(os.path.basename(path).split(".")[0])
+
+
+def _parse_record(line: Any) -> Optional[LogRecord]:
+    """
+    >>> _parse_record(b'{"dataset": "d", "rows": [{"a": 1}], "seq": 3, "stores": ["s"]}')
+    LogRecord(sequence=3, dataset='d', stores=['s'], rows=[{'a': 1}])
+    >>> _parse_record(b'{"dataset": "d", "ro') is None
+    True
+    """
+    try:
+        record: Dict[str, Any] = json.loads(line)
+    except ValueError:
+        # A partially written line
+        return None
+    return LogRecord(record["seq"], record["dataset"], record["stores"], record["rows"])
@@ -0,0 +1,79 @@
+import os
+import tempfile
+
+import pytest
+
+from mtdata.aggregate import Aggregation, aggregate
+from mtdata.datasets.air_quality import AirQuality
+from mtdata.datasets.missoula_911 import Missoula911
+from mtdata.storage import CSVBasic, JsonLines
+
+np = pytest.importorskip('numpy')
+
+ROWS = [
+    {
+        'aqi': hour,
+        'site_name': ['Missoula', 'Helena'][hour % 2],
+        'utc_timestamp': f'2021-09-{13 + hour // 24}T{hour % 24:02}:00',
+    }
+    for hour in range(48)
+]
+
+
+def test_aggregate():
+    with tempfile.TemporaryDirectory() as namespace:
+        for sto in [JsonLines(namespace), CSVBasic(namespace)]:
+            sto.replace('air_quality', ROWS + [{'site_name': 'Butte', 'aqi': None, 'utc_timestamp': '2021-09-14T00:00'}])
+
+            rows = aggregate(
+                sto,
+                AirQuality(),
+                by=['site_name', 'day'],
+                aggregations=[Aggregation('mean', 'aqi'), Aggregation('max', 'aqi')],
+                chunk_size=7,
+            )
+            assert rows == [
+                {'site_name': 'Butte', 'day': '2021-09-14', 'count': 1, 'mean_aqi': None, 'max_aqi': None},
+                {'site_name': 'Helena', 'day': '2021-09-13', 'count': 12, 'mean_aqi': 12.0, 'max_aqi': 23.0},
+                {'site_name': 'Helena', 'day': '2021-09-14', 'count': 12, 'mean_aqi': 36.0, 'max_aqi': 47.0},
+                {'site_name': 'Missoula', 'day': '2021-09-13', 'count': 12, 'mean_aqi': 11.0, 'max_aqi': 22.0},
+                {'site_name': 'Missoula', 'day': '2021-09-14', 'count': 12, 'mean_aqi': 35.0, 'max_aqi': 46.0},
+            ]
+
+            rows = aggregate(sto, AirQuality(), by=[], aggregations=[Aggregation('sum', 'aqi')])
+            assert rows == [{'count': 49, 'sum_aqi': float(sum(range(48)))}]
+
+
+def test_aggregate_cache():
+    with tempfile.TemporaryDirectory() as namespace:
+        sto = JsonLines(namespace)
+        sto.replace('air_quality', ROWS)
+        spec = dict(by=['site_name'], aggregations=[Aggregation('min', 'aqi')])
+
+        first = aggregate(sto, AirQuality(), **spec)
+        assert os.listdir(os.path.join(namespace, '.cache'))
+
+        # A cached result is returned without loading anything
+        sto.load = None
+        assert aggregate(sto, AirQuality(), **spec) == first
+        del sto.load
+
+        sto.append('air_quality', [{'site_name': 'Butte', 'aqi': 5, 'utc_timestamp': '2021-09-15T00:00'}], [], [])
+        rows = aggregate(sto, AirQuality(), **spec)
+        assert rows[0] == {'site_name': 'Butte', 'count': 1, 'min_aqi': 5.0}
+
+
+def test_aggregate_parses_times():
+    with tempfile.TemporaryDirectory() as namespace:
+        sto = JsonLines(namespace)
+        sto.replace('missoula_911', [
+            {'agency': 'MPD', 'timestamp': '9/6/2021 7:22:33 AM'},
+            {'agency': 'MPD', 'timestamp': '9/6/2021 8:18:35 PM'},
+            {'agency': 'MCSO', 'timestamp': '9/7/2021 1:00:00 AM'},
+        ])
+
+        rows = aggregate(sto, Missoula911(), by=['agency', 'day'], aggregations=[], cache=False)
+        assert rows == [
+            {'agency': 'MCSO', 'day': '2021-09-07', 'count': 1},
+            {'agency': 'MPD', 'day': '2021-09-06', 'count': 2},
+        ]
@@ -0,0 +1,94 @@
+import tempfile
+import time
+from datetime import date, timedelta
+from typing import Iterable, Optional
+
+from mtdata.backfill import BackfillCheckpoint, backfill
+from mtdata.dataset import Dataset, FetchResult
+from mtdata.storage import CSVBasic, JsonLines
+from mtdata.transformer import Transformer
+
+
+class WindowedDataset(Dataset):
+    failing = set()
+    fetched = []
+
+    @staticmethod
+    def name() -> str:
+        return 'windowed'
+
+    @property
+    def dedup_facets(self) -> Iterable[str]:
+        return []
+
+    @property
+    def dedup_fields(self) -> Iterable[str]:
+        return ['event']
+
+    @property
+    def time_field(self) -> Optional[str]:
+        return 'day'
+
+    @property
+    def transformer(self) -> Transformer:
+        return Transformer([('event', 'Event'), ('day', 'Day')])
+
+    @property
+    def fetch_window(self) -> Optional[timedelta]:
+        return timedelta(days=3)
+
+    def fetch_range(self, start: date, end: date) -> FetchResult:
+        WindowedDataset.fetched.append(start)
+        if start in WindowedDataset.failing:
+            return FetchResult(False, 'source is down', [])
+        # Later windows arrive first
+        time.sleep(0.001 * (date(2021, 2, 1) - start).days)
+        days = [start + timedelta(days=n) for n in range((end - start).days + 1)]
+        if start > date(2021, 1, 1):
+            # The last event of the previous window is repeated
+            days.insert(0, start - timedelta(days=1))
+        # Events come newest first
+        rows = [{'Event': f'e{d.toordinal()}', 'Day': d.isoformat()} for d in days]
+        return FetchResult(True, '', list(reversed(rows)))
+
+    def fetch(self) -> FetchResult:
+        return FetchResult(False, 'only backfills', [])
+
+
+def test_backfill_in_order_and_resume(monkeypatch):
+    monkeypatch.setattr('mtdata.retry.sleep', lambda seconds: None)
+
+    with tempfile.TemporaryDirectory() as namespace:
+        start, end = date(2021, 1, 1), date(2021, 1, 30)
+        WindowedDataset.failing = {date(2021, 1, 16)}
+        WindowedDataset.fetched = []
+
+        result = backfill(
+            WindowedDataset,
+            [JsonLines, CSVBasic],
+            namespace,
+            start,
+            end,
+            workers=3,
+            batch_size=7,
+        )
+        assert not result.success
+        assert 'source is down' in result.message
+        assert result.windows == 10 and result.skipped == 0
+        # The five windows before the failing one were stored
+        assert len(BackfillCheckpoint(namespace, 'windowed').completed()) == 5
+
+        WindowedDataset.failing = set()
+        WindowedDataset.fetched = []
+        result = backfill(
+            WindowedDataset, [JsonLines, CSVBasic], namespace, start, end, workers=3
+        )
+        assert result.success
+        assert result.skipped == 5
+        assert min(WindowedDataset.fetched) == date(2021, 1, 16)
+
+        expected = [date(2021, 1, 1) + timedelta(days=n) for n in range(30)]
+        for store_class in [JsonLines, CSVBasic]:
+            rows = list(store_class(namespace).load('windowed'))
+            assert [row['day'] for row in rows] == [d.isoformat() for d in expected]
+            assert len({row['event'] for row in rows}) == 30
@@ -0,0 +1,68 @@
+import json
+import tempfile
+from datetime import datetime
+
+from mtdata.__main__ import _main
+from mtdata.catalog import load_entry
+from mtdata.storage import CSVBasic, JsonChunks, JsonDeltas, JsonLines, StoreOptions
+
+OPTIONS = StoreOptions(
+    time_field='time',
+    parse_time=datetime.fromisoformat,
+    facet_fields=('site',),
+)
+
+
+def _row(site, hour, value):
+    return {'site': site, 'time': f'2021-09-13T{hour:02}:00', 'value': value}
+
+
+def test_catalog_is_maintained():
+    with tempfile.TemporaryDirectory() as namespace:
+        for store_class in [JsonLines, CSVBasic, JsonChunks, JsonDeltas]:
+            sto = store_class(namespace, OPTIONS)
+            sto.append('data', [_row('a', 5, 1), _row('b', 3, 1)], ['site'], ['value'])
+            sto.append('data', [_row('a', 6, 1), _row('b', 9, 2)], ['site'], ['value'])
+
+            entry = load_entry(namespace, 'data', sto.name())
+            assert entry.rows == 3
+            assert entry.bytes == sto.data_length('data')
+            assert entry.time_min == '2021-09-13T03:00'
+            assert entry.time_max == '2021-09-13T09:00'
+            assert entry.facets == {'site': {'a': 1, 'b': 2}}
+            assert entry.last_append is not None
+
+            sto.replace('data', [_row('c', 1, 1)])
+            entry = load_entry(namespace, 'data', sto.name())
+            assert entry.rows == 1
+            assert entry.facets == {'site': {'c': 1}}
+            assert entry.time_max == '2021-09-13T01:00'
+
+
+def test_catalog_created_for_existing_data():
+    import os
+
+    with tempfile.TemporaryDirectory() as namespace:
+        sto = JsonLines(namespace, OPTIONS)
+        sto.replace('data', [_row('a', 1, 1), _row('a', 2, 2)])
+        os.remove(os.path.join(namespace, 'catalog', 'data.json-lines.json'))
+
+        sto.append('data', [_row('a', 3, 3)], [], [])
+        entry = load_entry(namespace, 'data', 'json-lines')
+        assert entry.rows == 3
+        assert entry.time_min == '2021-09-13T01:00'
+
+
+def test_stats_command(capsys):
+    with tempfile.TemporaryDirectory() as namespace:
+        JsonLines(namespace, OPTIONS).replace('data', [_row('a', 1, 1)])
+        CSVBasic(namespace, OPTIONS).replace('data', [_row('a', 1, 1)])
+        JsonLines(namespace).replace('other', [{'x': 1}])
+
+        _main(['stats', '-n', namespace, '-s', 'json-lines'])
+        lines = capsys.readouterr().out.splitlines()
+        entries = [json.loads(line) for line in lines]
+        assert [(e['dataset'], e['store'], e['rows']) for e in entries] == [
+            ('data', 'json-lines', 1),
+            ('other', 'json-lines', 1),
+        ]
@@ -0,0 +1,57 @@
+import os
+import tempfile
+
+from mtdata.__main__ import _main
+from mtdata.catalog import load_entry
+from mtdata.convert import convert
+from mtdata.storage import CSVBasic, JsonLines
+
+ROWS = [
+    {'site': 'a', 'note': f'line\n{i}' if i % 7 == 0 else 'x', 'value': i}
+    for i in range(25_000)
+]
+
+
+def test_convert_between_formats():
+    with tempfile.TemporaryDirectory() as namespace:
+        JsonLines(namespace).replace('data', ROWS)
+
+        result = convert('data', JsonLines(namespace), CSVBasic(namespace))
+        assert result.success
+        assert result.message == 'converted 25000 rows'
+        assert list(CSVBasic(namespace).load('data')) == ROWS
+        assert load_entry(namespace, 'data', 'csv').rows == 25_000
+
+        result = convert('missing', JsonLines(namespace), CSVBasic(namespace))
+        assert not result.success
+
+
+def test_convert_copies_raw_bytes():
+    with tempfile.TemporaryDirectory() as source, \
+            tempfile.TemporaryDirectory() as target:
+        JsonLines(source).replace('data', ROWS[:10])
+
+        result = convert('data', JsonLines(source), JsonLines(target))
+        assert result.success
+        assert result.message.startswith('copied ')
+
+        with open(os.path.join(source, 'data.lines.json'), 'rb') as file:
+            expected = file.read()
+        with open(os.path.join(target, 'data.lines.json'), 'rb') as file:
+            assert file.read() == expected
+        assert load_entry(target, 'data', 'json-lines').rows == 10
+
+        assert not convert('nope', JsonLines(source), JsonLines(target)).success
+
+
+def test_convert_command(capsys):
+    with tempfile.TemporaryDirectory() as namespace:
+        CSVBasic(namespace).replace('air_quality', ROWS[:3])
+        target = os.path.join(namespace, 'copy')
+
+        _main([
+            'convert', '-d', 'air_quality', '-n', namespace,
+            '--from', 'csv', '--to', 'csv', '--to-namespace', target,
+        ])
+        assert 'ok: copied' in capsys.readouterr().out
+        assert list(CSVBasic(target).load('air_quality')) == ROWS[:3]
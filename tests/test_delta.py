@@ -0,0 +1,112 @@
+import os
+import tempfile
+
+from mtdata.datasets.air_quality import AirQuality
+from mtdata.delta import KEYFRAME_INTERVAL
+from mtdata.registry import store_options
+from mtdata.storage import JsonDeltas, JsonLines, StoreOptions
+
+OPTIONS = StoreOptions(facet_fields=('county',))
+
+FIELDS = ['cumulative_cases', 'cumulative_deaths']
+
+
+def _snapshots(days, counties=5):
+    # Cases go up every day, deaths every ten days, the rest never change
+    return [
+        {
+            'county': f'County {c}',
+            'county_fips': f'30{c:03}',
+            'fetch_date': f'2021-{1 + d // 28:02}-{1 + d % 28:02}',
+            'cumulative_cases': 100 * c + d,
+            'cumulative_deaths': c + d // 10,
+            'population': 10_000 * (c + 1),
+            'state': 'Montana',
+        }
+        for d in range(days)
+        for c in range(counties)
+    ]
+
+
+def _readings(hours):
+    return [
+        {
+            'AQI': 10 + hour,
+            'AgencyName': 'Montana DEQ',
+            'Category': 1,
+            'FullAQSCode': '300630024',
+            'IntlAQSCode': '840300630024',
+            'Latitude': 46.8751,
+            'Longitude': -113.9955,
+            'Parameter': 'PM2.5',
+            'SiteName': 'Missoula',
+            'UTC': f'2021-09-13T{hour:02}:00',
+            'Unit': 'UG/M3',
+        }
+        for hour in hours
+    ]
+
+
+def test_rows_are_rebuilt():
+    rows = _snapshots(60)
+    with tempfile.TemporaryDirectory() as namespace:
+        sto = JsonDeltas(namespace, OPTIONS)
+        sto.replace('covid', rows[:100])
+        for day in range(20, 60):
+            new = rows[day * 5 : (day + 1) * 5]
+            assert sto.append('covid', new, ['county'], FIELDS).success
+
+        assert list(sto.load('covid')) == rows
+        assert list(sto.load('covid', fields=['county', 'state'])) == [
+            {'county': row['county'], 'state': 'Montana'} for row in rows
+        ]
+        assert list(sto.load_backward('covid'))[0] == rows[-1]
+
+        # Keyframes are kept for each county every so often
+        with open(sto.name_to_path('covid')) as file:
+            keyframes = sum('"k":' in line for line in file)
+        assert keyframes == 5 * -(-60 // KEYFRAME_INTERVAL)
+
+        plain = JsonLines(namespace)
+        plain.replace('covid', rows)
+        assert sto.data_length('covid') * 1.8 < plain.data_length('covid')
+
+
+def test_dedup_and_removed_fields():
+    with tempfile.TemporaryDirectory() as namespace:
+        sto = JsonDeltas(namespace, OPTIONS)
+        first = [{'county': 'A', 'cases': 1, 'note': 'x'}, {'county': 'B', 'cases': 1}]
+        sto.append('covid', first, ['county'], ['cases'])
+
+        # Unchanged counts aren't stored again, even for other counties
+        second = [{'county': 'B', 'cases': 1}, {'county': 'A', 'cases': 2}]
+        sto.append('covid', second, ['county'], ['cases'])
+        assert list(sto.load('covid')) == first + second[1:]
+
+        with open(sto.name_to_path('covid')) as file:
+            assert file.readlines()[-1].replace(' ', '') == (
+                '{"d":{"cases":2},"g":["A"],"r":["note"]}\n'
+            )
+
+        # Files written with other facets still decode
+        other = JsonDeltas(namespace)
+        assert list(other.load('covid')) == first + second[1:]
+        other.append('covid', [{'county': 'B', 'cases': 3}], [], [])
+        assert list(sto.load('covid'))[-1] == {'county': 'B', 'cases': 3}
+
+        assert os.path.exists(sto.name_to_path('covid'))
+
+
+def test_rows_stored_before_typing_still_match():
+    dataset = AirQuality()
+    typed = [dataset.transformer(row) for row in _readings(range(6))]
+    legacy = [dict(row, utc_timestamp=f'2021-09-13T{hour:02}:00')
+              for hour, row in enumerate(typed[:4])]
+    with tempfile.TemporaryDirectory() as namespace:
+        sto = JsonDeltas(namespace, store_options(dataset))
+        sto.replace('air_quality', legacy)
+        assert sto.append('air_quality', typed[3:], ['site_name'], ['utc_timestamp']).success
+
+        loaded = list(sto.load('air_quality'))
+        assert len(loaded) == 6
+        assert loaded[4:] == typed[4:]
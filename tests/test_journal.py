@@ -0,0 +1,65 @@
+import json
+import os
+import tempfile
+
+from mtdata.__main__ import _main
+from mtdata.journal import Cursor, Journal
+from mtdata.storage import CSVBasic, JsonLines
+
+
+def test_journal_records_appended_rows():
+    with tempfile.TemporaryDirectory() as namespace:
+        journal = Journal(namespace)
+        stores = [JsonLines(namespace), CSVBasic(namespace)]
+        for sto in stores:
+            sto.subscribe(journal)
+            sto.append('data', [{'f': 1, 'a': 1}, {'f': 2, 'a': 1}], ['f'], ['a'])
+            # Only the rows that survive de-duplication are recorded
+            sto.append('data', [{'f': 1, 'a': 1}, {'f': 2, 'a': 2}], ['f'], ['a'])
+            sto.append('data', [{'f': 1, 'a': 1}], ['f'], ['a'])
+
+        entries = list(journal.read())
+        assert [e.sequence for e in entries] == [1, 2, 3, 4, 5, 6]
+        assert [(e.store, e.row) for e in entries[:3]] == [
+            ('json-lines', {'f': 1, 'a': 1}),
+            ('json-lines', {'f': 2, 'a': 1}),
+            ('json-lines', {'f': 2, 'a': 2}),
+        ]
+        assert {e.dataset for e in entries} == {'data'}
+        assert [e.sequence for e in journal.read(after=4)] == [5, 6]
+
+        # Replacing data isn't an append
+        stores[0].replace('data', [{'f': 3, 'a': 3}])
+        assert journal.last_sequence() == 6
+
+
+def test_journal_rotation_and_cursor():
+    with tempfile.TemporaryDirectory() as namespace:
+        journal = Journal(namespace, segment_bytes=100, segment_count=3)
+        for i in range(10):
+            journal.record('json-lines', 'data', [{'i': i}, {'i': i}])
+
+        segments = journal.segments()
+        assert len(segments) == 3
+        first = int(os.path.basename(segments[0]).split('.')[0])
+        assert [e.sequence for e in journal.read()][0] == first
+        assert journal.last_sequence() == 20
+
+        cursor = Cursor(journal, 'reports')
+        assert cursor.position == 0
+        assert [e.sequence for e in cursor.read()][-1] == 20
+        cursor.commit(18)
+        assert [e.sequence for e in Cursor(journal, 'reports').read()] == [19, 20]
+
+
+def test_journal_command(capsys):
+    with tempfile.TemporaryDirectory() as namespace:
+        Journal(namespace).record('csv', 'data', [{'a': 1}, {'a': 2}, {'a': 3}])
+
+        _main(['journal', '-n', namespace, '-c', 'me', '--limit', '2'])
+        lines = capsys.readouterr().out.splitlines()
+        assert [json.loads(line)['row'] for line in lines] == [{'a': 1}, {'a': 2}]
+
+        _main(['journal', '-n', namespace, '-c', 'me'])
+        lines = capsys.readouterr().out.splitlines()
+        assert [json.loads(line)['sequence'] for line in lines] == [3]
@@ -0,0 +1,67 @@
+import os
+import tempfile
+import threading
+import time
+from concurrent.futures import ProcessPoolExecutor
+
+from mtdata.locking import file_lock
+from mtdata.storage import CSVBasic, JsonLines
+
+
+def _append(store_class, namespace, worker):
+    sto = store_class(namespace)
+    for batch in range(10):
+        rows = [{'worker': worker, 'row': batch * 20 + i} for i in range(20)]
+        assert sto.append('data', rows, [], []).success
+
+
+def test_concurrent_appends():
+    with tempfile.TemporaryDirectory() as namespace:
+        for store_class in [JsonLines, CSVBasic]:
+            with ProcessPoolExecutor(max_workers=4) as executor:
+                futures = [
+                    executor.submit(_append, store_class, namespace, worker)
+                    for worker in range(4)
+                ]
+                for future in futures:
+                    future.result()
+
+            rows = list(store_class(namespace).load('data'))
+            assert len(rows) == 800
+            for worker in range(4):
+                numbers = [r['row'] for r in rows if r['worker'] == worker]
+                assert numbers == list(range(200))
+
+
+def test_lock_wait_is_reported():
+    with tempfile.TemporaryDirectory() as namespace:
+        sto = JsonLines(namespace)
+        result = sto.replace('data', [{'a': 1}])
+        assert result.success and result.lock_wait < 0.1
+
+        locked = threading.Event()
+
+        def hold():
+            with file_lock(sto.name_to_path('data')):
+                locked.set()
+                time.sleep(0.3)
+
+        thread = threading.Thread(target=hold)
+        thread.start()
+        locked.wait()
+        result = sto.append('data', [{'a': 2}], [], [])
+        thread.join()
+
+        assert result.success
+        assert result.lock_wait >= 0.2
+        assert [r['a'] for r in sto.load('data')] == [1, 2]
+
+
+def test_replace_leaves_no_temporary_files():
+    with tempfile.TemporaryDirectory() as namespace:
+        for sto in [JsonLines(namespace), CSVBasic(namespace)]:
+            sto.replace('data', [{'a': 1}])
+            sto.replace('data', [{'a': 2}])
+            assert [r['a'] for r in sto.load('data')] == [2]
+
+        assert not [n for n in os.listdir(namespace) if n.endswith('.tmp')]
@@ -0,0 +1,74 @@
+import sys
+
+from mtdata import manifest
+
+
+def test_names_do_not_import():
+    sys.modules.pop('mtdata.datasets.missoula_911', None)
+
+    assert 'missoula_911' in manifest.dataset_names()
+    assert 'json-lines' in manifest.store_names()
+    assert 'mtdata.datasets.missoula_911' not in sys.modules
+
+    dataset = manifest.get_dataset('missoula_911')
+    assert dataset is not None
+    assert dataset.name() == 'missoula_911'
+    assert 'mtdata.datasets.missoula_911' in sys.modules
+
+
+def test_stores_are_not_imported_until_requested():
+    import os
+    import subprocess
+
+    # A fresh interpreter, since other tests have imported the stores
+    run = (
+        'import sys\n'
+        'from mtdata import manifest\n'
+        'manifest.store_names()\n'
+        'print("mtdata.storage" in sys.modules)\n'
+        'manifest.get_store("csv")\n'
+        'print("mtdata.storage" in sys.modules)\n'
+    )
+    root = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+    output = subprocess.run(
+        [sys.executable, '-c', run], check=True, capture_output=True, cwd=root, text=True
+    ).stdout
+    assert output.split() == ['False', 'True']
+
+
+def test_unknown_names():
+    assert manifest.get_dataset('nope') is None
+    assert manifest.get_store('nope') is None
+
+
+def test_entry_point_plugins(monkeypatch):
+    def faux_entry_points(group):
+        if group == manifest.STORES_GROUP:
+            return {
+                'faux': 'mtdata.storage:JsonLines',
+                'csv': 'mtdata.storage:JsonLines',
+            }
+        return {}
+
+    monkeypatch.setattr(manifest, '_entry_points', faux_entry_points)
+    manifest._index.cache_clear()
+    try:
+        assert manifest.store_names() == ['json-lines', 'csv', 'json-chunks', 'json-deltas', 'faux']
+        assert manifest.get_store('faux').name() == 'json-lines'
+        # Built-ins win over plugins with the same name
+        assert manifest.get_store('csv').name() == 'csv'
+    finally:
+        manifest._index.cache_clear()
+
+
+def test_all_compatibility():
+    names = [d.name() for d in manifest.ALL_DATASETS]
+    assert names == manifest.dataset_names()
+
+
+def test_opt_in_stores_are_not_defaults():
+    names = [store.name() for store in manifest.default_stores()]
+    assert 'json-lines' in names
+    for name in ['json-chunks', 'json-deltas']:
+        assert name not in names
+        assert manifest.get_store(name).name() == name
@@ -0,0 +1,126 @@
+import os
+import tempfile
+
+from mtdata.membership import MembershipFilter
+from mtdata.storage import JsonChunks, JsonLines, CSVBasic, StoreOptions
+
+OPTIONS = StoreOptions(membership_fields=('cfs',))
+
+
+def _calls(numbers):
+    return [{'cfs': n, 'title': f'call {n}'} for n in numbers]
+
+
+def test_filter_grows_and_persists():
+    with tempfile.TemporaryDirectory() as directory:
+        path = os.path.join(directory, 'keys.bloom')
+        members = MembershipFilter(path, capacity=100)
+        assert members.covered() is None
+
+        for n in range(1000):
+            members.add(str(n))
+        members.save(1234)
+
+        loaded = MembershipFilter(path, capacity=100)
+        assert loaded.covered() == 1234
+        assert len(loaded) == 1000
+        assert all(str(n) in loaded for n in range(1000))
+
+        false_positives = sum(str(n) in loaded for n in range(1000, 11000))
+        assert false_positives < 200
+
+        # A filter with other parameters isn't used
+        assert MembershipFilter(path, capacity=200).covered() is None
+
+        # The keys behind the filter are kept exactly
+        assert loaded.stored(['1', '999', '1000', 'x']) == {'1', '999'}
+        loaded.add('x')
+        assert loaded.stored(['x']) == {'x'}
+        loaded.reset()
+        assert loaded.stored(['1', 'x']) == set()
+        loaded.save(0)
+        assert MembershipFilter(path, capacity=100).stored(['1']) == set()
+
+
+def test_append_checks_full_history():
+    with tempfile.TemporaryDirectory() as namespace:
+        for store_class in [JsonLines, CSVBasic, JsonChunks]:
+            sto = store_class(namespace, OPTIONS)
+            sto.replace('calls', _calls(range(10)))
+
+            # Old calls that come back out of order aren't stored again,
+            # and neither are repeats within the new data
+            result = sto.append('calls', _calls([3, 10, 0, 11, 10]), [], ['cfs'])
+            assert result.success
+            numbers = [row['cfs'] for row in sto.load('calls')]
+            assert numbers == list(range(12))
+
+            members = sto.membership_filter('calls')
+            assert members.covered() == sto.data_length('calls')
+            assert len(members) == 12
+
+            # Without a filter only the latest row is compared
+            plain = store_class(namespace)
+            plain.append('calls', _calls([5, 12]), [], ['cfs'])
+            numbers = [row['cfs'] for row in plain.load('calls')]
+            assert numbers == list(range(12)) + [5, 12]
+
+            # The filter catches up with rows written without it
+            sto.append('calls', _calls([12, 13]), [], ['cfs'])
+            numbers = [row['cfs'] for row in sto.load('calls')]
+            assert numbers == list(range(12)) + [5, 12, 13]
+
+            # Replacing the data replaces the filter
+            sto.replace('calls', _calls([20]))
+            assert len(sto.membership_filter('calls')) == 1
+            sto.append('calls', _calls([1, 20]), [], ['cfs'])
+            assert [row['cfs'] for row in sto.load('calls')] == [20, 1]
+
+
+def test_repeats_across_batches():
+    options = OPTIONS._replace(batch_rows=2)
+    with tempfile.TemporaryDirectory() as namespace:
+        for store_class in [JsonLines, CSVBasic, JsonChunks]:
+            sto = store_class(namespace, options)
+            sto.replace('calls', _calls([0]))
+
+            # Each repeat is in a later batch than the row it repeats
+            result = sto.append('calls', _calls([1, 2, 3, 1, 4, 2, 0, 5]), [], ['cfs'])
+            assert result.success
+            numbers = [row['cfs'] for row in sto.load('calls')]
+            assert numbers == [0, 1, 2, 3, 4, 5]
+            assert len(sto.membership_filter('calls')) == 6
+
+
+def test_false_positives_dont_scan_the_data(monkeypatch):
+    with tempfile.TemporaryDirectory() as namespace:
+        for store_class in [JsonLines, CSVBasic, JsonChunks]:
+            sto = store_class(namespace, OPTIONS)
+            sto.replace('calls', _calls(range(1000)))
+            length = sto.data_length('calls')
+
+            # Every new key looks like it might have been stored
+            monkeypatch.setattr(MembershipFilter, '__contains__', lambda self, key: True)
+
+            def scan(*args, **kwargs):
+                raise AssertionError('the stored data were scanned')
+
+            reads = []
+            load_offsets = store_class.load_offsets
+
+            def read_offsets(self, name, start=0, fields=None):
+                reads.append(start)
+                return load_offsets(self, name, start, fields)
+
+            monkeypatch.setattr(store_class, 'load', scan)
+            monkeypatch.setattr(store_class, 'load_backward', scan)
+            monkeypatch.setattr(store_class, 'load_offsets', read_offsets)
+
+            result = sto.append('calls', _calls(range(995, 1300)), [], ['cfs'])
+            assert result.success
+            # Only the rows just written are read, to add them to the filter
+            assert reads == [length]
+            monkeypatch.undo()
+
+            numbers = [row['cfs'] for row in sto.load('calls')]
+            assert numbers == list(range(1300))
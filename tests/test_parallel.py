@@ -0,0 +1,93 @@
+import tempfile
+from typing import Iterable
+
+from mtdata.dataset import Dataset, FetchResult
+from mtdata.datasets.air_quality import AirQuality
+from mtdata.parallel import transform_dedup
+from mtdata.registry import store_options
+from mtdata.storage import JsonLines, Storage
+from mtdata.transformer import Transformer
+
+
+class FauxDataset(Dataset):
+    @staticmethod
+    def name() -> str:
+        return 'faux'
+
+    @property
+    def dedup_facets(self) -> Iterable[str]:
+        return ['site']
+
+    @property
+    def dedup_fields(self) -> Iterable[str]:
+        return ['value']
+
+    @property
+    def transformer(self) -> Transformer:
+        return Transformer([('site', 'Site', lambda x: x.lower()), ('value', 'Value')])
+
+    def fetch(self) -> FetchResult:
+        return FetchResult(True, '', [])
+
+
+def fetched():
+    return [
+        {'Site': f'S{i % 7}', 'Value': i // 3, 'Extra': i}
+        for i in range(200)
+    ]
+
+
+def _readings(hours):
+    return [
+        {
+            'AQI': 10 + hour,
+            'AgencyName': 'Montana DEQ',
+            'Category': 1,
+            'FullAQSCode': '300630024',
+            'IntlAQSCode': '840300630024',
+            'Latitude': 46.8751,
+            'Longitude': -113.9955,
+            'Parameter': 'PM2.5',
+            'SiteName': 'Missoula',
+            'UTC': f'2021-09-13T{hour:02}:00',
+            'Unit': 'UG/M3',
+        }
+        for hour in hours
+    ]
+
+
+def test_transform_dedup_matches_serial():
+    with tempfile.TemporaryDirectory() as namespace:
+        sto = JsonLines(namespace)
+        sto.replace('faux', [
+            {'site': f's{i}', 'value': 0}
+            for i in range(5)
+        ])
+
+        dataset = FauxDataset()
+        transformer = dataset.transformer
+        expected = list(Storage.dedup(
+            sto.load_backward('faux'),
+            [transformer(row) for row in fetched()],
+            dataset.dedup_facets,
+            dataset.dedup_fields,
+        ))
+
+        batches = transform_dedup(FauxDataset, fetched(), [sto, sto], 3)
+        assert len(batches) == 2
+        assert batches[0] == expected
+        assert batches[1] == expected
+
+
+def test_transform_dedup_applies_field_types():
+    dataset = AirQuality()
+    typed = [dataset.transformer(row) for row in _readings(range(6))]
+    # Rows stored before the timestamps were typed
+    legacy = [dict(row, utc_timestamp=f'2021-09-13T{hour:02}:00')
+              for hour, row in enumerate(typed[:4])]
+    with tempfile.TemporaryDirectory() as namespace:
+        sto = JsonLines(namespace, store_options(dataset))
+        sto.replace('air_quality', legacy)
+
+        batches = transform_dedup(AirQuality, _readings(range(3, 6)), [sto], 2)
+        assert batches == [typed[4:]]
@@ -0,0 +1,133 @@
+import json
+import os
+import tempfile
+from datetime import datetime
+
+from mtdata.__main__ import _main
+from mtdata.datasets.air_quality import AirQuality
+from mtdata.query import query
+from mtdata.storage import CSVBasic, JsonLines
+
+ROWS = [
+    {
+        'aqi': (hour * 7) % 60,
+        'site_name': ['Missoula', 'Helena', 'Butte'][hour % 3],
+        'utc_timestamp': f'2021-09-13T{hour:02}:00',
+    }
+    for hour in range(24)
+]
+
+
+def test_query():
+    with tempfile.TemporaryDirectory() as namespace:
+        for sto in [JsonLines(namespace), CSVBasic(namespace)]:
+            sto.replace('air_quality', ROWS)
+
+            rows = list(query(
+                sto,
+                AirQuality(),
+                where='site_name == "Missoula" and aqi >= 20',
+                fields=['aqi'],
+                since=datetime(2021, 9, 13, 6),
+                until=datetime(2021, 9, 13, 18),
+            ))
+            assert rows
+            assert all(set(row) == {'aqi'} for row in rows)
+
+            expected = [
+                row for row in ROWS
+                if row['site_name'] == 'Missoula'
+                and row['aqi'] >= 20
+                and '2021-09-13T06:00' <= row['utc_timestamp'] <= '2021-09-13T18:00'
+            ]
+            assert [r['aqi'] for r in rows] == [r['aqi'] for r in expected]
+
+            rows = list(query(sto, AirQuality(), limit=2))
+            assert len(rows) == 2
+
+
+def test_load_range_bisects():
+    with tempfile.TemporaryDirectory() as namespace:
+        sto = JsonLines(namespace)
+        sto.replace('air_quality', ROWS)
+
+        rows = list(sto.load_range(
+            'air_quality',
+            'utc_timestamp',
+            datetime.fromisoformat,
+            since=datetime(2021, 9, 13, 20),
+        ))
+        assert rows == ROWS[20:]
+
+        rows = list(sto.load_range(
+            'air_quality',
+            'utc_timestamp',
+            datetime.fromisoformat,
+            since=datetime(2021, 9, 14),
+        ))
+        assert rows == []
+
+
+def test_query_command(capsys):
+    with tempfile.TemporaryDirectory() as namespace:
+        JsonLines(namespace).replace('air_quality', ROWS)
+
+        _main([
+            'query',
+            '-d', 'air_quality',
+            '-n', namespace,
+            '--where', 'site_name == "Helena"',
+            '--fields', 'utc_timestamp',
+            '--since', '2021-09-13T12:00',
+        ])
+        lines = capsys.readouterr().out.splitlines()
+        assert [json.loads(line) for line in lines] == [
+            {'utc_timestamp': f'2021-09-13T{hour:02}:00'}
+            for hour in [13, 16, 19, 22]
+        ]
+
+
+def test_query_near_command(capsys):
+    sites = {'Missoula': (46.87, -113.99), 'Helena': (46.59, -112.04)}
+    rows = [
+        dict(row, latitude=sites.get(row['site_name'], (46.0, -112.5))[0],
+             longitude=sites.get(row['site_name'], (46.0, -112.5))[1])
+        for row in ROWS
+    ]
+
+    with tempfile.TemporaryDirectory() as namespace:
+        JsonLines(namespace).replace('air_quality', rows)
+
+        _main([
+            'query',
+            '-d', 'air_quality',
+            '-n', namespace,
+            '--near', '46.88,-114.0,5',
+            '--since', '2021-09-13T12:00',
+            '--fields', 'site_name,utc_timestamp',
+        ])
+        lines = capsys.readouterr().out.splitlines()
+        assert [json.loads(line) for line in lines] == [
+            {'site_name': 'Missoula', 'utc_timestamp': f'2021-09-13T{hour:02}:00'}
+            for hour in [12, 15, 18, 21]
+        ]
+        # The query didn't write a spatial index
+        assert not any(name.endswith('.grid') for name in os.listdir(namespace))
+
+
+def test_query_command_applies_field_types(capsys):
+    with tempfile.TemporaryDirectory() as namespace:
+        CSVBasic(namespace).replace('air_quality', ROWS)
+
+        _main([
+            'query',
+            '-d', 'air_quality',
+            '-n', namespace,
+            '--store', 'csv',
+            '--fields', 'utc_timestamp',
+            '--limit', '2',
+        ])
+        lines = capsys.readouterr().out.splitlines()
+        assert [json.loads(line) for line in lines] == [
+            {'utc_timestamp': 1631491200}, {'utc_timestamp': 1631494800}
+        ]
@@ -0,0 +1,357 @@
+import os
+import tempfile
+from typing import Iterable
+
+import pytest
+
+from mtdata.dataset import Dataset, FetchResult
+from mtdata.registry import Registry
+from mtdata.storage import CSVBasic, JsonLines, StoreResult
+from mtdata.transformer import Transformer
+
+
+class FauxDataset(Dataset):
+    payloads = []
+    fetches = 0
+
+    @staticmethod
+    def name() -> str:
+        return 'faux'
+
+    @property
+    def dedup_facets(self) -> Iterable[str]:
+        return ['site']
+
+    @property
+    def dedup_fields(self) -> Iterable[str]:
+        return ['value']
+
+    @property
+    def transformer(self) -> Transformer:
+        return Transformer([('site', 'Site'), ('value', 'Value')])
+
+    def fetch(self) -> FetchResult:
+        import json
+
+        FauxDataset.fetches += 1
+        raw = FauxDataset.payloads.pop(0)
+        return FetchResult(True, '', json.loads(raw), raw)
+
+
+def test_unchanged_payload_is_skipped():
+    import os
+
+    with tempfile.TemporaryDirectory() as namespace:
+        path = os.path.join(namespace, 'faux.lines.json')
+        FauxDataset.payloads = [
+            b'[{"Site": "a", "Value": 1}, {"Site": "b", "Value": 2}]',
+            b'[{"Site": "a", "Value": 1}, {"Site": "b", "Value": 2}]',
+            b'[{"Site": "a", "Value": 3}, {"Site": "b", "Value": 2}]',
+        ]
+        registry = Registry([(FauxDataset, [JsonLines])])
+
+        results = list(registry.update(namespace))
+        assert results[0].success
+        assert not results[0].unchanged
+        with open(path, 'r') as file:
+            assert len(list(file)) == 2
+
+        os.remove(path)
+        results = list(registry.update(namespace))
+        assert results[0].success
+        assert results[0].unchanged
+        assert not os.path.exists(path)
+
+        results = list(registry.update(namespace))
+        assert results[0].success
+        assert not results[0].unchanged
+        with open(path, 'r') as file:
+            assert len(list(file)) == 2
+
+        assert FauxDataset.fetches == 3
+
+
+def test_unchanged_payload_is_given_to_other_stores():
+    with tempfile.TemporaryDirectory() as namespace:
+        payload = b'[{"Site": "a", "Value": 1}, {"Site": "b", "Value": 2}]'
+        FauxDataset.payloads = [payload, payload, payload]
+
+        # As if run with -s json-lines, then -s csv
+        list(Registry([(FauxDataset, [JsonLines])]).update(namespace))
+        results = list(Registry([(FauxDataset, [CSVBasic])]).update(namespace))
+        assert results[0].success and not results[0].unchanged
+        assert len(list(CSVBasic(namespace).load('faux'))) == 2
+
+        # Both stores have it now
+        registry = Registry([(FauxDataset, [JsonLines, CSVBasic])])
+        results = list(registry.update(namespace))
+        assert results[0].unchanged
+        assert len(list(JsonLines(namespace).load('faux'))) == 2
+
+
+def test_unchanged_payload_is_stored_when_forced():
+    import os
+
+    with tempfile.TemporaryDirectory() as namespace:
+        path = os.path.join(namespace, 'faux.lines.json')
+        FauxDataset.payloads = [
+            b'[{"Site": "a", "Value": 1}]',
+            b'[{"Site": "a", "Value": 1}]',
+        ]
+        registry = Registry([(FauxDataset, [JsonLines])], skip_unchanged=False)
+
+        list(registry.update(namespace))
+        os.remove(path)
+        results = list(registry.update(namespace))
+        assert not results[0].unchanged
+        with open(path, 'r') as file:
+            assert len(list(file)) == 1
+
+
+def test_journal():
+    from mtdata.journal import Journal
+
+    with tempfile.TemporaryDirectory() as namespace:
+        FauxDataset.payloads = [
+            b'[{"Site": "a", "Value": 1}, {"Site": "b", "Value": 2}]',
+            b'[{"Site": "a", "Value": 3}, {"Site": "b", "Value": 2}]',
+        ]
+        registry = Registry([(FauxDataset, [JsonLines])], journal=True)
+        list(registry.update(namespace))
+        list(registry.update(namespace))
+
+        entries = list(Journal(namespace).read())
+        assert [(e.sequence, e.dataset, e.row) for e in entries] == [
+            (1, 'faux', {'site': 'a', 'value': 1}),
+            (2, 'faux', {'site': 'b', 'value': 2}),
+            (3, 'faux', {'site': 'a', 'value': 3}),
+        ]
+
+
+class FlakyStore(CSVBasic):
+    broken = True
+
+    @staticmethod
+    def name() -> str:
+        return 'flaky'
+
+    def append(self, name, data, dedup_facets, dedup_fields):
+        if FlakyStore.broken:
+            return StoreResult(success=False, message='unavailable')
+        return super().append(name, data, dedup_facets, dedup_fields)
+
+
+class RaisingStore(CSVBasic):
+    broken = True
+
+    @staticmethod
+    def name() -> str:
+        return 'raising'
+
+    def append(self, name, data, dedup_facets, dedup_fields):
+        if RaisingStore.broken:
+            raise OSError('disk full')
+        return super().append(name, data, dedup_facets, dedup_fields)
+
+
+def test_failed_stores_are_retried_from_spool():
+    import os
+
+    from mtdata.spool import Spool
+
+    with tempfile.TemporaryDirectory() as namespace:
+        payload = b'[{"Site": "a", "Value": 1}, {"Site": "b", "Value": 2}]'
+        FauxDataset.payloads = [payload]
+        FauxDataset.fetches = 0
+        FlakyStore.broken = True
+        registry = Registry([(FauxDataset, [JsonLines, FlakyStore])])
+
+        results = list(registry.update(namespace))
+        assert not results[0].success
+        spool = Spool(namespace)
+        batches = spool.batches('faux')
+        assert [batch.stores for batch in batches] == [['flaky']]
+        assert len(list(spool.rows(batches[0]))) == 2
+
+        # Still broken, the rows stay spooled
+        results = list(registry.retry_spool(namespace))
+        assert results[0].spooled and not results[0].success
+        assert len(spool.batches('faux')) == 1
+
+        lines_path = JsonLines(namespace).name_to_path('faux')
+        modified = os.stat(lines_path).st_mtime_ns
+        FlakyStore.broken = False
+        results = list(registry.retry_spool(namespace))
+        assert results[0].success
+        assert [r.success for r in results[0].store_results] == [True]
+        assert spool.batches() == []
+        assert FauxDataset.fetches == 1
+        assert len(list(FlakyStore(namespace).load('faux'))) == 2
+        # The store that succeeded the first time wasn't written again
+        assert os.stat(lines_path).st_mtime_ns == modified
+
+        # The retry saved the fingerprint, so the same payload is skipped
+        FauxDataset.payloads = [payload]
+        results = list(registry.update(namespace))
+        assert results[0].unchanged
+
+
+def test_stores_that_raise_are_retried_from_spool():
+    from mtdata.spool import Spool
+
+    with tempfile.TemporaryDirectory() as namespace:
+        FauxDataset.payloads = [
+            b'[{"Site": "a", "Value": 1}]',
+            b'[{"Site": "a", "Value": 2}]',
+        ]
+        RaisingStore.broken = True
+        registry = Registry([(FauxDataset, [RaisingStore, JsonLines])])
+
+        # The store after the one that raised still gets the rows
+        results = list(registry.update(namespace))
+        assert not results[0].success
+        assert [r.message for r in results[0].store_results] == ['raising: disk full', '']
+        assert len(list(JsonLines(namespace).load('faux'))) == 1
+        assert [b.stores for b in Spool(namespace).batches('faux')] == [['raising']]
+
+        # Retrying a batch that still raises doesn't stop the update
+        results = list(registry.update(namespace))
+        assert [(r.spooled, r.success) for r in results] == [(True, False), (False, False)]
+        assert len(list(JsonLines(namespace).load('faux'))) == 2
+
+        RaisingStore.broken = False
+        results = list(registry.retry_spool(namespace))
+        assert all(r.success for r in results)
+        assert Spool(namespace).batches() == []
+        values = [row['value'] for row in RaisingStore(namespace).load('faux')]
+        assert values == [1, 2]
+
+
+def test_next_update_retries_spool_first():
+    with tempfile.TemporaryDirectory() as namespace:
+        FauxDataset.payloads = [
+            b'[{"Site": "a", "Value": 1}]',
+            b'[{"Site": "a", "Value": 2}]',
+        ]
+        FlakyStore.broken = True
+        registry = Registry([(FauxDataset, [FlakyStore])])
+        list(registry.update(namespace))
+
+        FlakyStore.broken = False
+        results = list(registry.update(namespace))
+        assert [r.spooled for r in results] == [True, False]
+        assert all(r.success for r in results)
+        values = [row['value'] for row in FlakyStore(namespace).load('faux')]
+        assert values == [1, 2]
+
+
+def test_one_fetch_fans_out_to_every_namespace():
+    with tempfile.TemporaryDirectory() as public:
+        with tempfile.TemporaryDirectory() as archive:
+            FauxDataset.payloads = [b'[{"Site": "a", "Value": 1}]']
+            FauxDataset.fetches = 0
+            list(Registry([(FauxDataset, [JsonLines])]).update(archive))
+
+            FauxDataset.payloads = [
+                b'[{"Site": "a", "Value": 1}, {"Site": "b", "Value": 2}]',
+                b'[{"Site": "a", "Value": 1}, {"Site": "b", "Value": 2}]',
+            ]
+            registry = Registry([(FauxDataset, [JsonLines, CSVBasic])])
+            results = list(registry.update([public, archive]))
+            assert FauxDataset.fetches == 2
+            assert [r.namespace for r in results] == [public, archive]
+            assert all(r.success and not r.unchanged for r in results)
+
+            # Each namespace is de-duplicated against its own data, the
+            # archive already had the first row
+            for store_class in [JsonLines, CSVBasic]:
+                assert len(list(store_class(public).load('faux'))) == 2
+            assert len(list(JsonLines(archive).load('faux'))) == 2
+            assert len(list(CSVBasic(archive).load('faux'))) == 2
+
+            # And keeps its own fingerprint
+            results = list(registry.update([public, archive]))
+            assert FauxDataset.fetches == 3
+            assert [r.unchanged for r in results] == [True, True]
+
+
+_STREAMING_RUN = '''
+import resource, sys, tempfile
+from mtdata.dataset import Dataset, FetchResult
+from mtdata.registry import Registry
+from mtdata.storage import CSVBasic, JsonLines
+from mtdata.transformer import Transformer
+
+ROWS = int(sys.argv[1])
+
+
+class Synthetic(Dataset):
+    @staticmethod
+    def name():
+        return 'synthetic'
+
+    @property
+    def dedup_facets(self):
+        return ['site']
+
+    @property
+    def dedup_fields(self):
+        return ['value']
+
+    @property
+    def transformer(self):
+        return Transformer([('site', 'Site'), ('value', 'Value')])
+
+    def fetch(self):
+        rows = ({'Site': f's{i % 100}', 'Value': i} for i in range(ROWS))
+        return FetchResult(True, '', rows)
+
+
+with tempfile.TemporaryDirectory() as namespace:
+    for store in [JsonLines(namespace), CSVBasic(namespace)]:
+        store.replace('synthetic', [{'site': 's0', 'value': -1}])
+    registry = Registry(
+        [(Synthetic, [JsonLines, CSVBasic])], spool=False, batch_rows=5000
+    )
+    assert all(result.success for result in registry.update(namespace))
+    assert sum(1 for _ in JsonLines(namespace).load('synthetic')) == ROWS + 1
+print(resource.getrusage(resource.RUSAGE_SELF).ru_maxrss)
+'''
+
+
+def _peak_growth(small, large):
+    import subprocess
+    import sys
+
+    pytest.importorskip('resource')
+
+    root = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+    def peak(count):
+        output = subprocess.run(
+            [sys.executable, '-c', _STREAMING_RUN, str(count)],
+            check=True,
+            capture_output=True,
+            cwd=root,
+            text=True,
+        ).stdout
+        return int(output.split()[-1])
+
+    # Kilobytes on Linux, bytes on macOS
+    scale = 1 if sys.platform.startswith('linux') else 1024
+    return (peak(large) - peak(small)) / scale
+
+
+def test_memory_does_not_grow_with_fetch_size():
+    # Holding the extra 40k rows would take more than 10 MiB
+    assert _peak_growth(10_000, 50_000) < 8 * 1024
+
+
+@pytest.mark.skipif(
+    'MTDATA_MEMORY_TEST_ROWS' not in os.environ,
+    reason='set MTDATA_MEMORY_TEST_ROWS to run a large fetch',
+)
+def test_memory_does_not_grow_with_large_fetch():
+    # 10M rows takes a few minutes
+    rows = int(os.environ['MTDATA_MEMORY_TEST_ROWS'])
+    assert _peak_growth(1000, rows) < 30 * 1024
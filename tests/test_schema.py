@@ -0,0 +1,98 @@
+import tempfile
+from datetime import datetime
+
+from mtdata.datasets.air_quality import AirQuality
+from mtdata.datasets.missoula_911 import Missoula911
+from mtdata.registry import store_options
+from mtdata.storage import JsonChunks, JsonLines, CSVBasic
+
+
+def _readings(hours):
+    return [
+        {
+            'AQI': 10 + hour,
+            'AgencyName': 'Montana DEQ',
+            'Category': 1,
+            'FullAQSCode': '300630024',
+            'IntlAQSCode': '840300630024',
+            'Latitude': 46.8751,
+            'Longitude': -113.9955,
+            'Parameter': 'PM2.5',
+            'SiteName': 'Missoula',
+            'UTC': f'2021-09-13T{hour:02}:00',
+            'Unit': 'UG/M3',
+        }
+        for hour in hours
+    ]
+
+
+def test_transform_declares_types():
+    dataset = AirQuality()
+    row = dataset.transformer(_readings([2])[0])
+    assert row['utc_timestamp'] == 1631498400
+    assert row['aqi'] == 12
+    assert dataset.parse_time(row['utc_timestamp']) == datetime(2021, 9, 13, 2, 0)
+
+    calls = Missoula911()
+    call = calls.transformer({
+        'Agency': 'MPD',
+        'CFSNumber': 'A1',
+        'Latitude': '46.87',
+        'Longitude': '-113.99',
+        'Description': '9/13/2021 2:00:00 AM / Traffic',
+        'Title': 'Traffic',
+    })
+    assert call['timestamp'] == 1631498400
+    assert call['latitude'] == 46.87
+    assert calls.parse_time('9/13/2021 2:00:00 AM') == datetime(2021, 9, 13, 2, 0)
+
+
+def test_stores_round_trip_typed_values():
+    dataset = AirQuality()
+    rows = [dataset.transformer(row) for row in _readings(range(6))]
+    options = store_options(dataset)
+    with tempfile.TemporaryDirectory() as namespace:
+        for store_class in [JsonLines, CSVBasic, JsonChunks]:
+            sto = store_class(namespace, options)
+            sto.replace('air_quality', rows[:3])
+            sto.append('air_quality', rows[2:], ['site_name'], ['utc_timestamp'])
+
+            loaded = list(sto.load('air_quality'))
+            assert loaded == rows
+            assert type(loaded[0]['aqi']) is int
+            assert type(loaded[0]['utc_timestamp']) is int
+
+            fields = ['utc_timestamp']
+            assert list(sto.load_backward('air_quality', fields=fields)) == [
+                {'utc_timestamp': row['utc_timestamp']} for row in reversed(rows)
+            ]
+            assert list(sto.load('air_quality', workers=2)) == rows
+
+
+def test_rows_stored_before_typing_still_match():
+    dataset = AirQuality()
+    typed = [dataset.transformer(row) for row in _readings(range(6))]
+    # What the transformer produced before the fields were typed
+    legacy = [dict(row, utc_timestamp=f'2021-09-13T{hour:02}:00')
+              for hour, row in enumerate(typed[:4])]
+    options = store_options(dataset)
+    with tempfile.TemporaryDirectory() as namespace:
+        for store_class in [JsonLines, CSVBasic, JsonChunks]:
+            sto = store_class(namespace, options)
+            sto.replace('air_quality', legacy)
+            sto.append('air_quality', typed[3:], ['site_name'], ['utc_timestamp'])
+
+            loaded = list(sto.load('air_quality'))
+            assert len(loaded) == 6
+            assert loaded[4:] == typed[4:]
+
+            # Time ranges span both kinds of value
+            in_range = sto.load_range(
+                'air_quality',
+                'utc_timestamp',
+                dataset.parse_time,
+                datetime(2021, 9, 13, 2),
+                datetime(2021, 9, 13, 4),
+                fields=['aqi'],
+            )
+            assert [row['aqi'] for row in in_range] == [12, 13, 14]
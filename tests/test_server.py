@@ -0,0 +1,120 @@
+import gzip
+import json
+import tempfile
+import threading
+from http.client import HTTPConnection
+
+from mtdata import server
+from mtdata.server import DataService, make_server
+from mtdata.storage import CSVBasic, JsonLines
+
+ROWS = [
+    {
+        'aqi': hour,
+        'site_name': ['Missoula', 'Helena'][hour % 2],
+        'utc_timestamp': 1631491200 + 3600 * hour,
+    }
+    for hour in range(24)
+]
+
+
+def _get(address, path, headers=None):
+    connection = HTTPConnection(*address)
+    connection.request('GET', path, headers=headers or {})
+    response = connection.getresponse()
+    body = response.read()
+    connection.close()
+    if response.getheader('Content-Encoding') == 'gzip':
+        body = gzip.decompress(body)
+    return response, [json.loads(line) for line in body.splitlines()]
+
+
+def test_serve_data():
+    with tempfile.TemporaryDirectory() as namespace:
+        store = JsonLines(namespace)
+        store.replace('air_quality', ROWS)
+
+        httpd = make_server(store, port=0)
+        thread = threading.Thread(target=httpd.serve_forever)
+        thread.start()
+        try:
+            address = httpd.server_address[:2]
+
+            response, rows = _get(address, '/datasets/air_quality')
+            assert response.status == 200
+            assert response.getheader('Transfer-Encoding') == 'chunked'
+            assert rows == ROWS
+
+            response, rows = _get(
+                address,
+                '/datasets/air_quality?since=2021-09-13T20:00&fields=aqi&limit=3',
+                {'Accept-Encoding': 'gzip'},
+            )
+            assert response.getheader('Content-Encoding') == 'gzip'
+            assert rows == [{'aqi': 20}, {'aqi': 21}, {'aqi': 22}]
+
+            etag = response.getheader('ETag')
+            response, _ = _get(
+                address,
+                '/datasets/air_quality',
+                {'Accept-Encoding': 'gzip', 'If-None-Match': etag},
+            )
+            assert response.status == 304
+
+            store.append('air_quality', [dict(ROWS[-1], aqi=99)], [], [])
+            response, rows = _get(
+                address,
+                '/datasets/air_quality?since=2021-09-13T23:00',
+                {'If-None-Match': etag},
+            )
+            assert response.status == 200
+            assert [row['aqi'] for row in rows] == [23, 99]
+
+            assert _get(address, '/datasets/missing')[0].status == 404
+            assert _get(address, '/datasets/air_quality?limit=x')[0].status == 400
+        finally:
+            httpd.shutdown()
+            httpd.server_close()
+            thread.join()
+
+
+def test_offset_index(monkeypatch):
+    from mtdata.datasets.air_quality import AirQuality
+    from datetime import datetime
+
+    monkeypatch.setattr(server, 'INDEX_STRIDE', 5)
+
+    with tempfile.TemporaryDirectory() as namespace:
+        for store in [JsonLines(namespace), CSVBasic(namespace)]:
+            store.replace('air_quality', ROWS[:12])
+            service = DataService(store)
+            index = service.index(AirQuality())
+            assert len(index.offsets) == 3
+
+            # Appending only indexes the new rows
+            store.append('air_quality', ROWS[12:], [], [])
+            index = service.index(AirQuality())
+            assert len(index.offsets) == 5
+            assert index.length == store.data_length('air_quality')
+
+            since = datetime(2021, 9, 13, 17)
+            rows = list(service.rows(AirQuality(), since=since))
+            assert rows == ROWS[17:]
+
+            # Replacing the data rebuilds the index
+            store.replace('air_quality', ROWS[10:])
+            index = service.index(AirQuality())
+            assert index.times[0] == datetime(2021, 9, 13, 10)
+            assert list(service.rows(AirQuality(), since=since)) == ROWS[17:]
+
+
+def test_rows_are_served_with_field_types():
+    from mtdata.datasets.air_quality import AirQuality
+
+    # Rows stored before the timestamps were typed
+    legacy = [dict(row, utc_timestamp=f'2021-09-13T{h:02}:00') for h, row in enumerate(ROWS)]
+    with tempfile.TemporaryDirectory() as namespace:
+        store = CSVBasic(namespace)
+        store.replace('air_quality', legacy)
+        service = DataService(store)
+        assert list(service.rows(AirQuality())) == ROWS
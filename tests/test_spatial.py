@@ -0,0 +1,102 @@
+import os
+import tempfile
+
+from mtdata.spatial import BoundingBox, GridIndex, bounding_box, distance_km
+from mtdata.storage import JsonChunks, JsonLines, CSVBasic, StoreOptions
+
+MISSOULA = (46.87, -113.99)
+
+OPTIONS = StoreOptions(spatial_fields=('latitude', 'longitude'))
+
+
+def _rows(start, count):
+    # A diagonal line of points heading north-east from Missoula, about
+    # 1.3 km apart, with a note that spans lines every so often
+    return [
+        {
+            'id': i,
+            'latitude': MISSOULA[0] + i * 0.01,
+            'longitude': MISSOULA[1] + i * 0.01,
+            'note': f'call\n{i}' if i % 3 == 0 else 'call',
+        }
+        for i in range(start, start + count)
+    ]
+
+
+def test_load_within_and_near():
+    with tempfile.TemporaryDirectory() as namespace:
+        for store_class in [JsonLines, CSVBasic, JsonChunks]:
+            sto = store_class(namespace, OPTIONS)
+            sto.replace('calls', _rows(0, 50))
+            assert sto.append('calls', _rows(50, 50), [], []).success
+
+            index = sto.spatial_index('calls')
+            assert os.path.exists(index.path)
+            assert index.covered() == sto.data_length('calls')
+
+            box = BoundingBox(46.895, -114.0, 46.925, -113.9)
+            data = list(sto.load_within('calls', box))
+            assert [d['id'] for d in data] == [3, 4, 5]
+            assert data[0]['note'] == 'call\n3'
+
+            data = list(sto.load_within('calls', box, fields=['id']))
+            assert data[0] == {'id': 3, 'latitude': 46.9, 'longitude': -113.96}
+
+            data = list(sto.load_near('calls', *MISSOULA, 2))
+            assert [d['id'] for d in data] == [0, 1]
+
+            # Rows far outside the index are found, using the indexed cells
+            data = list(sto.load_within('calls', BoundingBox(47.8, -114, 48, 0)))
+            assert [d['id'] for d in data] == list(range(93, 100))
+
+            # Replacing the data replaces the index
+            sto.replace('calls', _rows(90, 1))
+            assert [d['id'] for d in sto.load_within('calls', box)] == []
+            assert len(index.read()[0]) == 1
+
+
+def test_index_catches_up():
+    with tempfile.TemporaryDirectory() as namespace:
+        JsonLines(namespace).replace('calls', _rows(0, 10))
+
+        # Queries only read the index, rows written without it are
+        # checked one by one until it is updated
+        sto = JsonLines(namespace, OPTIONS)
+        index = sto.spatial_index('calls')
+        box = bounding_box(*MISSOULA, 10)
+        assert len(list(sto.load_within('calls', box))) == 9
+        assert not os.path.exists(index.path)
+
+        sto.update_spatial_index('calls')
+        JsonLines(namespace).append('calls', _rows(10, 5), [], [])
+        assert index.covered() < sto.data_length('calls')
+        assert len(list(sto.load_within('calls', box))) == 9
+        box = bounding_box(MISSOULA[0] + 0.12, MISSOULA[1] + 0.12, 1)
+        assert [d['id'] for d in sto.load_within('calls', box)] == [12]
+
+        # An index left from data that were since replaced isn't used
+        JsonLines(namespace).replace('calls', _rows(12, 1))
+        assert [d['id'] for d in sto.load_within('calls', box)] == [12]
+
+        # Without spatial fields the store falls back to a full scan
+        assert JsonLines(namespace).spatial_index('calls') is None
+
+
+def test_grid_index_size_change():
+    with tempfile.TemporaryDirectory() as namespace:
+        path = os.path.join(namespace, 'grid')
+        GridIndex(path, 0.05).extend([(0, {'a': 1, 'b': 1})], ('a', 'b'), 10)
+        assert GridIndex(path, 0.05).covered() is None
+
+        index = GridIndex(path, 0.05)
+        index.reset()
+        index.extend([(0, {'a': 1, 'b': 1}), (5, {'a': 'x'})], ('a', 'b'), 10)
+        assert index.read() == ({'20:20': [0]}, 10)
+        assert index.covered() == 10
+        assert GridIndex(path, 0.1).covered() is None
+
+
+def test_distance():
+    assert distance_km(*MISSOULA, *MISSOULA) == 0
+    box = bounding_box(*MISSOULA, 2)
+    assert round(distance_km(box.south, MISSOULA[1], *MISSOULA), 6) == 2
@@ -0,0 +1,99 @@
+import json
+import tempfile
+import threading
+from http.client import HTTPConnection
+
+import pytest
+
+from mtdata.source import REPLAY_ENV, load_recording, save_recording
+from mtdata.standin import StandInOptions, make_standin_server
+
+_READING = {
+    'AgencyName': 'Montana DEQ',
+    'Category': 1,
+    'FullAQSCode': '300630024',
+    'IntlAQSCode': '840300630024',
+    'Latitude': 46.8,
+    'Longitude': -114.0,
+    'Parameter': 'PM2.5',
+    'UTC': '2021-09-13T01:00',
+    'Unit': 'UG/M3',
+}
+READINGS = [
+    dict(_READING, SiteName='Missoula', AQI=10),
+    dict(_READING, SiteName='Helena', AQI=20),
+]
+
+
+class _Running:
+    def __init__(self, directory, options):
+        self.httpd = make_standin_server(directory, port=0, options=options)
+        self.thread = threading.Thread(target=self.httpd.serve_forever)
+
+    def __enter__(self):
+        self.thread.start()
+        return f'http://127.0.0.1:{self.httpd.server_port}'
+
+    def __exit__(self, *exc):
+        self.httpd.shutdown()
+        self.httpd.server_close()
+        self.thread.join()
+
+
+def _get(url, path):
+    connection = HTTPConnection(url.split('//')[1])
+    connection.request('GET', path)
+    response = connection.getresponse()
+    body = json.loads(response.read())
+    connection.close()
+    return response.status, body
+
+
+def test_scaled_payloads_and_failures():
+    with tempfile.TemporaryDirectory() as directory:
+        save_recording(directory, 'air_quality', json.dumps(READINGS).encode())
+        save_recording(
+            directory,
+            'mt_covid_counts',
+            json.dumps({'features': [{'attributes': {'NAMELABEL': 'Ravalli'}}]}).encode(),
+        )
+
+        with _Running(directory, StandInOptions(scale=3)) as url:
+            status, body = _get(url, '/sources/air_quality')
+            assert status == 200
+            assert len(body) == 6
+            assert len({row['SiteName'] for row in body}) == 6
+            assert {row['UTC'] for row in body} == {'2021-09-13T01:00'}
+
+            status, body = _get(url, '/sources/mt_covid_counts')
+            names = [f['attributes']['NAMELABEL'] for f in body['features']]
+            assert names == ['Ravalli', 'Ravalli #1', 'Ravalli #2']
+
+            status, _ = _get(url, '/sources/missoula_911')
+            assert status == 404
+
+        with _Running(directory, StandInOptions(failure_rate=1.0)) as url:
+            status, body = _get(url, '/sources/air_quality')
+            assert status == 503
+            assert body == {'error': 'injected failure'}
+
+
+def test_record_and_replay(monkeypatch):
+    pytest.importorskip('requests')
+    from mtdata.registry import Registry
+    from mtdata.datasets.air_quality import AirQuality
+    from mtdata.source import RECORD_ENV
+    from mtdata.storage import JsonLines
+
+    with tempfile.TemporaryDirectory() as directory:
+        save_recording(directory, 'air_quality', json.dumps(READINGS).encode())
+        with tempfile.TemporaryDirectory() as namespace:
+            with _Running(directory, StandInOptions(scale=5)) as url:
+                monkeypatch.setenv(REPLAY_ENV, url)
+                monkeypatch.setenv(RECORD_ENV, namespace)
+                results = list(Registry([(AirQuality, [JsonLines])]).update(namespace))
+
+            assert results[0].success
+            assert len(list(JsonLines(namespace).load('air_quality'))) == 10
+            # What was replayed was recorded again, scaled up
+            assert len(json.loads(load_recording(namespace, 'air_quality'))) == 10
@@ -1,6 +1,6 @@
 import tempfile
 
-from mtdata.storage import JsonLines, CSVBasic
+from mtdata.storage import JsonChunks, JsonLines, CSVBasic, StoreOptions
 
 DATA = [
     {
@@ -120,3 +120,170 @@ def test_csv_storage():
 
     data = list(sto.load(name))
     assert len(data) == 3
+
+
+def test_parallel_load():
+    rows = [
+        {'a': i, 'b': f'line\n{i}' if i % 5 == 0 else 'x'}
+        for i in range(100)
+    ]
+
+    with tempfile.TemporaryDirectory() as namespace:
+        for sto in [JsonLines(namespace), CSVBasic(namespace)]:
+            sto.replace('data', rows)
+
+            data = list(sto.load('data', workers=3))
+            assert [d['a'] for d in data] == list(range(100))
+            assert data[10]['b'] == 'line\n10'
+
+            data = list(sto.load('data', workers=3, ordered=False))
+            assert sorted(d['a'] for d in data) == list(range(100))
+
+        assert list(JsonLines(namespace).load('missing', workers=2)) == []
+        assert list(CSVBasic(namespace).load('missing', workers=2)) == []
+
+
+def test_projected_load():
+    with tempfile.TemporaryDirectory() as namespace:
+        for sto in [JsonLines(namespace), CSVBasic(namespace)]:
+            sto.replace('data', DATA)
+
+            data = list(sto.load('data', fields=['b', 'a']))
+            assert data == [
+                {'b': 2, 'a': 1},
+                {'b': 20, 'a': 10},
+                {'b': 200, 'a': 100},
+            ]
+
+            data = list(sto.load('data', workers=2, fields=['c']))
+            assert data == [{'c': 3}, {'c': 30}, {'c': 300}]
+
+            data = list(sto.load_backward('data', fields=['a', 'missing']))
+            assert data == [{'a': 100}, {'a': 10}, {'a': 1}]
+
+            data = list(sto.load_backward('data'))
+            assert data == list(reversed(DATA))
+
+
+def test_csv_multiline_and_column_order():
+    with tempfile.TemporaryDirectory() as namespace:
+        sto = CSVBasic(namespace)
+        sto.replace('data', [
+            {'site': 'a', 'note': 'first\nline', 'value': 1},
+            {'site': 'b', 'note': 'x', 'value': 2},
+        ])
+
+        data = list(sto.load_backward('data'))
+        assert data == [
+            {'site': 'b', 'note': 'x', 'value': 2},
+            {'site': 'a', 'note': 'first\nline', 'value': 1},
+        ]
+
+        # Keys in a different order are still written in header order
+        result = sto.append('data', [
+            {'value': 1, 'note': 'dup', 'site': 'a'},
+            {'value': 3, 'note': 'multi\n"quoted"\nline', 'site': 'a'},
+        ], ['site'], ['value'])
+        assert result.success
+
+        data = list(sto.load('data'))
+        assert len(data) == 3
+        assert data[2] == {'site': 'a', 'note': 'multi\n"quoted"\nline', 'value': 3}
+
+        data = list(sto.load_backward('data', fields=['note']))
+        assert data[0] == {'note': 'multi\n"quoted"\nline'}
+
+        result = sto.append('data', [{'site': 'c', 'value': 4, 'extra': 1}], [], [])
+        assert not result.success
+        assert 'extra' in result.message
+        assert len(list(sto.load('data'))) == 3
+
+
+def test_batched_writes(monkeypatch):
+    import pytest
+
+    from mtdata import codec, storage
+
+    options = StoreOptions(batch_rows=2)
+    rows = [{'b': i, 'a': f'café {i}', 'c': None} for i in range(5)]
+
+    written = []
+    for encoder in ['encode_json_rows', 'encode_csv_rows']:
+        encode = getattr(storage, encoder)
+
+        def counting(batch, *args, encode=encode):
+            written.append(len(batch))
+            return encode(batch, *args)
+
+        monkeypatch.setattr(storage, encoder, counting)
+
+    for fast in [True, False]:
+        if not fast:
+            monkeypatch.setattr(codec, '_orjson', lambda: None)
+
+        with tempfile.TemporaryDirectory() as namespace:
+            for sto in [JsonLines(namespace, options), CSVBasic(namespace, options)]:
+                written.clear()
+                sto.replace('data', rows[:3])
+                sto.append('data', rows[3:], [], [])
+                assert written == [2, 1, 2]
+                assert list(sto.load('data')) == [
+                    dict(row, c=None if sto.name() == 'json-lines' else '')
+                    for row in rows
+                ]
+
+            with open(JsonLines(namespace).name_to_path('data'), 'rb') as file:
+                assert file.readline().replace(b' ', b'').startswith(b'{"a":"caf')
+
+            with pytest.raises(ValueError):
+                CSVBasic(namespace, options).replace('bad', [{'a': 1}, {'a': 2, 'b': 3}])
+
+
+def test_json_chunks(monkeypatch):
+    import os
+    from datetime import datetime
+
+    from mtdata import storage
+
+    monkeypatch.setattr(storage, 'CHUNK_FILE_BYTES', 100)
+    rows = [{'t': f'2021-01-{d:02d}', 'n': d} for d in range(1, 29)]
+
+    with tempfile.TemporaryDirectory() as namespace:
+        sto = JsonChunks(namespace)
+        assert sto.version('data') is None
+
+        sto.replace('data', rows[:10])
+        chunks = sto.chunks('data')
+        assert len(chunks) > 1
+        directory = sto.name_to_path('data')
+        sizes = [os.path.getsize(os.path.join(directory, c)) for c in chunks]
+        assert max(sizes) <= 100
+
+        # Full chunks are never touched again
+        stamps = {c: os.stat(os.path.join(directory, c)).st_mtime_ns for c in chunks}
+        assert sto.append('data', rows[8:], [], ['n']).success
+        for chunk in chunks[:-1]:
+            path = os.path.join(directory, chunk)
+            assert os.stat(path).st_mtime_ns == stamps[chunk]
+        assert list(sto.load('data')) == rows
+        assert list(sto.load_backward('data')) == rows[::-1]
+
+        since = list(sto.load_range('data', 't', datetime.fromisoformat,
+                                    since=datetime(2021, 1, 20), fields=['n']))
+        assert [row['n'] for row in since] == list(range(20, 29))
+
+        # Offsets run across chunks
+        offsets = [offset for offset, _ in sto.load_offsets('data')]
+        assert len(offsets) == len(rows)
+        assert offsets[-1] < sto.data_length('data')
+        assert list(sto.load_at('data', offsets[12:14])) == rows[12:14]
+        assert [row for _, row in sto.load_offsets('data', offsets[25])] == rows[25:]
+
+        # Replacing the data removes the old chunks
+        old = set(sto.chunks('data'))
+        sto.replace('data', rows[:2])
+        assert not old & set(sto.chunks('data'))
+        assert sorted(os.listdir(directory)) == sorted(
+            sto.chunks('data') + ['index.json', 'index.json.lock']
+        )
+        assert list(sto.load('data')) == rows[:2]
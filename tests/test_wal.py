@@ -0,0 +1,141 @@
+import os
+import shutil
+import tempfile
+import time
+
+from mtdata.datasets.missoula_911 import Missoula911
+from mtdata.registry import store_options
+from mtdata.storage import CSVBasic, JsonLines
+from mtdata.wal import WriteAheadLog
+
+# Nothing is folded in the background unless a test waits this long
+NEVER = 3_600_000
+
+
+def _calls(numbers):
+    return [
+        {
+            'agency': 'MPD',
+            'cfs_number': f'A{n}',
+            'latitude': 46.87,
+            'longitude': -113.99,
+            'timestamp': 1631498400 + 60 * n,
+            'title': 'Traffic',
+        }
+        for n in numbers
+    ]
+
+
+def _stored(namespace, store_class):
+    sto = store_class(namespace, store_options(Missoula911()))
+    return [row['cfs_number'] for row in sto.load('missoula_911')]
+
+
+def test_appends_are_folded_into_stores():
+    with tempfile.TemporaryDirectory() as namespace:
+        with WriteAheadLog(namespace, fold_ms=NEVER, segment_bytes=1000) as wal:
+            for n in range(50):
+                wal.append('missoula_911', _calls([n]), ['json-lines', 'csv'])
+            # Repeats of rows that haven't been folded yet are dropped too
+            wal.append('missoula_911', _calls([3, 50]), ['json-lines', 'csv'])
+            assert _stored(namespace, JsonLines) == []
+
+            # Only committed appends are folded
+            wal.sync()
+            wal.fold()
+            expected = [f'A{n}' for n in range(51)]
+            assert _stored(namespace, JsonLines) == expected
+            assert _stored(namespace, CSVBasic) == expected
+
+            wal.append('missoula_911', _calls([51]), ['json-lines'])
+
+        # Closing folds the rest, and only the segment being written is kept
+        assert _stored(namespace, JsonLines) == expected + ['A51']
+        assert len(wal.segments()) == 1
+        assert wal.fold_state().through == wal.committed == 52
+
+
+def test_background_fold_and_group_commit():
+    with tempfile.TemporaryDirectory() as namespace:
+        with WriteAheadLog(namespace, group_rows=3, group_ms=NEVER, fold_ms=10) as wal:
+            wal.append('missoula_911', _calls([0]), ['json-lines'])
+            wal.append('missoula_911', _calls([1]), ['json-lines'])
+            assert wal.committed == 0
+            wal.append('missoula_911', _calls([2]), ['json-lines'])
+            assert wal.committed == 3
+
+            deadline = time.monotonic() + 10
+            while len(_stored(namespace, JsonLines)) < 3:
+                assert time.monotonic() < deadline
+                time.sleep(0.01)
+
+
+def test_open_folds_what_a_crash_left_behind():
+    with tempfile.TemporaryDirectory() as namespace:
+        crashed = os.path.join(namespace, 'crashed')
+        wal = WriteAheadLog(namespace, group_ms=NEVER, fold_ms=NEVER)
+        wal.open()
+        try:
+            for n in range(10):
+                wal.append('missoula_911', _calls([n]), ['json-lines'])
+            wal.sync()
+            # A group that hasn't been committed is lost
+            wal.append('missoula_911', _calls([10]), ['json-lines'])
+
+            # What would be on disk if the process died now, with a record
+            # cut off part way through
+            shutil.copytree(wal.directory, os.path.join(crashed, 'wal'))
+            last = sorted(os.listdir(os.path.join(crashed, 'wal')))[0]
+            with open(os.path.join(crashed, 'wal', last), 'ab') as file:
+                file.write(b'{"seq": 11, "dataset": "missoula_')
+        finally:
+            wal.close()
+
+        with WriteAheadLog(crashed, fold_ms=NEVER) as recovered:
+            assert _stored(crashed, JsonLines) == [f'A{n}' for n in range(10)]
+            assert recovered.append('missoula_911', _calls([11]), ['json-lines']) == 11
+
+        assert _stored(crashed, JsonLines) == [f'A{n}' for n in range(10)] + ['A11']
+
+
+def test_failed_appends_stay_in_the_log():
+    with tempfile.TemporaryDirectory() as namespace:
+        wal = WriteAheadLog(namespace, fold_ms=NEVER)
+        wal.open()
+        wal.append('missoula_911', _calls([0, 1]), ['json-lines', 'nowhere'])
+        wal.append('missoula_911', _calls([2]), ['json-lines'])
+        results = wal.close()
+        assert [result.success for result in results] == [True, False]
+        assert wal.fold_state().through == 0
+        assert wal.fold_state().folded == {'json-lines/missoula_911': 2}
+
+        # The store that took the rows doesn't get them again
+        wal = WriteAheadLog(namespace, fold_ms=NEVER)
+        results = wal.open()
+        wal.close()
+        assert [result.success for result in results] == [False]
+        assert _stored(namespace, JsonLines) == ['A0', 'A1', 'A2']
+
+
+def test_appends_are_synced_a_group_at_a_time(monkeypatch):
+    syncs = []
+    monkeypatch.setattr('mtdata.wal.os.fsync', syncs.append)
+
+    with tempfile.TemporaryDirectory() as namespace:
+        with WriteAheadLog(namespace, group_rows=10, group_ms=NEVER, fold_ms=NEVER) as wal:
+            for n in range(100):
+                wal.append('missoula_911', _calls([n]), ['json-lines'])
+            assert len(syncs) == 10
+            assert wal.committed == 100
+
+            # A group that isn't full is synced once, and only once
+            for n in range(100, 105):
+                wal.append('missoula_911', _calls([n]), ['json-lines'])
+            wal.sync()
+            wal.sync()
+            assert len(syncs) == 11
+            assert wal.committed == 105
+
+            # Rows, rather than appends, fill up a group
+            wal.append('missoula_911', _calls(range(105, 125)), ['json-lines'])
+            assert len(syncs) == 12
@@ -0,0 +1,76 @@
+#!/usr/bin/env python
+"""
+Compare small appends made directly to a store with the same appends made
+through the write-ahead log.
+
+Run it from the root of the repository, for example:
+
+    python tool/benchmark-wal.py --appends 1000
+"""
+
+import sys
+import tempfile
+import time
+from argparse import ArgumentParser
+from os import path
+
+sys.path.insert(0, path.dirname(path.dirname(path.abspath(__file__))))
+
+from mtdata.datasets.missoula_911 import Missoula911  # noqa: E402
+from mtdata.registry import store_options  # noqa: E402
+from mtdata.storage import JsonLines  # noqa: E402
+from mtdata.wal import WriteAheadLog  # noqa: E402
+
+# Nothing is folded in the background while the appends are timed
+NEVER = 3_600_000
+
+
+def call(n):
+    return {
+        "agency": "MPD",
+        "cfs_number": f"A{n}",
+        "latitude": 46.87,
+        "longitude": -113.99,
+        "timestamp": 1631498400 + 60 * n,
+        "title": "Traffic",
+    }
+
+
+def measure(label, count, write):
+    start = time.perf_counter()
+    write()
+    elapsed = time.perf_counter() - start
+    print(f"{label:<24} {count / elapsed:>12,.0f} appends/s  ({elapsed:.2f}s)")
+    return elapsed
+
+
+def main():
+    parser = ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--appends", type=int, default=1_000)
+    args = parser.parse_args()
+    name = Missoula911.name()
+
+    with tempfile.TemporaryDirectory() as namespace:
+        store = JsonLines(namespace, store_options(Missoula911()))
+
+        def direct():
+            for n in range(args.appends):
+                store.append(name, [call(n)], [], ["cfs_number"])
+
+        direct_time = measure("json-lines append", args.appends, direct)
+
+    with tempfile.TemporaryDirectory() as namespace:
+        with WriteAheadLog(namespace, fold_ms=NEVER) as wal:
+
+            def logged():
+                for n in range(args.appends):
+                    wal.append(name, [call(n)], ["json-lines"])
+                wal.sync()
+
+            logged_time = measure("write-ahead log append", args.appends, logged)
+
+    print(f"{'speedup':<24} {direct_time / logged_time:>12,.1f}x")
+
+
+if __name__ == "__main__":
+    main()
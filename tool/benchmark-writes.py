@@ -0,0 +1,61 @@
+#!/usr/bin/env python
+"""
+Measure the write throughput of the built-in stores.
+
+Run it from the root of the repository, for example:
+
+    python tool/benchmark-writes.py --rows 1000000 > bench_output.txt
+"""
+
+import sys
+import tempfile
+import time
+from argparse import ArgumentParser
+from os import path
+
+sys.path.insert(0, path.dirname(path.dirname(path.abspath(__file__))))
+
+from mtdata.storage import CSVBasic, JsonLines  # noqa: E402
+
+
+def rows(count):
+    for i in range(count):
+        yield {
+            "site_name": ["Missoula", "Helena", "Butte"][i % 3],
+            "utc_timestamp": f"2021-09-13T{i % 24:02}:00",
+            "aqi": i % 300,
+            "latitude": 46.87 + (i % 100) / 1000,
+            "longitude": -113.99 - (i % 100) / 1000,
+            "parameter": "PM2.5",
+            "agency": "Montana Department of Environmental Quality",
+        }
+
+
+def measure(label, count, write):
+    start = time.perf_counter()
+    write()
+    elapsed = time.perf_counter() - start
+    print(f"{label:<24} {count / elapsed:>12,.0f} rows/s  ({elapsed:.2f}s)")
+
+
+def main():
+    parser = ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--rows", type=int, default=500_000)
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as namespace:
+        for store in (JsonLines(namespace), CSVBasic(namespace)):
+            measure(
+                f"{store.name()} replace",
+                args.rows,
+                lambda: store.replace("bench", rows(args.rows)),
+            )
+            measure(
+                f"{store.name()} append",
+                args.rows,
+                lambda: store.append("bench", rows(args.rows), [], []),
+            )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,72 @@
+#!/usr/bin/env python
+"""
+Load-test the update pipeline against a stand-in for the real sources.
+
+Record the responses first, then run it from the root of the repository,
+for example:
+
+    python -m mtdata --record recordings
+    python tool/load-test.py -r recordings --scale 50 --failure-rate 0.1
+"""
+
+import os
+import sys
+import tempfile
+import threading
+import time
+from argparse import ArgumentParser
+from os import path
+
+sys.path.insert(0, path.dirname(path.dirname(path.abspath(__file__))))
+
+from mtdata.manifest import get_dataset, get_store  # noqa: E402
+from mtdata.registry import Registry  # noqa: E402
+from mtdata.source import REPLAY_ENV  # noqa: E402
+from mtdata.standin import StandInOptions, make_standin_server  # noqa: E402
+
+
+def main():
+    parser = ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("-r", "--recordings", required=True)
+    parser.add_argument("-s", "--stores", nargs="+", default=["json-lines"])
+    parser.add_argument("--failure-rate", type=float, default=0.0)
+    parser.add_argument("--latency", type=float, default=0.0)
+    parser.add_argument("--runs", type=int, default=3)
+    parser.add_argument("--scale", type=int, default=10)
+    parser.add_argument("--workers", type=int, default=1)
+    args = parser.parse_args()
+
+    store_classes = [get_store(name) for name in args.stores]
+    configs = []
+    for name in sorted(os.listdir(args.recordings)):
+        if not name.endswith(".recording"):
+            continue
+        dataset = get_dataset(name[: -len(".recording")])
+        if dataset is not None:
+            configs.append((dataset, store_classes))
+
+    options = StandInOptions(
+        scale=args.scale, latency=args.latency, failure_rate=args.failure_rate
+    )
+    httpd = make_standin_server(args.recordings, port=0, options=options)
+    thread = threading.Thread(target=httpd.serve_forever, daemon=True)
+    thread.start()
+    os.environ[REPLAY_ENV] = f"http://127.0.0.1:{httpd.server_port}"
+
+    try:
+        with tempfile.TemporaryDirectory() as namespace:
+            registry = Registry(configs, skip_unchanged=False, workers=args.workers)
+            for run in range(1, args.runs + 1):
+                start = time.perf_counter()
+                for result in registry.update(namespace):
+                    status = "ok" if result.success else "FAILED"
+                    print(f"run {run}  {result.name:<24} {status}")
+                elapsed = time.perf_counter() - start
+                print(f"run {run}  {'total':<24} {elapsed:.2f}s")
+    finally:
+        httpd.shutdown()
+        httpd.server_close()
+
+
+if __name__ == "__main__":
+    main()